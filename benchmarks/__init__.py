@@ -0,0 +1,4 @@
+# benchmarks/__init__.py
+# Offline benchmark harness: synthetic Telegram updates plus stand-ins for
+# Anthropic, OpenAI audio and the Astra Data API, so HandlerManager can be
+# load tested without network access. Run with `python -m benchmarks.run`.
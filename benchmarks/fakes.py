@@ -0,0 +1,399 @@
+# benchmarks/fakes.py
+import json
+import math
+import time
+import random
+import threading
+from types import SimpleNamespace
+import numpy as np
+from embedding_service import HashingEmbedder
+
+
+class SimulatedError(ConnectionError):
+    """Raised by a stand-in service to simulate an upstream failure."""
+
+
+class LatencyModel:
+    """
+    Log-normal latency distribution with an error rate.
+
+    Args:
+        median: Median latency in seconds
+        sigma: Spread of the log-normal distribution (0 means constant latency)
+        error_rate: Probability between 0 and 1 that a call fails
+        seed: Optional random seed for reproducible runs
+    """
+
+    def __init__(self, median=0.05, sigma=0.5, error_rate=0.0, seed=None):
+        self.median = median
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec, seed=None):
+        """Build a model from "median[,sigma[,error_rate]]", e.g. "0.8,0.4,0.01"."""
+        parts = [float(part) for part in spec.split(",")]
+        return cls(*parts, seed=seed)
+
+    def sample(self):
+        with self._lock:
+            if self.sigma <= 0:
+                return self.median
+            return self.median * math.exp(self._random.gauss(0, self.sigma))
+
+    def fails(self):
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def wait(self, name):
+        """Block for one sampled latency, then maybe raise a simulated failure."""
+        time.sleep(self.sample())
+        if self.fails():
+            raise SimulatedError(f"Simulated {name} failure")
+
+    async def wait_async(self, name):
+        """Async variant of wait() for stand-ins called from the event loop."""
+        import asyncio
+        await asyncio.sleep(self.sample())
+        if self.fails():
+            raise SimulatedError(f"Simulated {name} failure")
+
+
+def _tokens(text):
+    return set(str(text).lower().split())
+
+
+def _similarity(query, document):
+    """Similarity between a query (text or vector) and a stored document."""
+    vector = document.get("$vector")
+    if isinstance(query, (list, tuple)) and vector:
+        query, vector = np.asarray(query), np.asarray(vector)
+        norm = np.linalg.norm(query) * np.linalg.norm(vector)
+        return float(query @ vector / norm) if norm else 0.0
+
+    query_tokens = _tokens(query)
+    doc_tokens = _tokens(document.get("t", document.get("text", "")))
+    if not query_tokens or not doc_tokens:
+        return 0.0
+    return len(query_tokens & doc_tokens) / len(query_tokens | doc_tokens)
+
+
+def _get_path(document, path):
+    value = document
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def _matches(document, filter):
+    """Evaluate the subset of Data API filter syntax the bot uses."""
+    for path, condition in (filter or {}).items():
+        if path == "$and":
+            if not all(_matches(document, clause) for clause in condition):
+                return False
+            continue
+        if path == "$or":
+            if not any(_matches(document, clause) for clause in condition):
+                return False
+            continue
+        value = _get_path(document, path)
+        if isinstance(condition, dict):
+            for op, operand in condition.items():
+                if op == "$in":
+                    values = value if isinstance(value, list) else [value]
+                    if not any(v in operand for v in values):
+                        return False
+                elif op == "$nin":
+                    values = value if isinstance(value, list) else [value]
+                    if any(v in operand for v in values):
+                        return False
+                elif op == "$exists":
+                    if (value is not None) != bool(operand):
+                        return False
+                elif op == "$ne":
+                    if value == operand:
+                        return False
+                elif value is None:
+                    return False
+                elif op == "$gte" and not value >= operand:
+                    return False
+                elif op == "$gt" and not value > operand:
+                    return False
+                elif op == "$lte" and not value <= operand:
+                    return False
+                elif op == "$lt" and not value < operand:
+                    return False
+        elif isinstance(value, list):
+            if condition not in value:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(document, projection):
+    """Apply an inclusion or exclusion projection ($vector is excluded by default)."""
+    if not projection:
+        return {key: value for key, value in document.items() if key != "$vector"}
+
+    included = {key for key, flag in projection.items() if flag}
+    if included:
+        result = {"_id": document["_id"]}
+        for key in included:
+            top = key.split(".", 1)[0]
+            if top in document:
+                result[top] = document[top]
+        return result
+
+    excluded = {key for key, flag in projection.items() if not flag}
+    return {key: value for key, value in document.items()
+            if key not in excluded and (key != "$vector" or "$vector" in projection)}
+
+
+# Documents per find() page, as in the Data API
+PAGE_SIZE = 20
+
+
+class FakeCollection:
+    """In-memory stand-in for astrapy's AstraDBCollection."""
+
+    def __init__(self, name, latency):
+        self.name = name
+        self.latency = latency
+        self.documents = {}
+        self._lock = threading.Lock()
+
+    def _snapshot(self, filter=None):
+        with self._lock:
+            return [doc for doc in self.documents.values() if _matches(doc, filter)]
+
+    def insert_one(self, document):
+        self.latency.wait(f"{self.name}.insert_one")
+        with self._lock:
+            self.documents[document["_id"]] = dict(document)
+        return {"status": {"insertedIds": [document["_id"]]}}
+
+    def insert_many(self, documents, options=None, partial_failures_allowed=False):
+        self.latency.wait(f"{self.name}.insert_many")
+        with self._lock:
+            for document in documents:
+                self.documents[document["_id"]] = dict(document)
+        return {"status": {"insertedIds": [document["_id"] for document in documents]}}
+
+    def find(self, filter=None, projection=None, sort=None, options=None):
+        self.latency.wait(f"{self.name}.find")
+        documents = self._snapshot(filter)
+        if sort and "$vector" in sort:
+            documents.sort(key=lambda doc: _similarity(sort["$vector"], doc), reverse=True)
+        elif sort:
+            for key, direction in reversed(list(sort.items())):
+                documents.sort(key=lambda doc: _get_path(doc, key) or 0, reverse=direction < 0)
+        limit = (options or {}).get("limit")
+        if limit is not None:
+            documents = documents[:limit]
+        # Like the Data API, return at most one page and a state for the next
+        offset = int((options or {}).get("pageState") or 0)
+        page = documents[offset:offset + PAGE_SIZE]
+        more = offset + PAGE_SIZE < len(documents)
+        return {
+            "data": {
+                "documents": [_project(doc, projection) for doc in page],
+                "nextPageState": str(offset + PAGE_SIZE) if more else None
+            },
+            "status": {}
+        }
+
+    def paginated_find(self, filter=None, projection=None, sort=None, options=None, prefetched=None):
+        page_state = None
+        while True:
+            response = self.find(filter=filter, projection=projection, sort=sort,
+                                 options=dict(options or {}, pageState=page_state))
+            yield from response["data"]["documents"]
+            page_state = response["data"]["nextPageState"]
+            if not page_state:
+                return
+
+    def find_one(self, filter=None, projection=None, sort=None, options=None):
+        response = self.find(filter=filter, projection=projection, sort=sort, options={"limit": 1})
+        documents = response["data"]["documents"]
+        return {"data": {"document": documents[0] if documents else None}, "status": {}}
+
+    def vector_find(self, vector, *, limit, filter=None, fields=None, include_similarity=True):
+        self.latency.wait(f"{self.name}.vector_find")
+        documents = self._snapshot(filter)
+        scored = sorted(
+            ((_similarity(vector, doc), doc) for doc in documents),
+            key=lambda pair: pair[0],
+            reverse=True
+        )[:limit]
+        projection = {field: 1 for field in fields} if fields else None
+        results = []
+        for score, doc in scored:
+            result = _project(doc, projection)
+            if include_similarity:
+                result["$similarity"] = score
+            results.append(result)
+        return results
+
+    def update_one(self, filter, update):
+        self.latency.wait(f"{self.name}.update_one")
+        with self._lock:
+            for doc in self.documents.values():
+                if _matches(doc, filter):
+                    self._apply_update(doc, update)
+                    return {"status": {"matchedCount": 1, "modifiedCount": 1}}
+        return {"status": {"matchedCount": 0, "modifiedCount": 0}}
+
+    def update_many(self, filter, update):
+        self.latency.wait(f"{self.name}.update_many")
+        with self._lock:
+            matched = [doc for doc in self.documents.values() if _matches(doc, filter)]
+            for doc in matched:
+                self._apply_update(doc, update)
+        return {"status": {"matchedCount": len(matched), "modifiedCount": len(matched)}}
+
+    def find_one_and_replace(self, replacement, *, sort=None, filter=None, options=None):
+        self.latency.wait(f"{self.name}.find_one_and_replace")
+        with self._lock:
+            for doc_id, doc in list(self.documents.items()):
+                if _matches(doc, filter):
+                    self.documents[doc_id] = dict(replacement, _id=doc_id)
+                    return {"data": {"document": doc}, "status": {"matchedCount": 1, "modifiedCount": 1}}
+        return {"data": {"document": None}, "status": {"matchedCount": 0, "modifiedCount": 0}}
+
+    @staticmethod
+    def _apply_update(doc, update):
+        for path, value in update.get("$set", {}).items():
+            target = doc
+            parts = path.split(".")
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = value
+        for path in update.get("$unset", {}):
+            target = doc
+            parts = path.split(".")
+            for part in parts[:-1]:
+                target = target.get(part, {})
+            target.pop(parts[-1], None)
+
+    def delete_one(self, id):
+        self.latency.wait(f"{self.name}.delete_one")
+        with self._lock:
+            deleted = self.documents.pop(id, None) is not None
+        return {"status": {"deletedCount": 1 if deleted else 0}}
+
+    def count_documents(self, filter=None):
+        self.latency.wait(f"{self.name}.count_documents")
+        return {"status": {"count": len(self._snapshot(filter))}}
+
+
+class FakeAstraDB:
+    """In-memory stand-in for astrapy's AstraDB client."""
+
+    def __init__(self, latency=None):
+        self.latency = latency or LatencyModel(0.03, 0.4)
+        self.collections = {}
+        self._lock = threading.Lock()
+
+    def collection(self, collection_name):
+        with self._lock:
+            if collection_name not in self.collections:
+                self.collections[collection_name] = FakeCollection(collection_name, self.latency)
+            return self.collections[collection_name]
+
+    def create_collection(self, collection_name, dimension=None, **kwargs):
+        self.latency.wait("create_collection")
+        self.collection(collection_name)
+        return {"status": {"ok": 1}}
+
+
+_GAME_QUESTIONS = [
+    "What is a belief you have held onto for a long time, and why?",
+    "Which moment in the last year taught you the most about yourself?",
+    "What does a truly good day look like for you?",
+    "Who has shaped the way you treat other people?",
+    "What would you do differently if nobody was watching?",
+    "What kind of work makes you lose track of time?",
+]
+
+
+class _FakeMessages:
+    def __init__(self, latency, output_tokens_per_second):
+        self.latency = latency
+        self.output_tokens_per_second = output_tokens_per_second
+        self._random = random.Random(7)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _reply_text(self, system, max_tokens):
+        system = system if isinstance(system, str) else " ".join(
+            block.get("text", "") for block in system or [])
+        if "classif" in system.lower():
+            return ", ".join(self._random.sample(["work", "health", "relationships", "purpose"], 2))
+        if "compact profile" in system:
+            return json.dumps({
+                "values": ["growth", "family", "meaningful work"],
+                "categories": {"work": "Finds energy in building things.", "health": "",
+                               "relationships": "Close to family.", "purpose": ""}
+            })
+        if "get to know you" in system:
+            return self._random.choice(_GAME_QUESTIONS)
+        words = min(max_tokens, 120)
+        return " ".join(["Based on what you have shared, you value"] + ["growth"] * words)
+
+    def create(self, *, model, max_tokens, messages, system=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+        text = self._reply_text(system, max_tokens)
+        output_tokens = len(text.split())
+        # Generation time grows with the number of output tokens
+        time.sleep(output_tokens / self.output_tokens_per_second)
+        self.latency.wait("anthropic.messages")
+        prompt = " ".join(str(message.get("content", "")) for message in messages) + str(system or "")
+        return SimpleNamespace(
+            content=[SimpleNamespace(type="text", text=text)],
+            model=model,
+            usage=SimpleNamespace(input_tokens=len(prompt) // 4, output_tokens=output_tokens),
+            stop_reason="end_turn"
+        )
+
+
+class FakeAnthropicClient:
+    """Stand-in for anthropic.Anthropic exposing messages.create()."""
+
+    def __init__(self, latency=None, output_tokens_per_second=400.0):
+        self.messages = _FakeMessages(latency or LatencyModel(0.6, 0.5), output_tokens_per_second)
+
+
+class _FakeTranscriptions:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def create(self, *, model, file, **kwargs):
+        self.latency.wait("openai.transcriptions")
+        return SimpleNamespace(text="I spent the afternoon thinking about my work and my family")
+
+
+class _FakeEmbeddings:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    def create(self, *, model, input, dimensions=1536, **kwargs):
+        self.latency.wait("openai.embeddings")
+        self.calls += 1
+        # Feature hashing keeps similar texts close, like a real model would
+        embedder = HashingEmbedder(dimensions)
+        return SimpleNamespace(data=[SimpleNamespace(embedding=embedder.embed(text).tolist()) for text in input])
+
+
+class FakeOpenAIClient:
+    """Stand-in for the openai module exposing audio.transcriptions.create() and embeddings.create()."""
+
+    def __init__(self, latency=None, embedding_latency=None):
+        self.audio = SimpleNamespace(transcriptions=_FakeTranscriptions(latency or LatencyModel(0.8, 0.4)))
+        self.embeddings = _FakeEmbeddings(embedding_latency or LatencyModel(0.15, 0.3))
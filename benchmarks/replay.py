@@ -0,0 +1,134 @@
+# benchmarks/replay.py
+"""
+Replay a traffic capture (see capture_service.TrafficRecorder) against the
+stand-in services.
+
+Each captured update is rebuilt as a synthetic update with the same kind,
+text length, voice duration and command, and dispatched at its original
+offset divided by --speed. Updates from the same user are handled in order.
+
+Example:
+    python -m benchmarks.replay capture.ndjson --speed 10 --output replay.json
+"""
+import time
+import json
+import asyncio
+import argparse
+from collections import defaultdict
+
+from capture_service import load_capture
+from benchmarks.run import Stack, build_parser, percentile, peak_rss_mb, stage_summary, git_commit
+from benchmarks.updates import UpdateGenerator, make_text_update, make_voice_update, make_context
+
+
+def synthetic_text(generator, length):
+    """Generate thought-like text of exactly the given length."""
+    text = ""
+    while len(text) < length:
+        text += generator.thought() + " "
+    return text[:max(1, length)]
+
+
+async def replay_event(stack, event, generator, latencies):
+    manager = stack.manager
+    telegram = stack.telegram
+    user_id = 100000 + event["u"]
+    kind = event["k"]
+
+    if kind == "command":
+        update = make_text_update(telegram, user_id, f"/{event['c']}")
+        handler = getattr(manager, f"{event['c']}_command", None)
+        if handler is None:
+            return
+        await handler(update, make_context(telegram))
+        return
+
+    if kind == "voice":
+        update = make_voice_update(telegram, user_id, event.get("d", 10))
+    elif kind == "text":
+        update = make_text_update(telegram, user_id, synthetic_text(generator, event.get("n", 40)))
+    else:
+        # Callback queries depend on inline keyboards we can't reproduce
+        return
+
+    start = time.perf_counter()
+    await manager.handle_message(update, make_context(telegram))
+    latencies[event.get("s", "normal")].append(time.perf_counter() - start)
+
+
+async def replay(stack, events, speed, generator):
+    latencies = defaultdict(list)
+    user_tails = {}
+    lags = []
+    start = time.monotonic()
+
+    async def run_after(previous, event):
+        if previous is not None:
+            await previous
+        await replay_event(stack, event, generator, latencies)
+
+    for event in events:
+        if speed:
+            delay = event["t"] / speed - (time.monotonic() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lags.append(max(0.0, -delay))
+        # Chain each user's updates so they are handled in capture order
+        task = asyncio.create_task(run_after(user_tails.get(event["u"]), event))
+        user_tails[event["u"]] = task
+
+    await asyncio.gather(*user_tails.values())
+    elapsed = time.monotonic() - start
+    return latencies, elapsed, lags
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None
+    }
+
+
+async def main(args):
+    events = load_capture(args.capture)
+    if args.limit:
+        events = events[:args.limit]
+
+    speed = None if args.speed == "max" else float(args.speed)
+    stack = Stack(args)
+    latencies, elapsed, lags = await replay(stack, events, speed, UpdateGenerator(args.seed))
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "commit": git_commit(),
+        "capture": args.capture,
+        "speed": args.speed,
+        "events": len(events),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_per_second": round(len(all_latencies) / elapsed, 3) if elapsed else None,
+        "latency_seconds": summarize(all_latencies),
+        "latency_by_mode": {mode: summarize(values) for mode, values in latencies.items()},
+        "dispatch_lag_p99_seconds": percentile(lags, 99),
+        "stages": stage_summary(),
+        "peak_rss_mb": round(peak_rss_mb(), 1)
+    }
+
+
+if __name__ == "__main__":
+    parser = build_parser()
+    parser.description = "Replay a traffic capture against the stand-in services"
+    parser.add_argument("capture", help="NDJSON file written by CAPTURE_FILE")
+    parser.add_argument("--speed", default="1", help="Replay speed factor, e.g. 1 or 10, or 'max'")
+    parser.add_argument("--limit", type=int, help="Only replay the first N events")
+    args = parser.parse_args()
+
+    report = asyncio.run(main(args))
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
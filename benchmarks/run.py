@@ -0,0 +1,221 @@
+# benchmarks/run.py
+"""
+Offline end-to-end benchmark for HandlerManager.
+
+Runs one or more scenarios with N concurrent simulated users against
+in-process stand-ins for Telegram, Anthropic, OpenAI audio and embeddings
+and Astra, then
+prints latency percentiles, throughput and peak RSS as JSON.
+
+Example:
+    python -m benchmarks.run --scenario chat --users 20 --messages 10 --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+import subprocess
+
+from benchmarks.fakes import (
+    LatencyModel, FakeAstraDB, FakeAnthropicClient, FakeOpenAIClient
+)
+from benchmarks.updates import (
+    FakeTelegram, UpdateGenerator, make_text_update, make_voice_update, make_context
+)
+
+SCENARIOS = ["normal", "chat", "game", "voice", "mixed"]
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in megabytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+class Stack:
+    """HandlerManager wired to stand-in services."""
+
+    def __init__(self, args):
+        import config
+        from database import DatabaseService
+        from embedding_service import EmbeddingService, OpenAIEmbedder, EmbeddingCache
+        from claude_service import ClaudeService
+        from whisper_service import WhisperService
+        from handlers import HandlerManager
+
+        seed = args.seed
+        self.telegram = FakeTelegram(LatencyModel.parse(args.telegram_latency, seed))
+        self.astra = FakeAstraDB(LatencyModel.parse(args.astra_latency, seed + 1))
+        self.anthropic = FakeAnthropicClient(LatencyModel.parse(args.anthropic_latency, seed + 2))
+        self.openai = FakeOpenAIClient(LatencyModel.parse(args.openai_latency, seed + 3),
+                                       LatencyModel.parse(args.embedding_latency, seed + 5))
+        ffmpeg_latency = LatencyModel.parse(args.ffmpeg_latency, seed + 4)
+
+        # A fresh cache per run, so runs don't warm each other up
+        embedding_service = EmbeddingService(
+            OpenAIEmbedder(self.openai, config.EMBEDDING_MODEL, config.EMBEDDING_DIMENSION),
+            EmbeddingCache(os.path.join(tempfile.mkdtemp(), "embeddings"), "benchmark",
+                           config.EMBEDDING_DIMENSION, config.EMBEDDING_CACHE_MAX_ENTRIES),
+            config.EMBEDDING_BATCH_SIZE, config.EMBEDDING_BATCH_WINDOW_MS / 1000
+        )
+        db_service = DatabaseService(db=self.astra, embedder=embedding_service)
+        claude_service = ClaudeService(client=self.anthropic)
+        whisper_service = WhisperService(client=self.openai)
+
+        # Stand in for the ffmpeg subprocess with a simulated conversion delay
+        async def convert(input_file):
+            await whisper_service._executor.run(ffmpeg_latency.wait, "ffmpeg")
+            return input_file
+        whisper_service._convert_audio_to_mp3 = convert
+
+        self.manager = HandlerManager(
+            db_service=db_service,
+            whisper_service=whisper_service,
+            claude_service=claude_service
+        )
+
+
+async def run_user(stack, scenario, user_id, args, generator, latencies):
+    """Drive one simulated user through a scenario, recording per-update latency."""
+    manager = stack.manager
+    telegram = stack.telegram
+
+    async def command(name):
+        update = make_text_update(telegram, user_id, f"/{name}")
+        await getattr(manager, f"{name}_command")(update, make_context(telegram))
+
+    if scenario == "mixed":
+        scenario = ["normal", "chat", "game", "voice"][user_id % 4]
+
+    if scenario == "chat":
+        await command("chat")
+    elif scenario == "game":
+        await command("game")
+    else:
+        await command("normal")
+
+    for _ in range(args.messages):
+        if scenario == "voice":
+            update = make_voice_update(telegram, user_id, generator.voice_duration())
+        elif scenario == "chat":
+            update = make_text_update(telegram, user_id, generator.question())
+        else:
+            update = make_text_update(telegram, user_id, generator.thought())
+
+        start = time.perf_counter()
+        await manager.handle_message(update, make_context(telegram))
+        latencies.append(time.perf_counter() - start)
+
+        if args.think_time:
+            await asyncio.sleep(args.think_time)
+
+
+async def run_scenario(stack, scenario, args):
+    latencies = []
+    generator = UpdateGenerator(args.seed)
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        run_user(stack, scenario, args.user_offset + user, args, generator, latencies)
+        for user in range(args.users)
+    ))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "updates": len(latencies),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_per_second": round(len(latencies) / elapsed, 3) if elapsed else None,
+        "latency_seconds": {
+            "mean": round(sum(latencies) / len(latencies), 4) if latencies else None,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies) if latencies else None
+        }
+    }
+
+
+def stage_summary():
+    """Mean latency and call count per instrumented stage."""
+    from metrics_service import STAGE_LATENCY
+    stages = {}
+    for (stage,), (count, total) in sorted(STAGE_LATENCY.summary().items()):
+        stages[stage] = {
+            "count": count,
+            "mean_seconds": round(total / count, 4) if count else None,
+            "p95_seconds": STAGE_LATENCY.quantile(0.95, stage)
+        }
+    return stages
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Offline HandlerManager benchmark")
+    parser.add_argument("--scenario", choices=SCENARIOS + ["all"], default="all")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent simulated users")
+    parser.add_argument("--messages", type=int, default=5, help="Messages per user")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Seconds between a user's messages")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--user-offset", type=int, default=1000, help="First simulated user id")
+    parser.add_argument("--telegram-latency", default="0.08,0.3,0",
+                        help="median,sigma,error_rate for Telegram Bot API calls")
+    parser.add_argument("--anthropic-latency", default="0.6,0.5,0")
+    parser.add_argument("--openai-latency", default="0.8,0.4,0")
+    parser.add_argument("--embedding-latency", default="0.15,0.3,0")
+    parser.add_argument("--astra-latency", default="0.03,0.4,0")
+    parser.add_argument("--ffmpeg-latency", default="0.15,0.2,0")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    return parser
+
+
+async def main(args):
+    stack = Stack(args)
+    scenarios = SCENARIOS if args.scenario == "all" else [args.scenario]
+
+    report = {
+        "commit": git_commit(),
+        "config": vars(args),
+        "scenarios": {}
+    }
+    for scenario in scenarios:
+        report["scenarios"][scenario] = await run_scenario(stack, scenario, args)
+
+    report["stages"] = stage_summary()
+    report["anthropic_calls"] = stack.anthropic.messages.calls
+    report["telegram_calls"] = stack.telegram.calls
+    report["embedding_calls"] = stack.openai.embeddings.calls
+    report["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return report
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    report = asyncio.run(main(args))
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
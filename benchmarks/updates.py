@@ -0,0 +1,139 @@
+# benchmarks/updates.py
+import random
+import itertools
+from types import SimpleNamespace
+
+from benchmarks.fakes import LatencyModel
+
+_message_ids = itertools.count(1)
+
+_SUBJECTS = ["I", "My manager", "My sister", "Our team", "My doctor", "A friend"]
+_VERBS = ["talked about", "worried about", "enjoyed", "struggled with", "decided on", "kept thinking about"]
+_OBJECTS = [
+    "the new project deadline", "going for a run every morning", "dinner with my parents",
+    "what I want from my career", "sleeping better", "moving to a new city",
+    "learning to say no", "a book about meaning and purpose", "the budget for next year",
+]
+_QUESTIONS = [
+    "What do I care about most?",
+    "What have I said about my work lately?",
+    "How am I doing with my health goals?",
+    "Who are the most important people in my life?",
+    "What gives me a sense of purpose?",
+    "What was I worried about last week?",
+]
+
+
+class FakeTelegram:
+    """Shared latency model for every simulated Telegram Bot API call."""
+
+    def __init__(self, latency=None):
+        self.latency = latency or LatencyModel(0.08, 0.3)
+        self.calls = 0
+
+    async def call(self, name):
+        self.calls += 1
+        await self.latency.wait_async(f"telegram.{name}")
+
+
+class FakeSentMessage:
+    """A message the bot sent; supports in-place edits."""
+
+    def __init__(self, telegram, text):
+        self.telegram = telegram
+        self.message_id = next(_message_ids)
+        self.text = text
+
+    async def edit_text(self, text, **kwargs):
+        await self.telegram.call("editMessageText")
+        self.text = text
+        return self
+
+
+class FakeMessage:
+    """Incoming user message with the subset of telegram.Message the handlers use."""
+
+    def __init__(self, telegram, text=None, voice=None):
+        self.telegram = telegram
+        self.message_id = next(_message_ids)
+        self.text = text
+        self.voice = voice
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        await self.telegram.call("sendMessage")
+        sent = FakeSentMessage(self.telegram, text)
+        self.replies.append(sent)
+        return sent
+
+
+class FakeFile:
+    def __init__(self, telegram, size):
+        self.telegram = telegram
+        self.size = size
+
+    async def download_to_drive(self, custom_path):
+        await self.telegram.call("downloadFile")
+        with open(custom_path, "wb") as f:
+            f.write(b"\0" * self.size)
+
+
+class FakeBot:
+    def __init__(self, telegram):
+        self.telegram = telegram
+
+    async def get_file(self, file_id):
+        await self.telegram.call("getFile")
+        return FakeFile(self.telegram, 2048)
+
+    async def send_chat_action(self, chat_id, action, **kwargs):
+        await self.telegram.call("sendChatAction")
+        return True
+
+
+def make_text_update(telegram, user_id, text):
+    """Build an Update-like object carrying a text message."""
+    message = FakeMessage(telegram, text=text)
+    return SimpleNamespace(
+        update_id=message.message_id,
+        message=message,
+        effective_user=SimpleNamespace(id=user_id),
+        effective_chat=SimpleNamespace(id=user_id)
+    )
+
+
+def make_voice_update(telegram, user_id, duration):
+    """Build an Update-like object carrying a voice note of the given duration."""
+    voice = SimpleNamespace(file_id=f"bench-{user_id}-{next(_message_ids)}", duration=duration)
+    message = FakeMessage(telegram, voice=voice)
+    return SimpleNamespace(
+        update_id=message.message_id,
+        message=message,
+        effective_user=SimpleNamespace(id=user_id),
+        effective_chat=SimpleNamespace(id=user_id)
+    )
+
+
+def make_context(telegram, args=None):
+    """Build a CallbackContext-like object."""
+    return SimpleNamespace(bot=FakeBot(telegram), args=args or [])
+
+
+class UpdateGenerator:
+    """Seeded generator of realistic thought and question texts."""
+
+    def __init__(self, seed=0):
+        self._random = random.Random(seed)
+
+    def thought(self):
+        sentences = self._random.randint(1, 3)
+        return " ".join(
+            f"{self._random.choice(_SUBJECTS)} {self._random.choice(_VERBS)} {self._random.choice(_OBJECTS)}."
+            for _ in range(sentences)
+        )
+
+    def question(self):
+        return self._random.choice(_QUESTIONS)
+
+    def voice_duration(self):
+        return self._random.randint(3, 60)
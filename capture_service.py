@@ -0,0 +1,97 @@
+# capture_service.py
+import json
+import time
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class TrafficRecorder:
+    """
+    Record an anonymized stream of updates to a compact NDJSON file.
+
+    No message content or Telegram ids are written: users are replaced by
+    small sequential numbers and texts by their length. Each line holds:
+        t: seconds since the capture started
+        u: anonymized user number
+        k: kind of update ("text", "voice", "command" or "callback")
+        s: the user's mode when the update arrived
+        n: text length (text updates)
+        d: voice duration in seconds (voice updates)
+        c: command name (command updates)
+        ms: time the bot took to handle the update, in milliseconds
+
+    Lines are written by a background thread so recording never blocks handlers.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._start = time.monotonic()
+        self._users = {}
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._write_loop, name="traffic-recorder", daemon=True)
+        self._thread.start()
+        logger.info(f"Capturing anonymized traffic to {path}")
+
+    def _anonymize(self, user_id):
+        if user_id not in self._users:
+            self._users[user_id] = len(self._users) + 1
+        return self._users[user_id]
+
+    def record(self, user_id, kind, state, received_at, text=None, voice_duration=None, command=None):
+        """
+        Queue one update for writing.
+
+        Args:
+            user_id: Telegram user ID (anonymized before writing)
+            kind: "text", "voice", "command" or "callback"
+            state: The user's mode when the update arrived
+            received_at: time.monotonic() when the update arrived
+            text: Message text, only its length is kept
+            voice_duration: Voice note duration in seconds
+            command: Command name without the slash
+        """
+        event = {
+            "t": round(received_at - self._start, 3),
+            "u": self._anonymize(user_id),
+            "k": kind,
+            "s": state,
+            "ms": round((time.monotonic() - received_at) * 1000, 1)
+        }
+        if text is not None:
+            event["n"] = len(text)
+        if voice_duration is not None:
+            event["d"] = voice_duration
+        if command is not None:
+            event["c"] = command
+        self._queue.put(event)
+
+    def _write_loop(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                event = self._queue.get()
+                if event is None:
+                    break
+                f.write(json.dumps(event, separators=(",", ":")) + "\n")
+                # Flush whenever the queue drains so a crash loses little
+                if self._queue.empty():
+                    f.flush()
+
+    def close(self):
+        """Flush pending events and stop the writer thread."""
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+
+def load_capture(path):
+    """Read a capture file into a list of events sorted by time."""
+    events = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                events.append(json.loads(line))
+    events.sort(key=lambda event: event["t"])
+    return events
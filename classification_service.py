@@ -1,6 +1,8 @@
 # classification_service.py
+import hashlib
 import logging
 from claude_service import ClaudeService
+from llm_scheduler import INGESTION
 import config
 
 logger = logging.getLogger(__name__)
@@ -24,56 +26,68 @@ class ClassificationService:
             "purpose": "Sense of meaning and direction in life. Values, beliefs, personal growth, and the impact you want to have on the world. Understanding why you do what you do and feeling your life has significance."
         }
     
-    async def classify_text(self, text):
+    SYSTEM_PROMPT = (
+        "You are a classifier that categorizes personal thoughts and reflections into these categories:\n"
+        "- Work: Professional activities, career, business, productivity, skills, financial matters\n"
+        "- Health: Physical and mental wellbeing, exercise, nutrition, sleep, stress, mindfulness\n"
+        "- Relationships: Connections with family, friends, partners, social interactions\n"
+        "- Purpose: Meaning, values, beliefs, goals, personal growth, impact\n\n"
+        "A text can belong to multiple categories if it touches on multiple domains. "
+        "Analyze the content carefully and assign all relevant categories."
+    )
+    
+    USER_PROMPT = (
+        "Classify this text into one or more of these categories: {categories}.\n\n"
+        "Text: \"{text}\"\n\n"
+        "Respond with just a comma-separated list of the applicable categories, like: category1, category2"
+    )
+    
+    @classmethod
+    def version(cls):
+        """Short hash of the model, prompts and categories; changes whenever classification would."""
+        source = "\n".join([config.LLM_ROUTES["classify"][0], cls.SYSTEM_PROMPT, cls.USER_PROMPT] + cls.CATEGORIES)
+        return hashlib.sha1(source.encode("utf-8")).hexdigest()[:8]
+    
+    def build_request(self, text):
+        """
+        Messages API arguments for classifying a text.
+        
+        Used both for single requests and for the reclassify backfill's batches.
+        """
+        return {
+            "max_tokens": config.LLM_ROUTES["classify"][1],
+            "system": self.SYSTEM_PROMPT,
+            "messages": [
+                {"role": "user", "content": self.USER_PROMPT.format(categories=", ".join(self.CATEGORIES), text=text)}
+            ]
+        }
+    
+    def parse_categories(self, response_text):
+        """Extract the known categories named in a classification response."""
+        categories_text = response_text.strip().lower()
+        return [category for category in self.CATEGORIES if category in categories_text]
+    
+    async def classify_text(self, text, user_id=None):
         """
         Classify text into one or more categories.
         
         Args:
             text: The text to classify
+            user_id: The Telegram user ID, for fair scheduling
             
         Returns:
             list: Categories the text belongs to
         """
         try:
-            # Create a prompt for Claude to classify the text
-            system_prompt = (
-                "You are a classifier that categorizes personal thoughts and reflections into these categories:\n"
-                "- Work: Professional activities, career, business, productivity, skills, financial matters\n"
-                "- Health: Physical and mental wellbeing, exercise, nutrition, sleep, stress, mindfulness\n"
-                "- Relationships: Connections with family, friends, partners, social interactions\n"
-                "- Purpose: Meaning, values, beliefs, goals, personal growth, impact\n\n"
-                "A text can belong to multiple categories if it touches on multiple domains. "
-                "Analyze the content carefully and assign all relevant categories."
-            )
-            
-            user_prompt = (
-                f"Classify this text into one or more of these categories: work, health, relationships, purpose.\n\n"
-                f"Text: \"{text}\"\n\n"
-                f"Respond with just a comma-separated list of the applicable categories, like: category1, category2"
-            )
-            
             # Get classification from Claude
-            response = await self.claude_service.client.messages.create(
-                model=self.claude_service.model,
-                max_tokens=50,
-                system=system_prompt,
-                messages=[
-                    {"role": "user", "content": user_prompt}
-                ]
-            )
-            
-            # Parse the response to get categories
-            categories_text = response.content[0].text.strip().lower()
+            response = await self.claude_service.create_message(
+                "claude.classify_text", task="classify", priority=INGESTION, user_id=user_id, **self.build_request(text))
             
-            # Extract categories
-            extracted_categories = []
-            for category in self.CATEGORIES:
-                if category in categories_text:
-                    extracted_categories.append(category)
+            extracted_categories = self.parse_categories(response.content[0].text)
             
             logger.info(f"Classified text into categories: {extracted_categories}")
             return extracted_categories
             
         except Exception as e:
             logger.error(f"Error classifying text: {e}")
-            return []  # Return empty list on errorx
\ No newline at end of file
+            return []  # Return empty list on error
\ No newline at end of file
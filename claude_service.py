@@ -1,24 +1,134 @@
 # claude_service.py
+import time
+import inspect
 import logging
-import anthropic
 import config
-from typing import List, Dict, Any
+from collections import deque
+from typing import List, Dict, Any, Optional
+import resilience
+from metrics_service import InstrumentedExecutor, track, REGISTRY
+from models import Entry
+from llm_scheduler import LLMScheduler, estimate_tokens, INTERACTIVE, GAME, BACKGROUND
 
 logger = logging.getLogger(__name__)
 
+MODEL_REQUESTS = REGISTRY.counter(
+    "ragbot_llm_requests_total", "Claude requests by task and the model that served them", ["task", "model", "downgraded"]
+)
+
+# Recent call latencies kept per model for the latency budget; older samples
+# expire, so a downgraded model is tried again once its slow spell has passed
+_LATENCY_WINDOW = 50
+_LATENCY_WINDOW_SECONDS = 60
+
 class ClaudeService:
-    def __init__(self):
-        self.client = anthropic.Anthropic(api_key=config.ANTHROPIC_API_KEY)
-        # You can change to a different Claude model
-        self.model = "claude-3-7-sonnet-20250219"
+    # Returned by generate_response when Claude can't be reached
+    ERROR_RESPONSE = "I'm sorry, I encountered an error while processing your question. Please try again."
+
+    def __init__(self, client=None, scheduler=None):
+        self._client = client
+        # Used for requests made without a task; tasks are routed by config.LLM_ROUTES
+        self.model = config.LLM_ROUTES["chat"][0]
+        self._latencies = {}
+        # Synchronous clients (e.g. benchmark stand-ins) run on a thread pool
+        self._executor = InstrumentedExecutor("claude", max_workers=config.CLAUDE_EXECUTOR_WORKERS)
+        # Every request waits here first, so chat answers go ahead of background work
+        self.scheduler = scheduler or LLMScheduler(
+            rpm=config.LLM_RPM,
+            tpm=config.LLM_TPM,
+            max_concurrency=config.CLAUDE_EXECUTOR_WORKERS,
+            reserve_fraction=config.LLM_INTERACTIVE_RESERVE
+        )
+
+    @property
+    def client(self):
+        """Anthropic client, created (and the SDK imported) on first use."""
+        if self._client is None:
+            import anthropic
+            # Async, so cancelling a superseded request closes its HTTP connection
+            # instead of leaving it to finish on a thread
+            self._client = anthropic.AsyncAnthropic(api_key=config.ANTHROPIC_API_KEY)
+        return self._client
+
+    def _send(self, kwargs):
+        """Start one messages.create call, awaiting an async client directly."""
+        create = self.client.messages.create
+        # The SDK wraps its async methods in a sync decorator, so look underneath it
+        if inspect.iscoroutinefunction(inspect.unwrap(create)):
+            return create(**kwargs)
+        return self._executor.run(create, **kwargs)
+
+    def _recent_p95(self, model):
+        cutoff = time.monotonic() - _LATENCY_WINDOW_SECONDS
+        latencies = sorted(latency for at, latency in self._latencies.get(model, ()) if at >= cutoff)
+        if len(latencies) < 10:
+            return None
+        return latencies[int(0.95 * (len(latencies) - 1))]
+
+    def route(self, task: Optional[str], priority: int = BACKGROUND):
+        """
+        Pick the model and max_tokens for a task.
+
+        Args:
+            task: Key of config.LLM_ROUTES, or None for the default model
+            priority: Scheduler priority class of the request
+
+        Returns:
+            tuple: (model, max_tokens or None, whether the model was downgraded)
+        """
+        model, max_tokens = config.LLM_ROUTES.get(task, (self.model, None))
+        if not config.LLM_LATENCY_BUDGET_ENABLED or model == config.LLM_MODEL_SMALL:
+            return model, max_tokens, False
+
+        queue_depth = self.scheduler.queue_depth(priority)
+        p95 = self._recent_p95(model)
+        if queue_depth >= config.LLM_DOWNGRADE_QUEUE_DEPTH or (p95 is not None and p95 > config.LLM_LATENCY_SLO_SECONDS):
+            logger.info(f"Downgrading {task} to {config.LLM_MODEL_SMALL} "
+                        f"(queue depth {queue_depth}, recent p95 {p95 if p95 is None else round(p95, 2)}s)")
+            return config.LLM_MODEL_SMALL, max_tokens, True
+        return model, max_tokens, False
 
-    async def generate_response(self, user_query: str, context_entries: List[Dict[Any, Any]]) -> str:
+    async def create_message(self, stage: str, task: Optional[str] = None, priority: int = BACKGROUND,
+                             user_id: Optional[int] = None, **kwargs):
+        """
+        Send a Messages API request through the scheduler without blocking the event loop.
+
+        Args:
+            stage: Metrics stage name for this call, e.g. "claude.generate_response"
+            task: Key of config.LLM_ROUTES choosing the model and max_tokens, e.g. "chat"
+            priority: Scheduler priority class from llm_scheduler, e.g. INTERACTIVE
+            user_id: User the request is made for, for fair queueing between users
+            **kwargs: Arguments for client.messages.create; an explicit model or max_tokens wins
+
+        Returns:
+            The Anthropic Message response
+        """
+        model, max_tokens, downgraded = self.route(task, priority)
+        kwargs.setdefault("model", model)
+        if max_tokens:
+            kwargs.setdefault("max_tokens", max_tokens)
+        async with track(stage):
+            async with self.scheduler.request(priority, user_id, estimate_tokens(kwargs)) as grant:
+                start = time.monotonic()
+                response = await resilience.call(stage, "anthropic", lambda: self._send(kwargs), retry=True)
+                self._latencies.setdefault(kwargs["model"], deque(maxlen=_LATENCY_WINDOW)).append(
+                    (start, time.monotonic() - start))
+                MODEL_REQUESTS.inc(task or "default", kwargs["model"], str(downgraded).lower())
+                usage = getattr(response, "usage", None)
+                if usage is not None:
+                    grant.settle(usage.input_tokens + usage.output_tokens)
+                return response
+
+    async def generate_response(self, user_query: str, context_entries: List[Entry],
+                                profile_digest: Optional[str] = None, user_id: Optional[int] = None) -> str:
         """
         Generate a response using Claude with RAG context.
 
         Args:
             user_query: The user's question
-            context_entries: List of relevant context entries from the database
+            context_entries: Relevant entries from the database
+            profile_digest: Optional summary of the user, sent as a cacheable prompt prefix
+            user_id: The Telegram user ID, for fair scheduling
 
         Returns:
             str: Claude's response
@@ -29,33 +139,20 @@ class ClaudeService:
             categories_mentioned = set()
 
             for entry in context_entries:
-                entry_text = ""
-                categories = []
-
-                # Extract text
-                if "document" in entry and "text" in entry["document"]:
-                    entry_text = entry["document"]["text"]
-                elif "text" in entry:
-                    entry_text = entry["text"]
-                elif "metadata" in entry and "text" in entry["metadata"]:
-                    entry_text = entry["metadata"]["text"]
-
-                # Extract categories if available
-                if "metadata" in entry and "categories" in entry["metadata"]:
-                    categories = entry["metadata"]["categories"]
-                    categories_mentioned.update(categories)
+                if not entry.text:
+                    continue
+                categories_mentioned.update(entry.categories)
 
                 # Add category information to the context
-                if categories:
-                    formatted_entry = f"[Categories: {', '.join(categories)}] {entry_text}"
+                if entry.categories:
+                    context_texts.append(f"[Categories: {', '.join(entry.categories)}] {entry.text}")
                 else:
-                    formatted_entry = entry_text
-
-                if formatted_entry:
-                    context_texts.append(formatted_entry)
+                    context_texts.append(entry.text)
 
             # Format context for Claude
-            if context_texts:
+            if profile_digest:
+                system_prompt = self._build_profile_system(profile_digest, context_texts)
+            elif context_texts:
                 context_str = "\n\n".join(context_texts)
 
                 # Add information about categories in the query if relevant
@@ -81,10 +178,12 @@ class ClaudeService:
                     "You are a personal AI assistant. You don't have specific information about the user yet, "
                     "but you're here to help. Be conversational, supportive, and thoughtful in your responses.")
 
-            # Generate response - removed the await since Anthropic's client is synchronous
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=1000,
+            # Generate response
+            response = await self.create_message(
+                "claude.generate_response",
+                task="chat",
+                priority=INTERACTIVE,
+                user_id=user_id,
                 system=system_prompt,
                 messages=[
                     {"role": "user", "content": user_query}
@@ -99,14 +198,45 @@ class ClaudeService:
 
         except Exception as e:
             logger.error(f"Error generating Claude response: {e}")
-            return "I'm sorry, I encountered an error while processing your question. Please try again."
+            return self.ERROR_RESPONSE
+
+    def _build_profile_system(self, profile_digest: str, context_texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        Build system blocks with the stable instructions and digest first.
 
-    async def generate_game_question(self) -> str:
+        The first block only changes when the digest is updated, so it is marked
+        for prompt caching; the retrieved entries follow in their own block.
+        """
+        blocks = [{
+            "type": "text",
+            "text": (
+                "You are a personal AI assistant that knows the user well based on their past thoughts and interactions. "
+                "You should answer questions thoughtfully based on what you know about them. "
+                "If asked about the user's preferences, personality, or habits, rely on the profile and context provided "
+                "to give accurate, personalized responses. When you don't have enough information, acknowledge the "
+                "limitations in your knowledge rather than making assumptions. Be conversational, supportive, and "
+                "insightful. Thoughts are categorized into: work, health, relationships, and purpose.\n\n"
+                f"Profile of the user:\n{profile_digest}"
+            ),
+            "cache_control": {"type": "ephemeral"}
+        }]
+        if context_texts:
+            context_str = "\n\n".join(context_texts)
+            blocks.append({
+                "type": "text",
+                "text": f"Entries related to this question:\n{context_str}"
+            })
+        return blocks
+
+    async def generate_game_question(self, user_id: Optional[int] = None) -> str:
         """
         Generate a question for the 'get to know you' game.
 
+        Args:
+            user_id: The Telegram user ID, for fair scheduling
+
         Returns:
-            str: A question for the user
+            str: A question for the user, or None if Claude couldn't be reached
         """
         try:
             system_prompt = (
@@ -122,10 +252,11 @@ class ClaudeService:
                 "Focus on understanding how they think, what they value, and what shapes their worldview. "
                 "Make it open-ended and introspective.")
 
-            # Create a synchronous request - Anthropic's Python client doesn't support async natively
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=200,
+            response = await self.create_message(
+                "claude.generate_game_question",
+                task="game",
+                priority=GAME,
+                user_id=user_id,
                 system=system_prompt,
                 messages=[
                     {"role": "user", "content": user_prompt}
@@ -140,5 +271,5 @@ class ClaudeService:
 
         except Exception as e:
             logger.error(f"Error generating game question: {e}")
-            # Fallback question
-            return "What's something that you've changed your mind about recently, and why?"
\ No newline at end of file
+            # GameService falls back to its own questions
+            return None
@@ -27,18 +27,199 @@ DB_COLLECTION_THOUGHTS = "personal_thoughts"
 DB_COLLECTION_GAME = "game_responses"
 DB_COLLECTION_CHAT = "chat_interactions"
 
+# Local cache directory for state that speeds up restarts
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+
+# Collections confirmed to exist are not probed again on startup within this many seconds
+COLLECTION_CACHE_FILE = os.path.join(CACHE_DIR, "collections.json")
+COLLECTION_CACHE_TTL = int(os.getenv("COLLECTION_CACHE_TTL", str(24 * 60 * 60)))
+
+# Semantic cache for chat answers
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+# Minimum cosine similarity between the embeddings of two questions to reuse an answer;
+# high, because questions differing in one name or word still score close to 1
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.97"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "32"))
+ANSWER_CACHE_MAX_USERS = int(os.getenv("ANSWER_CACHE_MAX_USERS", "1000"))
+# Dimension of the local hashing embedder, used for MMR when stored embeddings aren't available
+HASH_EMBEDDING_DIMENSION = int(os.getenv("HASH_EMBEDDING_DIMENSION", "512"))
+
+# Local directory for state that outlives restarts
+DATA_DIR = os.getenv("DATA_DIR", "data")
+
+# Per-user profile digests used in chat prompts
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "true").lower() == "true"
+PROFILE_DIR = os.path.join(DATA_DIR, "profiles")
+# Fold queued entries into digests this often, or as soon as a batch is full
+PROFILE_UPDATE_INTERVAL = float(os.getenv("PROFILE_UPDATE_INTERVAL", "60"))
+PROFILE_BATCH_SIZE = int(os.getenv("PROFILE_BATCH_SIZE", "10"))
+PROFILE_MAX_ENTRY_CHARS = int(os.getenv("PROFILE_MAX_ENTRY_CHARS", "1000"))
+# Retrieved entries per collection when a digest is available
+PROFILE_CONTEXT_HITS = int(os.getenv("PROFILE_CONTEXT_HITS", "1"))
+
+# Hybrid retrieval: vector search fused with a local BM25 index
+HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+RRF_K = int(os.getenv("RRF_K", "60"))
+# (collection, user) indexes kept in memory before the least recently used is dropped
+LEXICAL_INDEX_MAX_INDEXES = int(os.getenv("LEXICAL_INDEX_MAX_INDEXES", "3000"))
+# Width of the buckets in the local per-user time index
+TIME_INDEX_BUCKET_SECONDS = int(os.getenv("TIME_INDEX_BUCKET_SECONDS", "86400"))
+# If set, chat context weight halves every this many days of an entry's age
+CHAT_RECENCY_HALF_LIFE_DAYS = float(os.getenv("CHAT_RECENCY_HALF_LIFE_DAYS", "0"))
+# Retrieved entries per collection for a chat answer
+CHAT_CONTEXT_HITS = int(os.getenv("CHAT_CONTEXT_HITS", "2"))
+
+# MMR reranking of chat context: over-fetch, then keep a diverse top-k
+MMR_ENABLED = os.getenv("MMR_ENABLED", "true").lower() == "true"
+MMR_OVERFETCH = int(os.getenv("MMR_OVERFETCH", "3"))
+# 1.0 ranks purely by relevance, 0.0 purely by novelty
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+MMR_BUDGET_MS = float(os.getenv("MMR_BUDGET_MS", "5"))
+
+# Near-duplicate thoughts: "skip" doesn't store them, "link" stores them marked
+# with the original's ID (excluded from retrieval), "off" disables the check.
+# Word sets can't tell "felt great" from "felt terrible", so nothing is dropped by default
+DEDUP_MODE = os.getenv("DEDUP_MODE", "link").lower()
+# Minimum estimated word-set (Jaccard) similarity for a near-duplicate; one changed
+# word in a ten-word thought still scores about 0.8, so this is kept above that
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.9"))
+# Shorter texts ("ok", "thanks") are never treated as duplicates
+DEDUP_MIN_WORDS = int(os.getenv("DEDUP_MIN_WORDS", "4"))
+
+# Also read and filter on the version 1 document layout; turn off once
+# migrate_schema.py has rewritten every collection
+SCHEMA_LEGACY_READS = os.getenv("SCHEMA_LEGACY_READS", "true").lower() == "true"
+
+# Per-user counts by category, week and source, kept up to date on every
+# store and delete and rendered by /stats
+STATS_ENABLED = os.getenv("STATS_ENABLED", "true").lower() == "true"
+STATS_DIR = os.path.join(DATA_DIR, "stats")
+# Changed aggregates are written to disk this often
+STATS_FLUSH_INTERVAL = float(os.getenv("STATS_FLUSH_INTERVAL", "10"))
+# Aggregates older than this are recounted from the database to correct drift
+STATS_RECONCILE_INTERVAL = float(os.getenv("STATS_RECONCILE_INTERVAL", str(24 * 3600)))
+
+# Embeddings are computed by the bot and sent with inserts and queries:
+# "openai" uses the embeddings API, "hashing" a local feature-hashing model
+# for offline use, and "server" leaves it to Astra Vectorize as before
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai").lower()
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+# Must match the dimension the collections were created with
+EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "1536"))
+# Texts requested within the window are embedded in one call, up to the batch size
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+# Memory-mapped cache of embeddings keyed by a hash of the model and text
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.path.join(CACHE_DIR, "embeddings")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "20000"))
+
+# Local vector search over each user's entries, with quantized codes in
+# memory ("int8" is 4x and "binary" 32x smaller than float32) and the full
+# vectors in a memory-mapped file for exact rescoring of a shortlist
+VECTOR_INDEX_ENABLED = os.getenv("VECTOR_INDEX_ENABLED", "true").lower() == "true"
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "int8").lower()
+# Shortlist size as a multiple of the result limit; higher improves recall
+VECTOR_RESCORE_FACTOR = int(os.getenv("VECTOR_RESCORE_FACTOR", "4"))
+# Each process maps its own unnamed file in this directory, named after this prefix
+VECTOR_FILE_PATH = os.path.join(CACHE_DIR, "vectors.f32")
+
+# Columnar snapshots written by snapshot.py; with warm start, local indexes
+# are filled from the latest one and only newer entries are read remotely
+SNAPSHOT_DIR = os.path.join(DATA_DIR, "snapshots")
+SNAPSHOT_WARM_START = os.getenv("SNAPSHOT_WARM_START", "true").lower() == "true"
+
+# Anthropic rate limits shared by every Claude call (0 disables a limit); set
+# them to your API tier. Requests below interactive chat priority leave this
+# share of each limit unused, as headroom for chat answers
+LLM_RPM = int(os.getenv("LLM_RPM", "50"))
+LLM_TPM = int(os.getenv("LLM_TPM", "40000"))
+LLM_INTERACTIVE_RESERVE = float(os.getenv("LLM_INTERACTIVE_RESERVE", "0.2"))
+
+# Claude model and max_tokens for each task: a small fast model for one-line
+# classifications and game questions, the larger one for chat answers
+LLM_MODEL_LARGE = os.getenv("LLM_MODEL_LARGE", "claude-3-7-sonnet-20250219")
+LLM_MODEL_SMALL = os.getenv("LLM_MODEL_SMALL", "claude-3-5-haiku-20241022")
+LLM_ROUTES = {
+    "chat": (os.getenv("LLM_MODEL_CHAT", LLM_MODEL_LARGE), int(os.getenv("LLM_MAX_TOKENS_CHAT", "1000"))),
+    "game": (os.getenv("LLM_MODEL_GAME", LLM_MODEL_SMALL), int(os.getenv("LLM_MAX_TOKENS_GAME", "150"))),
+    "classify": (os.getenv("LLM_MODEL_CLASSIFY", LLM_MODEL_SMALL), int(os.getenv("LLM_MAX_TOKENS_CLASSIFY", "20"))),
+    "profile": (os.getenv("LLM_MODEL_PROFILE", LLM_MODEL_LARGE), int(os.getenv("LLM_MAX_TOKENS_PROFILE", "600"))),
+}
+# Latency budget: downgrade a task to LLM_MODEL_SMALL while the scheduler
+# queue ahead of it is this deep, or while the routed model's recent p95
+# latency is above the SLO
+LLM_LATENCY_BUDGET_ENABLED = os.getenv("LLM_LATENCY_BUDGET_ENABLED", "false").lower() == "true"
+LLM_DOWNGRADE_QUEUE_DEPTH = int(os.getenv("LLM_DOWNGRADE_QUEUE_DEPTH", "8"))
+LLM_LATENCY_SLO_SECONDS = float(os.getenv("LLM_LATENCY_SLO_SECONDS", "8"))
+
+# Text messages a user sends in quick succession in one mode are merged into
+# one input: a burst ends after COALESCE_QUIET_MS without a new message, or
+# COALESCE_MAX_WAIT_MS after its first message. Off by default, since every
+# text message then waits at least COALESCE_QUIET_MS before it is handled
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "false").lower() == "true"
+COALESCE_QUIET_MS = float(os.getenv("COALESCE_QUIET_MS", "800"))
+COALESCE_MAX_WAIT_MS = float(os.getenv("COALESCE_MAX_WAIT_MS", "3000"))
+
+# Calls to Anthropic, OpenAI and Astra time out at a multiple of their recent
+# p99 latency (within the bounds below). Idempotent calls are retried with
+# jittered backoff, as long as retries and hedges stay within RETRY_BUDGET_RATIO
+# per call. Quick reads are hedged with a second request after their p95.
+# An upstream that keeps failing is short-circuited to the callers' fallbacks
+# for BREAKER_RESET_SECONDS
+RESILIENCE_ENABLED = os.getenv("RESILIENCE_ENABLED", "true").lower() == "true"
+TIMEOUT_MIN_SECONDS = float(os.getenv("TIMEOUT_MIN_SECONDS", "2"))
+TIMEOUT_MAX_SECONDS = float(os.getenv("TIMEOUT_MAX_SECONDS", "60"))
+TIMEOUT_P99_MULTIPLIER = float(os.getenv("TIMEOUT_P99_MULTIPLIER", "3"))
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.2"))
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() == "true"
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+# Thread pools for the blocking SDK clients
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "8"))
+CLAUDE_EXECUTOR_WORKERS = int(os.getenv("CLAUDE_EXECUTOR_WORKERS", "8"))
+WHISPER_EXECUTOR_WORKERS = int(os.getenv("WHISPER_EXECUTOR_WORKERS", "4"))
+EMBEDDING_EXECUTOR_WORKERS = int(os.getenv("EMBEDDING_EXECUTOR_WORKERS", "4"))
+
+# Metrics endpoint
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+# Tracing
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+TRACE_DUMP_FILE = os.getenv("TRACE_DUMP_FILE", os.path.join("logs", "traces.json"))
+
+# Anonymized traffic capture for load-test replays (disabled when unset)
+CAPTURE_FILE = os.getenv("CAPTURE_FILE")
+
+# Telegram user IDs allowed to use admin commands such as /trace
+ADMIN_USER_IDS = {
+    int(user_id) for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip()
+}
+
 # Configure logging
 LOG_DIR = "logs"
-if not os.path.exists(LOG_DIR):
-    os.makedirs(LOG_DIR)
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(os.path.join(LOG_DIR, "bot.log")),
-        logging.StreamHandler()
-    ]
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Per-module overrides, e.g. "httpx=WARNING,database=DEBUG"
+LOG_MODULE_LEVELS = os.getenv("LOG_MODULE_LEVELS", "httpx=WARNING")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+# Keep one in every N debug lines per call site
+LOG_DEBUG_SAMPLE_RATE = int(os.getenv("LOG_DEBUG_SAMPLE_RATE", "10"))
+
+from logging_service import setup_logging, parse_module_levels
+
+setup_logging(
+    LOG_DIR,
+    level=LOG_LEVEL,
+    module_levels=parse_module_levels(LOG_MODULE_LEVELS),
+    max_bytes=LOG_MAX_BYTES,
+    backup_count=LOG_BACKUP_COUNT,
+    debug_sample_rate=LOG_DEBUG_SAMPLE_RATE
 )
 
 logger = logging.getLogger(__name__)
\ No newline at end of file
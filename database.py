@@ -1,98 +1,194 @@
 # database.py
+import os
 import uuid
+import asyncio
+import time
+import numpy as np
 import logging
-import datetime
 import json
-from astrapy.db import AstraDB, AstraDBCollection
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import config
+import schema
+import resilience
+from lexical_index import LexicalIndex, reciprocal_rank_fusion
+from time_index import TimeBucketIndex
+from models import Entry
+from near_duplicates import MinHasher, MinHashLSH, word_count
+from stats_service import StatsService, TRACKED_COLLECTIONS
+from vector_store import VectorFile, QuantizedVectorIndex
+from snapshot import latest_snapshot, SnapshotReader
+from metrics_service import InstrumentedExecutor, track
+import service_registry
 
 logger = logging.getLogger(__name__)
 
 class DatabaseService:
-    def __init__(self):
-        """Initialize the database service with connection to AstraDB."""
+    def __init__(self, db=None, embedder=None):
+        """
+        Initialize the database service with connection to AstraDB.
+
+        Args:
+            db: Optional AstraDB-compatible client, e.g. a stand-in for benchmarks
+            embedder: Optional EmbeddingService; defaults to the shared one, which
+                is None when EMBEDDING_PROVIDER is "server"
+        """
         try:
-            print("🔌 Connecting to AstraDB...")
-            self.db = AstraDB(
-                token=config.ASTRA_DB_APPLICATION_TOKEN,
-                api_endpoint=config.ASTRA_DB_API_ENDPOINT
-            )
+            # Blocking astrapy calls run here so they don't stall the event loop
+            self._executor = InstrumentedExecutor("db", max_workers=config.DB_EXECUTOR_WORKERS)
+            
+            # Per-user counter bumped whenever a user's thoughts or game answers change
+            self._corpus_versions = {}
+            
+            # Local BM25 and time indexes keyed by (collection, user), built on first use
+            self._local_indexes = OrderedDict()
+            self._local_loading = {}
+            # Latest snapshot per collection, opened on first index load
+            self._snapshots = {}
+            self._snapshot_lock = threading.Lock()
+            
+            # Vectors are computed here and sent with inserts and queries
+            self.embedder = embedder if embedder is not None else service_registry.get_embedding_service()
+            
+            # Full vectors behind the local quantized indexes, for exact rescoring
+            self._vector_file = None
+            if self.embedder and config.VECTOR_INDEX_ENABLED:
+                self._vector_file = VectorFile(config.VECTOR_FILE_PATH, self.embedder.dimension)
+            
+            # Per-user counts for /stats, kept up to date by store_entry and delete_entry
+            self.stats = StatsService(self._scan_for_stats) if config.STATS_ENABLED else None
+
+            logger.debug("Connecting to AstraDB...")
+            if db is None:
+                # Imported here so importing this module stays cheap
+                from astrapy.db import AstraDB
+                db = AstraDB(
+                    token=config.ASTRA_DB_APPLICATION_TOKEN,
+                    api_endpoint=config.ASTRA_DB_API_ENDPOINT
+                )
+            self.db = db
             
-            print("✅ Connected to AstraDB successfully")
+            logger.info("Connected to AstraDB successfully")
             
             # Initialize collections
             self._init_collections()
             
         except Exception as e:
             error_msg = f"Failed to initialize database connection: {e}"
-            print(f"❌ {error_msg}")
             logger.error(error_msg)
             raise
 
+    async def _call(self, endpoint, func, *args, retry=False, hedge=False, timeout=True, **kwargs):
+        """
+        Run a blocking astrapy call on the executor through the resilience layer.
+
+        Args:
+            endpoint: Name for its latency window and metrics, e.g. "db.get_entry"
+            func: The astrapy method or function to call
+            retry: Retry transient failures; only for reads
+            hedge: Send a second request if the first is slow; only for quick reads
+            timeout: Apply the adaptive timeout; False for writes, which can't be
+                abandoned once on the executor, and for scans of unknown length
+        """
+        return await resilience.call(
+            endpoint, "astra", lambda: self._executor.run(func, *args, **kwargs),
+            retry=retry, hedge=hedge, timeout=timeout)
+
     def _init_collections(self):
         """Initialize all required collections."""
         try:
-            print("🏗️ Setting up collections...")
+            logger.debug("Setting up collections...")
+            
+            names = [config.DB_COLLECTION_THOUGHTS, config.DB_COLLECTION_GAME, config.DB_COLLECTION_CHAT]
+            known = self._load_collection_cache()
+            
+            # Probe the collections we haven't recently seen, all at once
+            with ThreadPoolExecutor(max_workers=len(names)) as pool:
+                collections = dict(zip(names, pool.map(
+                    lambda name: self.db.collection(name) if name in known
+                    else self._safely_create_collection(name),
+                    names
+                )))
             
-            # Create each collection with better error handling
-            self.thoughts_collection = self._safely_create_collection(config.DB_COLLECTION_THOUGHTS)
-            self.game_collection = self._safely_create_collection(config.DB_COLLECTION_GAME)
-            self.chat_collection = self._safely_create_collection(config.DB_COLLECTION_CHAT)
+            self.thoughts_collection = collections[config.DB_COLLECTION_THOUGHTS]
+            self.game_collection = collections[config.DB_COLLECTION_GAME]
+            self.chat_collection = collections[config.DB_COLLECTION_CHAT]
             
-            print("✅ All collections initialized successfully")
+            if len(known) < len(names):
+                self._save_collection_cache(names)
+            
+            logger.info("All collections initialized successfully")
             
         except Exception as e:
             error_msg = f"Failed to initialize collections: {e}"
-            print(f"❌ {error_msg}")
             logger.error(error_msg)
             raise
 
+    def _load_collection_cache(self):
+        """Return collection names recently confirmed to exist at this endpoint."""
+        try:
+            with open(config.COLLECTION_CACHE_FILE, encoding="utf-8") as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return set()
+        
+        if cache.get("endpoint") != config.ASTRA_DB_API_ENDPOINT:
+            return set()
+        if time.time() - cache.get("checked_at", 0) > config.COLLECTION_CACHE_TTL:
+            return set()
+        return set(cache.get("collections", []))
+
+    def _save_collection_cache(self, names):
+        """Remember that these collections exist so the next start skips probing them."""
+        try:
+            os.makedirs(os.path.dirname(config.COLLECTION_CACHE_FILE), exist_ok=True)
+            with open(config.COLLECTION_CACHE_FILE, "w", encoding="utf-8") as f:
+                json.dump({
+                    "endpoint": config.ASTRA_DB_API_ENDPOINT,
+                    "checked_at": time.time(),
+                    "collections": names
+                }, f)
+        except OSError as e:
+            logger.warning(f"Could not write collection cache: {e}")
+
     def _safely_create_collection(self, collection_name):
         """Create a collection with robust error handling."""
         try:
-            print(f"🔍 Checking if collection '{collection_name}' exists...")
+            logger.debug("Checking if collection '%s' exists...", collection_name)
             
             # First try to get the collection directly - if it exists, this will work
             try:
-                collection = AstraDBCollection(
-                    collection_name=collection_name,
-                    astra_db=self.db
-                )
+                collection = self.db.collection(collection_name)
                 
                 # Test if the collection really exists by making a small query
                 test = collection.find({}, options={"limit": 1})
-                print(f"✅ Collection '{collection_name}' already exists")
+                logger.debug("Collection '%s' already exists", collection_name)
                 return collection
                 
             except Exception as inner_e:
                 # Collection might not exist, so we'll create it
-                print(f"ℹ️ Collection '{collection_name}' may not exist: {inner_e}")
-                print(f"🆕 Creating collection '{collection_name}'...")
+                logger.info(f"Collection '{collection_name}' may not exist, creating it: {inner_e}")
                 
                 # Create the collection explicitly
                 creation_result = self.db.create_collection(
                     collection_name=collection_name,
-                    dimension=1536  # Default dimension for OpenAI embeddings
+                    dimension=config.EMBEDDING_DIMENSION
                 )
                 
-                print(f"📊 Creation result: {creation_result}")
+                logger.debug("Creation result: %s", creation_result)
                 
                 if isinstance(creation_result, dict) and creation_result.get("status", {}).get("code") == 409:
-                    print(f"⚠️ Collection '{collection_name}' already exists (409 conflict)")
+                    logger.warning(f"Collection '{collection_name}' already exists (409 conflict)")
                 else:
-                    print(f"✅ Created new collection: {collection_name}")
                     logger.info(f"Created new collection: {collection_name}")
                 
                 # Now get the collection object
-                collection = AstraDBCollection(
-                    collection_name=collection_name,
-                    astra_db=self.db
-                )
+                collection = self.db.collection(collection_name)
                 return collection
                 
         except Exception as e:
             error_msg = f"Error creating collection {collection_name}: {e}"
-            print(f"❌ {error_msg}")
             logger.error(error_msg)
             raise
 
@@ -101,7 +197,6 @@ class DatabaseService:
         try:
             if not text:
                 logger.warning("Attempted to store empty text")
-                print("⚠️ Attempted to store empty text")
                 return None
                 
             collection = self._get_collection_by_name(collection_name)
@@ -110,105 +205,461 @@ class DatabaseService:
             entry_id = str(uuid.uuid4())
             
             # Prepare metadata
-            if metadata is None:
-                metadata = {}
+            metadata = dict(metadata or {})
+            now = time.time()
+            metadata["created_ts"] = now
             
-            metadata["text"] = text
-            metadata["created_at"] = str(datetime.datetime.now())
-            
-            # Add categories if provided
-            if categories:
-                metadata["categories"] = categories
+            document = schema.encode(entry_id, text, metadata, categories)
+            vector = None
+            if self.embedder:
+                vector = await self.embedder.embed(text)
+                document["$vector"] = vector.tolist()
             
             # Store the document with its vector embedding
-            print(f"💾 Storing entry in {collection_name}...")
-            # Note: AstraDB will handle the embedding generation automatically with Astra Vectorize
-            # Changed: Removed await as insert_one is not awaitable
-            result = collection.insert_one({
-                "_id": entry_id,
-                "text": text,
-                "metadata": metadata
-            })
-            
-            print(f"✅ Stored entry in {collection_name} with ID: {entry_id}")
+            logger.debug("Storing entry in %s...", collection_name)
+            async with track("db.store_entry"):
+                # No timeout: the insert would keep running on its thread and could
+                # commit after the user was told it failed
+                result = await self._call("db.store_entry", collection.insert_one, document, timeout=False)
+            
             logger.info(f"Stored entry in {collection_name} with ID: {entry_id}")
+            self._bump_corpus_version(collection_name, metadata.get("user_id"))
+            indexes = self._local_indexes.get((collection_name, metadata.get("user_id")))
+            if indexes is not None:
+                indexes.add(entry_id, text, now, metadata.get("duplicate_of"), vector)
+            if self.stats:
+                self.stats.record(collection_name, Entry(
+                    entry_id, text, metadata.get("user_id"), categories or (), now, metadata.get("source")))
             return entry_id
             
         except Exception as e:
             error_msg = f"Error storing entry in {collection_name}: {e}"
-            print(f"❌ {error_msg}")
             logger.error(error_msg)
             return None
 
-    async def search_similar(self, collection_name, query_text, limit=5):
-        """Search for similar entries using vector similarity."""
+    def corpus_version(self, user_id):
+        """Return a number that changes whenever the user's stored knowledge changes."""
+        return self._corpus_versions.get(user_id, 0)
+
+    def _bump_corpus_version(self, collection_name, user_id):
+        # Chat interactions are only questions, so they don't change what we know
+        if user_id is None or collection_name == config.DB_COLLECTION_CHAT:
+            return
+        self._corpus_versions[user_id] = self._corpus_versions.get(user_id, 0) + 1
+
+    @staticmethod
+    def _build_filter(user_id=None, since=None, until=None, **conditions):
+        """Build a Data API filter for an optional owner and creation time range."""
+        if user_id is not None:
+            conditions["user_id"] = user_id
+        time_range = {}
+        if since is not None:
+            time_range["$gte"] = since
+        if until is not None:
+            time_range["$lt"] = until
+        if time_range:
+            conditions["created_ts"] = time_range
+        return schema.build_filter(**conditions)
+
+    async def search_similar(self, collection_name, query_text, limit=5, user_id=None,
+                             since=None, until=None, recency_half_life=None):
+        """
+        Search for similar entries, optionally limited to one user and a time range.
+
+        For a single user's entries, vector results are fused with BM25 results
+        from the local lexical index by reciprocal-rank fusion, so exact names,
+        places and dates are found even when they score poorly on similarity.
+        When the user's vectors are held locally, the vector search runs on the
+        quantized index instead of the server.
+
+        Args:
+            collection_name: Collection to search
+            query_text: The query
+            limit: Maximum number of results
+            user_id: Only return this user's entries
+            since: Only entries created at or after this epoch timestamp
+            until: Only entries created before this epoch timestamp
+            recency_half_life: If set, seconds after which an entry's rank weight halves
+
+        Returns:
+            list: Matching models.Entry objects, best first
+        """
         try:
             collection = self._get_collection_by_name(collection_name)
             
-            print(f"🔍 Searching for similar entries in {collection_name}...")
-            # Changed: Removed await as vector_find is not awaitable
-            results = collection.vector_find(
-                query_text,
-                limit=limit,
-                includeSimilarity=True  # Include the similarity score
-            )
+            # Recency decay reorders results, so give it a few extra to choose from
+            fetch_limit = limit * 2 if recency_half_life else limit
+            
+            # Embedded while the local indexes are searched
+            query_vector = asyncio.ensure_future(self._query_vector(query_text))
+            
+            indexes = None
+            if user_id is not None and (config.HYBRID_SEARCH_ENABLED or self._vector_file is not None):
+                indexes = await self._get_local_indexes(collection_name, user_id)
+            allowed = None
+            if indexes is not None and (since is not None or until is not None):
+                # A set, so the vector index's per-entry membership test is O(1)
+                allowed = set(indexes.timeline.range(since, until))
+            
+            lexical_ids = []
+            if config.HYBRID_SEARCH_ENABLED and indexes is not None:
+                lexical_ids = [entry_id for entry_id, _ in
+                               indexes.lexical.search(query_text, fetch_limit, allowed)]
+            
+            logger.debug("Searching for similar entries in %s...", collection_name)
+            async with track("db.search_similar"):
+                if indexes is not None and indexes.vectors is not None:
+                    results = await self._search_local_vectors(
+                        collection, indexes, await query_vector, lexical_ids, fetch_limit, allowed)
+                else:
+                    results = await self._search_remote_vectors(
+                        collection, await query_vector, lexical_ids, fetch_limit,
+                        self._build_filter(user_id, since, until), indexes)
+            
+            # Entries linked to an earlier near-duplicate would only repeat it
+            results = [entry for entry in results if not entry.duplicate_of]
+            if recency_half_life:
+                results = self._apply_recency(results, recency_half_life)
+            results = results[:limit]
             
-            print(f"✅ Found {len(results)} similar entries in {collection_name}")
             logger.info(f"Found {len(results)} similar entries in {collection_name}")
             return results
             
         except Exception as e:
             error_msg = f"Error searching in {collection_name}: {e}"
-            print(f"❌ {error_msg}")
             logger.error(error_msg)
             return []
 
-    async def search_by_category(self, collection_name, category, limit=10):
-        """Search for entries in a specific category."""
+    async def _query_vector(self, query_text):
+        """The query's embedding, or the text itself for server-side vectorize."""
+        if not self.embedder:
+            return query_text
+        return await self.embedder.embed(query_text)
+
+    async def _search_remote_vectors(self, collection, query_vector, lexical_ids, limit, filter, indexes=None):
+        """Vector search on the server, fused with the lexical ranking if there is one."""
+        vector_call = self._call(
+            "db.vector_find",
+            collection.vector_find,
+            query_vector if isinstance(query_vector, str) else query_vector.tolist(),
+            limit=limit,
+            filter=filter or None,
+            fields=schema.read_fields(),
+            include_similarity=True,  # Include the similarity score
+            retry=True,
+            hedge=True
+        )
+        if not lexical_ids:
+            return [Entry.from_document(doc) for doc in await vector_call]
+        
+        # Lexical hits are fetched alongside the vector search, not after it
+        results, lexical_results = await asyncio.gather(
+            vector_call, self._find_by_ids(collection, lexical_ids, indexes))
+        return self._fuse_results(
+            [Entry.from_document(doc) for doc in results], lexical_ids, lexical_results, limit)
+
+    async def _search_local_vectors(self, collection, indexes, query_vector, lexical_ids, limit, allowed):
+        """Vector search in the user's local quantized index; both rankings are fetched in one request."""
+        hits = indexes.vectors.search(query_vector, limit, allowed)
+        vector_ids = [entry_id for entry_id, _ in hits]
+        entry_ids = list(dict.fromkeys(vector_ids + lexical_ids))
+        if not entry_ids:
+            return []
+        
+        entries = {entry.id: entry for entry in await self._find_by_ids(collection, entry_ids, indexes)}
+        vector_results = []
+        for entry_id, cosine in hits:
+            entry = entries.get(entry_id)
+            if entry is not None:
+                # Same scale as the Data API's cosine $similarity
+                entry.similarity = (1 + cosine) / 2
+                vector_results.append(entry)
+        if not lexical_ids:
+            return vector_results
+        lexical_results = [entries[entry_id] for entry_id in lexical_ids if entry_id in entries]
+        return self._fuse_results(vector_results, lexical_ids, lexical_results, limit)
+
+    async def _find_by_ids(self, collection, entry_ids, indexes=None):
+        """
+        Fetch entries by ID in one request.
+
+        If the user's local indexes are given, IDs that turn out not to exist
+        any more (e.g. deleted after the snapshot they were loaded from) are
+        dropped from them.
+        """
+        response = await self._call(
+            "db.find_by_ids",
+            collection.find,
+            filter={"_id": {"$in": entry_ids}},
+            projection=schema.read_projection(),
+            options={"limit": len(entry_ids)},
+            retry=True,
+            hedge=True
+        )
+        data = response.get("data", {})
+        entries = [Entry.from_document(doc) for doc in data.get("documents", [])]
+        # Only a complete response proves the others are gone
+        if indexes is not None and not data.get("nextPageState") and len(entries) < len(entry_ids):
+            found = {entry.id for entry in entries}
+            for entry_id in entry_ids:
+                if entry_id not in found:
+                    indexes.remove(entry_id)
+        return entries
+
+    @staticmethod
+    def _fuse_results(vector_results, lexical_ids, lexical_results, limit):
+        """Merge vector and lexical rankings with reciprocal-rank fusion."""
+        entries = {entry.id: entry for entry in lexical_results}
+        # Prefer the vector copy, which carries the similarity
+        entries.update((entry.id, entry) for entry in vector_results)
+        
+        # Lexical IDs whose documents are gone (e.g. deleted meanwhile) are skipped
+        ranking = reciprocal_rank_fusion(
+            [[entry.id for entry in vector_results], lexical_ids], k=config.RRF_K)
+        return [entries[entry_id] for entry_id in ranking if entry_id in entries][:limit]
+
+    @staticmethod
+    def _apply_recency(results, half_life):
+        """Reorder ranked results, halving each one's rank weight every half_life seconds of age."""
+        now = time.time()
+        
+        def weight(item):
+            rank, entry = item
+            age = max(0.0, now - entry.timestamp) if entry.timestamp is not None else half_life * 4
+            return (1.0 / (config.RRF_K + rank + 1)) * 0.5 ** (age / half_life)
+        
+        return [entry for _, entry in sorted(enumerate(results), key=weight, reverse=True)]
+
+    async def _get_local_indexes(self, collection_name, user_id):
+        """Return the user's local indexes for a collection, loading them on first use."""
+        key = (collection_name, user_id)
+        loading = self._local_loading.get(key)
+        if loading is not None:
+            return await asyncio.shield(loading)
+        
+        indexes = self._local_indexes.get(key)
+        if indexes is not None:
+            self._local_indexes.move_to_end(key)
+            return indexes
+        
+        # Registered before loading so entries stored meanwhile are added too
+        indexes = self._local_indexes[key] = _LocalIndexes(self._vector_file)
+        while len(self._local_indexes) > config.LEXICAL_INDEX_MAX_INDEXES:
+            _, evicted = self._local_indexes.popitem(last=False)
+            evicted.release()
+        loading = self._local_loading[key] = asyncio.ensure_future(
+            self._load_local_indexes(collection_name, user_id, indexes))
+        return await asyncio.shield(loading)
+
+    async def _load_local_indexes(self, collection_name, user_id, indexes):
+        """Fill new local indexes with the user's stored entries."""
+        key = (collection_name, user_id)
+        collection = self._get_collection_by_name(collection_name)
+        
+        projection = schema.read_projection()
+        if indexes.vectors is not None:
+            projection["$vector"] = 1
+        
+        def read_entries():
+            entries = []
+            since = None
+            snapshot = self._get_snapshot(collection_name)
+            if snapshot is not None:
+                with_vectors = indexes.vectors is not None and snapshot.dimension == self._vector_file.dimension
+                entries.extend(snapshot.entries(user_id, with_vectors))
+                # Only entries stored since the export started are read remotely
+                since = snapshot.exported_at
+            for doc in collection.paginated_find(filter=self._build_filter(user_id, since), projection=projection):
+                entry = Entry.from_document(doc)
+                vector = doc.get("$vector")
+                entries.append((entry.id, entry.text, entry.timestamp, entry.duplicate_of,
+                                np.asarray(vector, dtype=np.float32) if vector else None))
+            return entries
+        
+        try:
+            async with track("db.lexical_load"):
+                entries = await self._call("db.lexical_load", read_entries, retry=True, timeout=False)
+            for entry_id, text, timestamp, duplicate_of, vector in entries:
+                indexes.add(entry_id, text, timestamp, duplicate_of, vector)
+            if self._local_indexes.get(key) is not indexes:
+                # Evicted while loading
+                indexes.release()
+            logger.debug("Loaded local indexes for user %s in %s (%s entries)", user_id, collection_name, len(indexes.lexical))
+            return indexes
+        except Exception as e:
+            logger.error(f"Error loading local indexes for {collection_name}: {e}")
+            # Fall back to remote queries only and try again next time
+            if self._local_indexes.pop(key, None) is not None:
+                indexes.release()
+            return None
+        finally:
+            self._local_loading.pop(key, None)
+
+    def stored_vectors(self, user_id, entry_ids):
+        """
+        Full embeddings of a user's entries held by the local vector indexes.
+
+        Only indexes already loaded are consulted, so this never calls Astra.
+
+        Returns:
+            dict: Entry ID -> unit vector, for the entries that were found
+        """
+        found = {}
+        for (_, owner), indexes in list(self._local_indexes.items()):
+            if owner == user_id and indexes is not None and indexes.vectors is not None:
+                found.update(indexes.vectors.vectors(entry_ids))
+        return found
+
+    def _get_snapshot(self, collection_name):
+        """Open the latest snapshot of a collection for warm starts, once; None if there is none."""
+        if not config.SNAPSHOT_WARM_START:
+            return None
+        with self._snapshot_lock:
+            if collection_name not in self._snapshots:
+                reader = None
+                snapshot_dir = latest_snapshot()
+                if snapshot_dir is not None:
+                    try:
+                        reader = SnapshotReader(snapshot_dir, collection_name)
+                        logger.info(f"Warm-starting {collection_name} indexes from snapshot {snapshot_dir}")
+                    except Exception as e:
+                        logger.warning(f"Could not open snapshot {snapshot_dir} for {collection_name}: {e}")
+                self._snapshots[collection_name] = reader
+            return self._snapshots[collection_name]
+
+    async def find_near_duplicate(self, collection_name, text, user_id):
+        """
+        Look for an earlier entry by the same user that nearly repeats a text.
+
+        Args:
+            collection_name: Collection the text would be stored in
+            text: The new text
+            user_id: The Telegram user ID
+
+        Returns:
+            str: ID of the closest earlier entry, or None if there is none
+        """
+        if config.DEDUP_MODE == "off" or user_id is None or word_count(text) < config.DEDUP_MIN_WORDS:
+            return None
+        try:
+            indexes = await self._get_local_indexes(collection_name, user_id)
+            if indexes is None:
+                return None
+            match = indexes.duplicates.find(_LocalIndexes.hasher.signature(text))
+            if match is None:
+                return None
+            
+            entry_id, similarity = match
+            logger.info(f"Text from user {user_id} is a near-duplicate of {entry_id} (similarity {similarity:.2f})")
+            return entry_id
+        except Exception as e:
+            logger.error(f"Error checking for duplicates in {collection_name}: {e}")
+            return None
+
+    async def get_entry(self, collection_name, entry_id):
+        """Fetch a single entry by ID as a models.Entry, or None if it doesn't exist."""
+        try:
+            collection = self._get_collection_by_name(collection_name)
+            async with track("db.get_entry"):
+                response = await self._call(
+                    "db.get_entry", collection.find_one, filter={"_id": entry_id},
+                    projection=schema.read_projection(), retry=True, hedge=True)
+            document = response.get("data", {}).get("document")
+            return Entry.from_document(document) if document else None
+        except Exception as e:
+            logger.error(f"Error fetching entry {entry_id} from {collection_name}: {e}")
+            return None
+
+    async def search_by_category(self, collection_name, category, limit=10, user_id=None,
+                                 since=None, until=None):
+        """Search for entries in a specific category, newest first, as models.Entry objects."""
         try:
             collection = self._get_collection_by_name(collection_name)
             
-            print(f"🔍 Searching for entries in category '{category}'...")
-            # Changed: Removed await as find is not awaitable
-            results = collection.find(
-                filter={"metadata.categories": {"$in": [category]}},
-                options={"limit": limit}
-            )
+            logger.debug("Searching for entries in category '%s'...", category)
+            async with track("db.search_by_category"):
+                response = await self._call(
+                    "db.search_by_category",
+                    collection.find,
+                    filter=self._build_filter(user_id, since, until, categories={"$in": [category]}),
+                    projection=schema.read_projection(),
+                    sort={schema.sort_path("created_ts"): -1},
+                    options={"limit": limit},
+                    retry=True,
+                    hedge=True
+                )
+            results = [Entry.from_document(doc) for doc in response.get("data", {}).get("documents", [])]
             
-            print(f"✅ Found {len(results)} entries in category '{category}'")
             logger.info(f"Found {len(results)} entries in category '{category}'")
             return results
             
         except Exception as e:
             error_msg = f"Error searching category '{category}' in {collection_name}: {e}"
-            print(f"❌ {error_msg}")
             logger.error(error_msg)
             return []
 
-    async def delete_entry(self, collection_name, entry_id):
-        """Delete an entry by ID."""
+    async def delete_entry(self, collection_name, entry_id, user_id=None, entry=None):
+        """
+        Delete an entry by ID.
+        
+        Args:
+            collection_name: Collection the entry is stored in
+            entry_id: The document ID
+            user_id: The owner, so their caches are invalidated
+            entry: The models.Entry being deleted, if already fetched; otherwise
+                it is looked up first so it can be taken out of the stats
+        """
         try:
             collection = self._get_collection_by_name(collection_name)
             
-            print(f"🗑️ Deleting entry {entry_id} from {collection_name}...")
-            # Changed: Removed await as delete_one is not awaitable
-            result = collection.delete_one({"_id": entry_id})
+            if self.stats and entry is None and collection_name in TRACKED_COLLECTIONS:
+                entry = await self.get_entry(collection_name, entry_id)
+            
+            logger.debug("Deleting entry %s from %s...", entry_id, collection_name)
+            async with track("db.delete_entry"):
+                # No timeout, for the same reason as in store_entry
+                result = await self._call("db.delete_entry", collection.delete_one, entry_id, timeout=False)
             
-            if result and result.get("deletedCount", 0) > 0:
-                print(f"✅ Deleted entry {entry_id} from {collection_name}")
+            # The Data API reports the count under "status"
+            deleted_count = (result or {}).get("status", {}).get("deletedCount", 0)
+            if deleted_count > 0:
                 logger.info(f"Deleted entry {entry_id} from {collection_name}")
+                self._bump_corpus_version(collection_name, user_id)
+                indexes = self._local_indexes.get((collection_name, user_id))
+                if indexes is not None:
+                    indexes.remove(entry_id)
+                if self.stats and entry is not None:
+                    self.stats.record(collection_name, entry, -1)
                 return True
             else:
-                print(f"⚠️ Entry {entry_id} not found in {collection_name}")
                 logger.warning(f"Entry {entry_id} not found in {collection_name}")
                 return False
                 
         except Exception as e:
             error_msg = f"Error deleting entry {entry_id} from {collection_name}: {e}"
-            print(f"❌ {error_msg}")
             logger.error(error_msg)
             return False
 
+    async def _scan_for_stats(self, user_id):
+        """Read every thought and game answer of a user, without their text, for a stats recount."""
+        fields = ["v", "u", "ts", "c", "s"]
+        if config.SCHEMA_LEGACY_READS:
+            fields.append("metadata")
+        
+        def read_entries():
+            entries = []
+            for collection_name in TRACKED_COLLECTIONS:
+                collection = self._get_collection_by_name(collection_name)
+                for doc in collection.paginated_find(
+                    filter=self._build_filter(user_id),
+                    projection={field: 1 for field in fields}
+                ):
+                    entries.append((collection_name, Entry.from_document(doc)))
+            return entries
+        
+        async with track("db.stats_scan"):
+            return await self._call("db.stats_scan", read_entries, retry=True, timeout=False)
+
     def _get_collection_by_name(self, collection_name):
         """Get the appropriate collection based on the name."""
         if collection_name == config.DB_COLLECTION_THOUGHTS:
@@ -219,58 +670,101 @@ class DatabaseService:
             return self.chat_collection
         else:
             error_msg = f"Unknown collection name: {collection_name}"
-            print(f"❌ {error_msg}")
             raise ValueError(error_msg)
 
-    async def get_all_entries(self, collection_name, page=1, page_size=10):
-        """Get all entries from a collection with pagination."""
+    async def get_all_entries(self, collection_name, page=1, page_size=10, user_id=None,
+                              since=None, until=None):
+        """
+        Get entries from a collection with pagination, newest first, as models.Entry objects.
+
+        For a single user the page is read from the local time index and the
+        documents fetched by ID, so it doesn't depend on a server-side sort.
+        """
         try:
             collection = self._get_collection_by_name(collection_name)
             
-            print(f"📋 Retrieving entries from {collection_name} (page {page}, size {page_size})...")
+            logger.debug("Retrieving entries from %s (page %s, size %s)...", collection_name, page, page_size)
+            start_idx = (page - 1) * page_size
             
-            # Find documents - retrieve all and handle pagination in memory
-            # This avoids using skip which requires sort parameter
-            try:
-                # First attempt: get just what we need for this page
-                # Changed: Removed await as find is not awaitable
-                results = collection.find(
-                    filter={},
-                    options={"limit": page_size}
-                )
-                
-                # If we need a different page, handle it differently
-                if page > 1:
-                    # Get all entries we need
-                    # Changed: Removed await as find is not awaitable
-                    all_results = collection.find(
-                        filter={},
-                        options={"limit": page * page_size}
-                    )
-                    
-                    # Manual pagination in memory
-                    start_idx = (page - 1) * page_size
-                    results = all_results[start_idx:start_idx + page_size] if start_idx < len(all_results) else []
+            indexes = None
+            if user_id is not None:
+                indexes = await self._get_local_indexes(collection_name, user_id)
             
-            except Exception as inner_e:
-                # Fallback approach if the above fails
-                logger.warning(f"Using fallback approach for pagination: {inner_e}")
-                # Changed: Removed await as find is not awaitable
-                all_results = collection.find(
-                    filter={},
-                    options={}  # No options to avoid potential issues
-                )
-                
-                # Manual pagination in memory
-                start_idx = (page - 1) * page_size
-                results = all_results[start_idx:start_idx + page_size] if start_idx < len(all_results) else []
+            if indexes is not None:
+                entry_ids = indexes.timeline.recent(page * page_size, since, until)[start_idx:]
+                if not entry_ids:
+                    return []
+                async with track("db.get_all_entries"):
+                    entries = await self._find_by_ids(collection, entry_ids, indexes)
+                by_id = {entry.id: entry for entry in entries}
+                results = [by_id[entry_id] for entry_id in entry_ids if entry_id in by_id]
+            else:
+                # Skip needs a sort, so fetch up to the end of the page and slice
+                async with track("db.get_all_entries"):
+                    response = await self._call(
+                        "db.get_all_entries",
+                        collection.find,
+                        filter=self._build_filter(user_id, since, until),
+                        projection=schema.read_projection(),
+                        sort={schema.sort_path("created_ts"): -1},
+                        options={"limit": page * page_size},
+                        retry=True,
+                        hedge=True
+                    )
+                documents = response.get("data", {}).get("documents", [])[start_idx:]
+                results = [Entry.from_document(doc) for doc in documents]
             
-            print(f"✅ Retrieved {len(results)} entries from {collection_name}")
             logger.info(f"Retrieved {len(results)} entries from {collection_name}")
             return results
             
         except Exception as e:
             error_msg = f"Error retrieving entries from {collection_name}: {e}"
-            print(f"❌ {error_msg}")
             logger.error(error_msg)
-            return []
\ No newline at end of file
+            return []
+
+
+class _LocalIndexes:
+    """BM25, time, near-duplicate and vector indexes over one user's entries in one collection."""
+
+    __slots__ = ("lexical", "timeline", "duplicates", "vectors")
+
+    # Signatures must be comparable across indexes, so the permutations are shared
+    hasher = MinHasher()
+
+    def __init__(self, vector_file=None):
+        self.lexical = LexicalIndex()
+        self.timeline = TimeBucketIndex(config.TIME_INDEX_BUCKET_SECONDS)
+        self.duplicates = MinHashLSH(config.DEDUP_THRESHOLD)
+        self.vectors = None
+        if vector_file is not None:
+            self.vectors = QuantizedVectorIndex(vector_file, config.VECTOR_QUANTIZATION,
+                                                config.VECTOR_RESCORE_FACTOR)
+
+    def add(self, entry_id, text, timestamp, duplicate_of=None, vector=None):
+        self.timeline.add(entry_id, timestamp)
+        # Linked duplicates are kept for /list but never retrieved or matched against
+        if duplicate_of is None:
+            self.lexical.add(entry_id, text)
+            if word_count(text) >= config.DEDUP_MIN_WORDS:
+                self.duplicates.add(entry_id, self.hasher.signature(text))
+            if self.vectors is not None:
+                if vector is None:
+                    # An entry stored without a vector can't be searched locally,
+                    # so this user's vector searches go to the server
+                    self.vectors.release()
+                    self.vectors = None
+                else:
+                    self.vectors.add(entry_id, vector)
+
+    def remove(self, entry_id):
+        self.lexical.remove(entry_id)
+        self.timeline.remove(entry_id)
+        self.duplicates.remove(entry_id)
+        if self.vectors is not None:
+            self.vectors.remove(entry_id)
+
+    def release(self):
+        """Free the rows held in the shared vector file."""
+        if self.vectors is not None:
+            self.vectors.release()
+            self.vectors = None
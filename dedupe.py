@@ -0,0 +1,110 @@
+# dedupe.py
+"""
+Find near-duplicate entries already stored in AstraDB and link or delete them.
+
+Entries are grouped by user and walked oldest first; an entry whose word set
+is at least DEDUP_THRESHOLD similar to an earlier one of the same user is a
+duplicate of it. Without --apply nothing is written.
+
+Example:
+    python dedupe.py --collection personal_thoughts --mode link --apply
+"""
+import logging
+import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+import schema
+from models import Entry
+from near_duplicates import MinHasher, MinHashLSH, word_count
+
+logger = logging.getLogger(__name__)
+
+
+def find_duplicates(documents, threshold=config.DEDUP_THRESHOLD, min_words=config.DEDUP_MIN_WORDS):
+    """
+    Pair each near-duplicate with the earliest entry it repeats.
+
+    Args:
+        documents: models.Entry objects
+        threshold: Minimum estimated Jaccard similarity
+        min_words: Texts with fewer words are never duplicates
+
+    Returns:
+        list: (duplicate_id, original_id, similarity) tuples
+    """
+    hasher = MinHasher()
+    by_user = defaultdict(list)
+    for entry in documents:
+        # Already linked by an earlier run or at ingestion
+        if not entry.duplicate_of:
+            by_user[entry.user_id].append(entry)
+
+    duplicates = []
+    for user_docs in by_user.values():
+        user_docs.sort(key=lambda entry: entry.timestamp or 0)
+        index = MinHashLSH(threshold)
+        for entry in user_docs:
+            if word_count(entry.text) < min_words:
+                continue
+            signature = hasher.signature(entry.text)
+            match = index.find(signature)
+            if match:
+                duplicates.append((entry.id, match[0], match[1]))
+            else:
+                index.add(entry.id, signature)
+    return duplicates
+
+
+def main(args):
+    from database import DatabaseService
+    db_service = DatabaseService()
+
+    for collection_name in args.collection:
+        collection = db_service._get_collection_by_name(collection_name)
+        documents = list(collection.paginated_find(filter={}, projection=schema.read_projection()))
+        versions = {doc["_id"]: doc.get("v") for doc in documents}
+        documents = [Entry.from_document(doc) for doc in documents]
+        duplicates = find_duplicates(documents, args.threshold)
+        print(f"{collection_name}: {len(duplicates)} near-duplicates in {len(documents)} entries")
+
+        if args.verbose:
+            texts = {entry.id: entry.text for entry in documents}
+            for duplicate_id, original_id, similarity in duplicates:
+                print(f"  {similarity:.2f}  {texts[duplicate_id][:60]!r} -> {texts[original_id][:60]!r}")
+
+        if not args.apply or not duplicates:
+            continue
+
+        def resolve(duplicate):
+            duplicate_id, original_id, _ = duplicate
+            if args.mode == "delete":
+                return collection.delete_one(duplicate_id)
+            # Written in the layout the entry is stored in
+            path = schema.FIELDS["duplicate_of"][0 if versions[duplicate_id] == schema.SCHEMA_VERSION else 1]
+            return collection.update_one({"_id": duplicate_id}, {"$set": {path: original_id}})
+
+        # Bounded concurrency keeps the Data API request rate reasonable
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for done, _ in enumerate(pool.map(resolve, duplicates), 1):
+                if done % 100 == 0:
+                    print(f"  {done}/{len(duplicates)} resolved")
+        verb = "Deleted" if args.mode == "delete" else "Linked"
+        print(f"{verb} {len(duplicates)} entries in {collection_name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Link or delete near-duplicate entries")
+    parser.add_argument("--collection", action="append",
+                        choices=[config.DB_COLLECTION_THOUGHTS, config.DB_COLLECTION_GAME],
+                        help="Collection to dedupe (repeatable, default: thoughts)")
+    parser.add_argument("--mode", choices=["link", "delete"], default="link",
+                        help="Mark duplicates with the original's ID, or delete them")
+    parser.add_argument("--threshold", type=float, default=config.DEDUP_THRESHOLD)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--apply", action="store_true", help="Write changes (default is a dry run)")
+    parser.add_argument("--verbose", action="store_true", help="Print each duplicate pair")
+    args = parser.parse_args()
+    args.collection = args.collection or [config.DB_COLLECTION_THOUGHTS]
+    main(args)
@@ -0,0 +1,322 @@
+# embedding_service.py
+import os
+import re
+import json
+import zlib
+import asyncio
+import hashlib
+import logging
+import numpy as np
+import config
+import resilience
+from metrics_service import REGISTRY, InstrumentedExecutor, track
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_REQUESTS = REGISTRY.counter(
+    "ragbot_embedding_requests_total",
+    "Texts to embed by result (cached, or embedded by the provider)",
+    ["result"]
+)
+EMBEDDING_BATCH_SIZE = REGISTRY.histogram(
+    "ragbot_embedding_batch_size", "Texts per provider embedding call",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+class HashingEmbedder:
+    """
+    Cheap local embedder based on feature hashing.
+
+    Words and word bigrams are hashed into a fixed number of signed buckets and
+    the result is L2-normalized, so the dot product of two vectors is their
+    cosine similarity. It needs no model or network call, which makes it a
+    good fit for near-duplicate matching of short texts.
+    """
+
+    def __init__(self, dimension=512):
+        self.dimension = dimension
+        self.name = f"hashing:{dimension}"
+
+    def _features(self, text):
+        words = _WORD_RE.findall(text.lower())
+        features = list(words)
+        features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+        return features
+
+    def embed(self, text):
+        """
+        Embed a text.
+
+        Args:
+            text: The text to embed
+
+        Returns:
+            np.ndarray: float32 unit vector (all zeros for empty text)
+        """
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for feature in self._features(text):
+            digest = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if digest & 0x80000000 else -1.0
+            vector[digest % self.dimension] += sign
+
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def embed_batch(self, texts):
+        """Embed several texts; returns a float32 array of shape (len(texts), dimension)."""
+        return np.stack([self.embed(text) for text in texts])
+
+
+class OpenAIEmbedder:
+    """
+    Remote embeddings from the OpenAI embeddings API.
+
+    Args:
+        client: Object exposing embeddings.create; defaults to the openai module
+        model: Embedding model name
+        dimension: Output dimension, which must match the collections
+    """
+
+    def __init__(self, client=None, model="text-embedding-3-small", dimension=1536):
+        self._client = client
+        self.model = model
+        self.dimension = dimension
+        self.name = f"openai:{model}:{dimension}"
+        # Calls go through the resilience layer's breaker and retry budget for this API
+        self.upstream = "openai"
+
+    @property
+    def client(self):
+        """OpenAI client, imported and configured on first use."""
+        if self._client is None:
+            import openai
+            openai.api_key = config.OPENAI_API_KEY
+            self._client = openai
+        return self._client
+
+    def embed_batch(self, texts):
+        """Embed several texts in one request; returns unit vectors of shape (len(texts), dimension)."""
+        response = self.client.embeddings.create(model=self.model, input=texts, dimensions=self.dimension)
+        vectors = np.array([item.embedding for item in response.data], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class EmbeddingCache:
+    """
+    Embeddings keyed by a hash of the model and text, in memory-mapped files.
+
+    Vectors live in a fixed-size float32 file used as a ring: once it is full
+    the oldest slot is reused. Only the 20-byte keys are read into memory on
+    start; vectors are paged in by the OS as they are looked up, so a large
+    cache costs little RAM and survives restarts.
+
+    Args:
+        path: Path prefix for the .vectors, .keys and .json files
+        model_name: Provider name; a cache built by another model is discarded
+        dimension: Vector dimension
+        max_entries: Number of slots
+    """
+
+    KEY_SIZE = 20
+
+    def __init__(self, path, model_name, dimension, max_entries=20000):
+        self.path = path
+        self.model_name = model_name
+        self.dimension = dimension
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        meta = self._load_meta()
+        expected = {"model": model_name, "dimension": dimension, "max_entries": max_entries}
+        fresh = any(meta.get(key) != value for key, value in expected.items())
+        if not all(os.path.exists(path + suffix) for suffix in (".vectors", ".keys")):
+            fresh = True
+        mode = "w+" if fresh else "r+"
+        self._vectors = np.memmap(path + ".vectors", dtype=np.float32, mode=mode,
+                                  shape=(max_entries, dimension))
+        self._keys = np.memmap(path + ".keys", dtype=np.uint8, mode=mode,
+                               shape=(max_entries, self.KEY_SIZE))
+        self._next_slot = 0 if fresh else meta.get("next_slot", 0) % max_entries
+        self._unsaved = 0
+
+        self._slots = {}
+        for slot in np.flatnonzero(self._keys.any(axis=1)):
+            self._slots[self._keys[slot].tobytes()] = int(slot)
+        if fresh:
+            self.flush()
+        logger.info(f"Embedding cache opened with {len(self._slots)} of {max_entries} slots used")
+
+    def _load_meta(self):
+        try:
+            with open(self.path + ".json", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def __len__(self):
+        return len(self._slots)
+
+    def key(self, text):
+        return hashlib.sha1(f"{self.model_name}\0{text}".encode("utf-8")).digest()
+
+    def get(self, key):
+        """Return a copy of the cached vector for a key, or None."""
+        slot = self._slots.get(key)
+        if slot is None:
+            return None
+        return np.array(self._vectors[slot])
+
+    def put(self, key, vector):
+        if key in self._slots:
+            return
+        slot = self._next_slot
+        old_key = self._keys[slot].tobytes()
+        self._slots.pop(old_key, None)
+        # Clear the key first, so a crash mid-write never pairs a key with the wrong vector
+        self._keys[slot] = 0
+        self._vectors[slot] = vector
+        self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+        self._slots[key] = slot
+        self._next_slot = (slot + 1) % self.max_entries
+
+        self._unsaved += 1
+        if self._unsaved >= 256:
+            self.flush()
+
+    def flush(self):
+        """Write the mapped pages and the ring position to disk."""
+        self._vectors.flush()
+        self._keys.flush()
+        tmp_path = self.path + ".json.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_name, "dimension": self.dimension,
+                       "max_entries": self.max_entries, "next_slot": self._next_slot}, f)
+        os.replace(tmp_path, self.path + ".json")
+        self._unsaved = 0
+
+
+class EmbeddingService:
+    """
+    Embeds texts for storage and search.
+
+    Cached texts are answered without a provider call. The rest are held for
+    up to EMBEDDING_BATCH_WINDOW_MS so texts requested concurrently, e.g. by
+    several users at once, go to the provider in a single batch.
+
+    Args:
+        provider: Object with name, dimension and embed_batch(texts), and an
+            upstream name if its calls go to an external API
+        cache: Optional EmbeddingCache
+        batch_size: Maximum texts per provider call
+        batch_window: Seconds to wait for more texts before calling the provider
+    """
+
+    def __init__(self, provider, cache=None, batch_size=64, batch_window=0.005):
+        self.provider = provider
+        self.cache = cache
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self._executor = InstrumentedExecutor("embedding", max_workers=config.EMBEDDING_EXECUTOR_WORKERS)
+        self._pending = []
+        self._timer = None
+
+    @property
+    def dimension(self):
+        return self.provider.dimension
+
+    async def embed(self, text):
+        """
+        Embed a text.
+
+        Returns:
+            np.ndarray: float32 unit vector of length dimension
+        """
+        key = self.cache.key(text) if self.cache is not None else None
+        if key is not None:
+            vector = self.cache.get(key)
+            if vector is not None:
+                EMBEDDING_REQUESTS.inc("cached")
+                return vector
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, key, future))
+        if len(self._pending) >= self.batch_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.batch_window, self._dispatch)
+        return await future
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._embed_batch(batch))
+
+    async def _embed_batch(self, batch):
+        # The same text may be requested more than once in a window
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        EMBEDDING_REQUESTS.inc("embedded", amount=len(texts))
+        EMBEDDING_BATCH_SIZE.observe(value=len(texts))
+        try:
+            async with track("embedding.batch"):
+                upstream = getattr(self.provider, "upstream", None)
+                if upstream is None:
+                    # Local providers have no upstream to time out or retry
+                    vectors = await self._executor.run(self.provider.embed_batch, texts)
+                else:
+                    vectors = await resilience.call(
+                        "embedding.batch", upstream,
+                        lambda: self._executor.run(self.provider.embed_batch, texts), retry=True)
+        except Exception as e:
+            logger.error(f"Error embedding {len(texts)} texts: {e}")
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_text = dict(zip(texts, vectors))
+        for text, key, future in batch:
+            vector = by_text[text]
+            if key is not None:
+                self.cache.put(key, vector)
+            if not future.done():
+                future.set_result(vector)
+
+
+def create_embedding_service(client=None):
+    """
+    Build the EmbeddingService configured by EMBEDDING_PROVIDER.
+
+    Args:
+        client: Optional OpenAI client, e.g. a stand-in for benchmarks
+
+    Returns:
+        EmbeddingService, or None when embeddings are left to the server
+    """
+    if config.EMBEDDING_PROVIDER == "server":
+        return None
+    if config.EMBEDDING_PROVIDER == "hashing":
+        provider = HashingEmbedder(config.EMBEDDING_DIMENSION)
+    elif config.EMBEDDING_PROVIDER == "openai":
+        provider = OpenAIEmbedder(client, config.EMBEDDING_MODEL, config.EMBEDDING_DIMENSION)
+    else:
+        raise ValueError(f"Unknown embedding provider: {config.EMBEDDING_PROVIDER}")
+
+    cache = None
+    if config.EMBEDDING_CACHE_ENABLED:
+        try:
+            cache = EmbeddingCache(config.EMBEDDING_CACHE_PATH, provider.name,
+                                   provider.dimension, config.EMBEDDING_CACHE_MAX_ENTRIES)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Embedding cache unavailable, continuing without it: {e}")
+    return EmbeddingService(provider, cache, config.EMBEDDING_BATCH_SIZE,
+                            config.EMBEDDING_BATCH_WINDOW_MS / 1000)
@@ -8,9 +8,11 @@ import config
 logger = logging.getLogger(__name__)
 
 class GameService:
-    def __init__(self, db_service: DatabaseService, claude_service: ClaudeService):
+    def __init__(self, db_service: DatabaseService, claude_service: ClaudeService, profile_service=None):
         self.db_service = db_service
         self.claude_service = claude_service
+        # Optional ProfileService that folds answers into the user's digest
+        self.profile_service = profile_service
         self.active_games = {}  # Track active games by user_id
         
         # List of diverse fallback questions in case Claude API fails
@@ -43,8 +45,10 @@ class GameService:
             str: The first question
         """
         try:
-            # Generate a question
-            question = await self.claude_service.generate_game_question()
+            # Generate a question, or use a fallback if Claude is unavailable
+            question = await self.claude_service.generate_game_question(user_id)
+            if not question:
+                question = random.choice(self.fallback_questions)
             
             # Save the active game state
             self.active_games[user_id] = {
@@ -95,11 +99,14 @@ class GameService:
                 "user_id": user_id
             }
             
-            await self.db_service.store_entry(
+            entry_id = await self.db_service.store_entry(
                 collection_name=config.DB_COLLECTION_GAME,
                 text=answer_text,
                 metadata=metadata
             )
+            if entry_id and self.profile_service:
+                self.profile_service.note_entry(
+                    user_id, f"Q: {current_question}\nA: {answer_text}", source="game")
             
             # Decide whether to continue the game or end it
             game_state["question_count"] += 1
@@ -116,7 +123,10 @@ class GameService:
             
             # Try to get a unique question that hasn't been asked before
             while attempts < max_attempts:
-                next_question = await self.claude_service.generate_game_question()
+                next_question = await self.claude_service.generate_game_question(user_id)
+                if not next_question:
+                    # Claude is unavailable, so don't keep asking it
+                    break
                 
                 # Check if we've asked this or very similar question before
                 if next_question not in game_state["asked_questions"]:
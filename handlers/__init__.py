@@ -10,8 +10,11 @@ STATE_GAME = "game"
 STATE_CHAT = "chat"
 STATE_DELETE = "delete"
 
-import logging
 import sys
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from telegram import Update
 from telegram.ext import ContextTypes
 from handlers.command_handler import CommandHandler
@@ -19,157 +22,274 @@ from handlers.normal_handler import NormalHandler
 from handlers.chat_handler import ChatHandler
 from handlers.game_handler import GameHandler
 from handlers.callback_handler import CallbackHandler
+from handlers.coalescer import MessageCoalescer
+from metrics_service import track, REGISTRY
+from tracing_service import start_trace
+import config
 
 logger = logging.getLogger(__name__)
 
+SUPERSEDED_UPDATES = REGISTRY.counter(
+    "ragbot_updates_superseded_total", "Chat updates cancelled by a newer message or a mode switch", ["reason"]
+)
+
+# Commands that leave chat mode, cancelling any chat answer still being prepared
+_LEAVES_CHAT = {"normal", "game", "delete"}
+
+# Modes whose consecutive text messages are merged into one input
+_COALESCED_STATES = {STATE_NORMAL, STATE_CHAT, STATE_GAME}
+
 class HandlerManager:
     """Main handler class that coordinates all the sub-handlers."""
     
-    def __init__(self):
-        """Initialize all handlers with the same service instances."""
+    def __init__(self, db_service=None, whisper_service=None,
+                 claude_service=None, game_service=None):
+        """Initialize all handlers with the same service instances, creating any not given."""
         try:
-            print("📦 Initializing services...")
-            # Create service instances to be shared
-            from database import DatabaseService
-            from whisper_service import WhisperService
-            from claude_service import ClaudeService
-            from game_service import GameService
+            logger.debug("Initializing services...")
+            # Services are shared through the registry so nothing is constructed twice
+            import service_registry
+            
+            # Explicitly passed services (e.g. benchmark stand-ins) replace the shared ones
+            for name, service in (("database", db_service), ("whisper", whisper_service),
+                                  ("claude", claude_service), ("game", game_service)):
+                if service is not None:
+                    service_registry.register(name, service)
             
-            print("🗄️ Setting up database service...")
-            db_service = DatabaseService()
+            logger.debug("Setting up database service...")
+            db_service = db_service or service_registry.get_database_service()
             
-            print("🎙️ Setting up voice transcription service...")
-            whisper_service = WhisperService()
+            logger.debug("Setting up voice transcription service...")
+            whisper_service = whisper_service or service_registry.get_whisper_service()
             
-            print("🧠 Setting up Claude AI service...")
-            claude_service = ClaudeService()
+            logger.debug("Setting up Claude AI service...")
+            claude_service = claude_service or service_registry.get_claude_service()
             
-            print("🎮 Setting up game service...")
-            game_service = GameService(db_service, claude_service)
+            logger.debug("Setting up game service...")
+            game_service = game_service or service_registry.get_game_service()
             
             # Initialize handlers with shared services
-            print("🔄 Initializing command handler...")
+            logger.debug("Initializing command handler...")
             self.command_handler = CommandHandler(
                 db_service, whisper_service, claude_service, game_service
             )
             
-            print("📥 Initializing normal message handler...")
+            logger.debug("Initializing normal message handler...")
             self.normal_handler = NormalHandler(
                 db_service, whisper_service, claude_service, game_service
             )
             
-            print("💬 Initializing chat handler...")
+            logger.debug("Initializing chat handler...")
             self.chat_handler = ChatHandler(
                 db_service, whisper_service, claude_service, game_service
             )
             
-            print("🎯 Initializing game handler...")
+            logger.debug("Initializing game handler...")
             self.game_handler = GameHandler(
                 db_service, whisper_service, claude_service, game_service
             )
             
-            print("🔄 Initializing callback handler...")
+            logger.debug("Initializing callback handler...")
             self.callback_handler = CallbackHandler(
                 db_service, whisper_service, claude_service, game_service
             )
             
-            print("✅ All handlers initialized successfully!")
+            # Updates are handled concurrently; each user's messages still run one
+            # at a time, and a chat message still being answered is tracked so a
+            # newer one can supersede it. A user's lock is kept only while one of
+            # their messages holds or waits for it: user_id -> [lock, holders]
+            self._user_locks = {}
+            self._chat_tasks = {}
+            
+            # Rapid bursts of text messages are handled as one message
+            self.coalescer = None
+            if config.COALESCE_ENABLED:
+                self.coalescer = MessageCoalescer(config.COALESCE_QUIET_MS / 1000, config.COALESCE_MAX_WAIT_MS / 1000)
+            
+            # Optional anonymized traffic capture for load-test replays
+            self.recorder = None
+            if config.CAPTURE_FILE:
+                from capture_service import TrafficRecorder
+                self.recorder = TrafficRecorder(config.CAPTURE_FILE)
+            
+            logger.info("All handlers initialized successfully!")
             
         except Exception as e:
             error_msg = f"Fatal error during handler initialization: {e}"
-            print(f"\n❌ {error_msg}")
             logger.error(error_msg)
-            print("\nThe application cannot continue. Please fix the error and restart.")
+            logger.critical("The application cannot continue. Please fix the error and restart.")
             sys.exit(1)
     
     # Command handlers
+    async def _run_command(self, name, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Run a CommandHandler method inside a trace, recording it when capturing traffic."""
+        user_id = update.effective_user.id
+        received_at = time.monotonic()
+        state = USER_STATE.get(user_id, STATE_NORMAL)
+        logger.debug("Received /%s command from user %s", name, user_id)
+        if name in _LEAVES_CHAT:
+            # Before waiting for the lock, which the cancelled answer is holding
+            self.cancel_chat(user_id, "mode_switch")
+        async with self._in_order(user_id), start_trace(f"command.{name}", user_id):
+            await getattr(self.command_handler, f"{name}_command")(update, context)
+        if self.recorder:
+            self.recorder.record(user_id, "command", state, received_at, command=name)
+        logger.debug("Processed /%s command for user %s", name, user_id)
+    
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        print(f"👋 Received /start command from user {update.effective_user.id}")
-        await self.command_handler.start_command(update, context)
-        print(f"✅ Processed /start command for user {update.effective_user.id}")
+        await self._run_command("start", update, context)
     
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        print(f"❓ Received /help command from user {update.effective_user.id}")
-        await self.command_handler.help_command(update, context)
-        print(f"✅ Processed /help command for user {update.effective_user.id}")
+        await self._run_command("help", update, context)
     
     async def chat_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        print(f"💬 Received /chat command from user {update.effective_user.id}")
-        await self.command_handler.chat_command(update, context)
-        print(f"✅ Processed /chat command for user {update.effective_user.id}")
+        await self._run_command("chat", update, context)
     
     async def game_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        print(f"🎮 Received /game command from user {update.effective_user.id}")
-        await self.command_handler.game_command(update, context)
-        print(f"✅ Processed /game command for user {update.effective_user.id}")
+        await self._run_command("game", update, context)
     
     async def normal_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        print(f"🔄 Received /normal command from user {update.effective_user.id}")
-        await self.command_handler.normal_command(update, context)
-        print(f"✅ Processed /normal command for user {update.effective_user.id}")
+        await self._run_command("normal", update, context)
     
     async def delete_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        print(f"🗑️ Received /delete command from user {update.effective_user.id}")
-        await self.command_handler.delete_command(update, context)
-        print(f"✅ Processed /delete command for user {update.effective_user.id}")
+        await self._run_command("delete", update, context)
     
     async def list_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        print(f"📋 Received /list command from user {update.effective_user.id}")
-        await self.command_handler.list_command(update, context)
-        print(f"✅ Processed /list command for user {update.effective_user.id}")
+        await self._run_command("list", update, context)
     
     async def category_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        print(f"🏷️ Received /category command from user {update.effective_user.id}")
-        await self.command_handler.category_command(update, context)
-        print(f"✅ Processed /category command for user {update.effective_user.id}")
+        await self._run_command("category", update, context)
+    
+    async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        await self._run_command("stats", update, context)
+    
+    async def trace_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        await self._run_command("trace", update, context)
     
     # Message handler
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Main message handler that delegates to specific handlers based on state."""
         user_id = update.effective_user.id
+        received_at = time.monotonic()
         
         # Debug message reception
-        print(f"📨 Received message from user {user_id}: {update.message.text if update.message.text else '[Not text]'}")
-        logger.info(f"Received message from user {user_id}: {update.message.text if update.message.text else '[Not text]'}")
+        logger.info("Received message from user %s: %s", user_id,
+                    update.message.text if update.message.text else '[Not text]')
         
         # Initialize state if not set
         if user_id not in USER_STATE:
             USER_STATE[user_id] = STATE_NORMAL
-            print(f"🆕 Initialized state for user {user_id} to {STATE_NORMAL}")
+            logger.debug("Initialized state for user %s to %s", user_id, STATE_NORMAL)
         
         state = USER_STATE[user_id]
-        print(f"🔄 Current state for user {user_id}: {state}")
+        logger.debug("Current state for user %s: %s", user_id, state)
+        
+        text = update.message.text
+        coalesced = self.coalescer and state in _COALESCED_STATES and text and not text.startswith('/')
+        if self.coalescer and not coalesced:
+            # Text still being collected was sent first, so it is handled first
+            await self.coalescer.flush((user_id, state))
+        
+        if state == STATE_CHAT:
+            # A newer question makes the previous answer moot
+            self.cancel_chat(user_id, "newer_message")
+        
+        merged = update
+        if coalesced:
+            # None when this message joined a burst that an earlier message's handler processes
+            merged = await self.coalescer.collect((user_id, state), update)
+        if merged is not None and (state != STATE_CHAT or USER_STATE.get(user_id) == STATE_CHAT):
+            await self._process(state, merged, context)
+        
+        if self.recorder:
+            message = update.message
+            if message.voice:
+                self.recorder.record(user_id, "voice", state, received_at,
+                                     voice_duration=message.voice.duration)
+            else:
+                self.recorder.record(user_id, "text", state, received_at, text=message.text or "")
+    
+    async def _process(self, state, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Handle a message in its own task, so a newer chat message can cancel it."""
+        user_id = update.effective_user.id
+        task = asyncio.ensure_future(self._run_in_order(state, update, context))
+        if state == STATE_CHAT:
+            self._chat_tasks[user_id] = task
         
         try:
-            if state == STATE_NORMAL:
-                print(f"📝 Delegating to normal handler for user {user_id}")
-                await self.normal_handler.handle_message(update, context)
-                print(f"✅ Normal handler processed message for user {user_id}")
-            elif state == STATE_CHAT:
-                print(f"💬 Delegating to chat handler for user {user_id}")
-                await self.chat_handler.handle_message(update, context)
-                print(f"✅ Chat handler processed message for user {user_id}")
-            elif state == STATE_GAME:
-                print(f"🎮 Delegating to game handler for user {user_id}")
-                await self.game_handler.handle_message(update, context)
-                print(f"✅ Game handler processed message for user {user_id}")
-            elif state == STATE_DELETE:
-                # Should be handled by the callback query handler
-                print(f"❌ User {user_id} is in delete mode, sending instruction")
-                await update.message.reply_text(
-                    "Please use the buttons to select a thought to delete, or type /normal to cancel."
-                )
-                print(f"✅ Sent delete mode instructions to user {user_id}")
-        except Exception as e:
-            logger.error(f"Error handling message: {e}")
-            print(f"❌ Error handling message for user {user_id}: {e}")
+            await asyncio.wait([task])
+        except asyncio.CancelledError:
+            # The bot is shutting down
+            task.cancel()
+            raise
+        finally:
+            if self._chat_tasks.get(user_id) is task:
+                del self._chat_tasks[user_id]
+        
+        if task.cancelled():
+            logger.info("Superseded chat message from user %s", user_id)
+        elif task.exception() is not None:
+            logger.error(f"Error handling message for user {user_id}: {task.exception()}")
             await update.message.reply_text(
                 "Sorry, I encountered an error processing your message. Please try again."
             )
     
+    def cancel_chat(self, user_id, reason):
+        """Cancel the chat answer still being prepared for a user, if any."""
+        task = self._chat_tasks.pop(user_id, None)
+        if task is not None and not task.done():
+            task.cancel()
+            SUPERSEDED_UPDATES.inc(reason)
+    
+    @asynccontextmanager
+    async def _in_order(self, user_id):
+        """Hold the user's lock, so their messages, commands and button presses run one at a time."""
+        entry = self._user_locks.get(user_id)
+        if entry is None:
+            entry = self._user_locks[user_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._user_locks[user_id]
+    
+    async def _run_in_order(self, state, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Dispatch a message once the user's earlier updates are done."""
+        user_id = update.effective_user.id
+        async with self._in_order(user_id):
+            async with start_trace(f"update.{state}", user_id), track(f"update.{state}"):
+                await self._dispatch(state, update, context)
+
+    async def _dispatch(self, state, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Delegate a message to the handler for the user's current state."""
+        user_id = update.effective_user.id
+        if state == STATE_NORMAL:
+            await self.normal_handler.handle_message(update, context)
+            logger.debug("Normal handler processed message for user %s", user_id)
+        elif state == STATE_CHAT:
+            await self.chat_handler.handle_message(update, context)
+            logger.debug("Chat handler processed message for user %s", user_id)
+        elif state == STATE_GAME:
+            await self.game_handler.handle_message(update, context)
+            logger.debug("Game handler processed message for user %s", user_id)
+        elif state == STATE_DELETE:
+            # Should be handled by the callback query handler
+            logger.debug("User %s is in delete mode, sending instruction", user_id)
+            await update.message.reply_text(
+                "Please use the buttons to select a thought to delete, or type /normal to cancel."
+            )
+    
     # Callback query handler
     async def handle_callback_query(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         user_id = update.callback_query.from_user.id
-        print(f"🔄 Received callback query from user {user_id}: {update.callback_query.data}")
-        await self.callback_handler.handle_callback_query(update, context)
-        print(f"✅ Processed callback query for user {user_id}")
\ No newline at end of file
+        received_at = time.monotonic()
+        state = USER_STATE.get(user_id, STATE_NORMAL)
+        logger.debug("Received callback query from user %s: %s", user_id, update.callback_query.data)
+        async with self._in_order(user_id), start_trace("callback_query", user_id):
+            await self.callback_handler.handle_callback_query(update, context)
+        if self.recorder:
+            self.recorder.record(user_id, "callback", state, received_at)
+        logger.debug("Processed callback query for user %s", user_id)
\ No newline at end of file
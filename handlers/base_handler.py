@@ -1,11 +1,12 @@
 # handlers/base_handler.py
+import os
 import logging
 from telegram import Update
 from telegram.ext import ContextTypes
-from database import DatabaseService
-from whisper_service import WhisperService
-from claude_service import ClaudeService
-from game_service import GameService
+from metrics_service import track
+from handlers.presenter import Presenter
+import service_registry
+import config
 
 logger = logging.getLogger(__name__)
 
@@ -14,11 +15,12 @@ class BaseHandler:
     
     def __init__(self, db_service=None, whisper_service=None, 
                  claude_service=None, game_service=None):
-        """Initialize with service instances or create new ones."""
-        self.db_service = db_service or DatabaseService()
-        self.whisper_service = whisper_service or WhisperService()
-        self.claude_service = claude_service or ClaudeService()
-        self.game_service = game_service or GameService(self.db_service, self.claude_service)
+        """Initialize with service instances or the shared ones from the registry."""
+        self.db_service = db_service or service_registry.get_database_service()
+        self.whisper_service = whisper_service or service_registry.get_whisper_service()
+        self.claude_service = claude_service or service_registry.get_claude_service()
+        self.game_service = game_service or service_registry.get_game_service()
+        self.profile_service = service_registry.get_profile_service() if config.PROFILE_ENABLED else None
         
     def log_info(self, message):
         """Log info message."""
@@ -31,6 +33,18 @@ class BaseHandler:
         else:
             logger.error(message)
             
+    async def download_voice_note(self, context: ContextTypes.DEFAULT_TYPE, voice) -> str:
+        """Download a Telegram voice note into the audio directory and return its path."""
+        async with track("telegram.download"):
+            voice_file = await context.bot.get_file(voice.file_id)
+            file_path = os.path.join(config.AUDIO_DIR, f"{voice.file_id}.ogg")
+            await voice_file.download_to_drive(file_path)
+        return file_path
+
+    def presenter(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Presenter for showing progress on an update as one message that is edited in place."""
+        return Presenter(update.message, context.bot, update.effective_chat.id)
+
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Base method to be overridden by subclasses."""
         # This is a placeholder method that should be overridden by subclasses
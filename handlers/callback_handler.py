@@ -3,6 +3,7 @@ import logging
 from telegram import Update
 from telegram.ext import ContextTypes
 from handlers.base_handler import BaseHandler
+import config
 
 logger = logging.getLogger(__name__)
 
@@ -48,21 +49,8 @@ class CallbackHandler(BaseHandler):
                 thought = USER_THOUGHTS[user_id][thought_index]
                 logger.info(f"Found thought for deletion: {thought}")
                 
-                # Extract thought_id safely with better logging
-                thought_id = None
-                if isinstance(thought, dict):
-                    logger.info(f"Thought keys: {thought.keys()}")
-                    if "_id" in thought:
-                        thought_id = thought["_id"]
-                        logger.info(f"Found thought ID: {thought_id}")
-                    else:
-                        logger.error(f"No _id key found in thought")
-                else:
-                    logger.error(f"Thought is not a dict: {type(thought)}")
-                
+                thought_id = thought.id
                 if not thought_id:
-                    # Try harder to find the ID by dumping the whole thought
-                    logger.info(f"Thought content dump: {thought}")
                     await query.edit_message_text("Could not find the thought ID. Please try again.")
                     USER_STATE[user_id] = STATE_NORMAL
                     return
@@ -71,7 +59,9 @@ class CallbackHandler(BaseHandler):
                 logger.info(f"Attempting to delete thought with ID: {thought_id}")
                 success = await self.db_service.delete_entry(
                     collection_name=config.DB_COLLECTION_THOUGHTS,
-                    entry_id=thought_id
+                    entry_id=thought_id,
+                    user_id=user_id,
+                    entry=thought
                 )
                 
                 if success:
@@ -1,10 +1,14 @@
 # handlers/chat_handler.py
-import os
+import asyncio
+import datetime
 import logging
-from datetime import datetime
 from telegram import Update
 from telegram.ext import ContextTypes
 from handlers.base_handler import BaseHandler
+from embedding_service import HashingEmbedder
+from semantic_cache import SemanticCache
+from rerank import diversify
+from time_index import parse_time_range
 import config
 
 logger = logging.getLogger(__name__)
@@ -12,77 +16,152 @@ logger = logging.getLogger(__name__)
 class ChatHandler(BaseHandler):
     """Handles messages in chat mode (answering questions)."""
     
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Only for MMR redundancy between entries whose stored embeddings aren't held locally
+        self.query_embedder = HashingEmbedder(config.HASH_EMBEDDING_DIMENSION)
+        # Near-identical questions are answered from cache until the user's thoughts change
+        self.answer_cache = None
+        if config.ANSWER_CACHE_ENABLED:
+            self.answer_cache = SemanticCache(
+                threshold=config.ANSWER_CACHE_THRESHOLD,
+                max_entries_per_user=config.ANSWER_CACHE_MAX_ENTRIES,
+                max_users=config.ANSWER_CACHE_MAX_USERS
+            )
+    
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle messages in chat mode (answering questions)."""
+        async with self.presenter(update, context) as presenter:
+            await self._answer(update, context, presenter)
+    
+    async def _answer(self, update, context, presenter):
+        """Answer a question, as one reply edited in place as retrieval and generation complete."""
         user_id = update.effective_user.id
         message = update.message
+        heard = ""
         
         # Handle voice message
         if message.voice:
-            await message.reply_text("🎙️ I received your voice note. Transcribing...")
+            # Shown while the voice note is listened to, then typing while it is handled
+            presenter.action("record_voice")
+            presenter.status("🎙️ I received your voice note. Transcribing...")
             
             # Download the voice file
-            voice_file = await context.bot.get_file(message.voice.file_id)
-            file_path = os.path.join(config.AUDIO_DIR, f"{message.voice.file_id}.ogg")
-            await voice_file.download_to_drive(file_path)
+            file_path = await self.download_voice_note(context, message.voice)
             
             # Transcribe the voice note
             query_text = await self.whisper_service.transcribe_voice_note(file_path)
             
             if not query_text:
-                await message.reply_text("Sorry, I couldn't transcribe your voice note. Please try again.")
+                await presenter.finish("Sorry, I couldn't transcribe your voice note. Please try again.")
                 return
+            presenter.action("typing")
             
-            await message.reply_text(f"I understood your question as: \"{query_text}\"")
+            # Kept above the answer, so the user can see what was heard
+            heard = f"I understood your question as: \"{query_text}\"\n\n"
+            presenter.status(heard + "🔍 Let me think about that...")
         
         # Handle text message
         elif message.text and not message.text.startswith('/'):
             query_text = message.text
+            presenter.action("typing")
         else:
             return
         
         # Store the interaction
         metadata = {
             "user_id": user_id,
-            "source": "chat_interaction",
-            "created_at": datetime.now().isoformat()
+            "source": "chat_interaction"
         }
         
-        await self.db_service.store_entry(
+        # Shielded, so a newer message can't leave the store half applied
+        question_id = await asyncio.shield(self.db_service.store_entry(
             collection_name=config.DB_COLLECTION_CHAT,
             text=query_text,
             metadata=metadata
-        )
+        ))
         
-        # Search for relevant context
-        await message.reply_text("🔍 Let me think about that...")
+        # "last week", "yesterday" etc. narrow the stored thoughts and answers to that period
+        since, until = parse_time_range(query_text)
+        
+        # Keyed on the same embeddings as the search (so the vector is reused from the
+        # embedding cache) and on the period asked about: a "yesterday" answer is only
+        # reused on the same day
+        query_vector = None
+        if self.answer_cache and self.db_service.embedder:
+            try:
+                query_vector = await self.db_service.embedder.embed(query_text)
+            except Exception as e:
+                self.log_error("Error embedding question for the answer cache", e)
+        if query_vector is not None:
+            cache_scope = (since, datetime.date.today().isoformat()) if since is not None else None
+            corpus_version = self.db_service.corpus_version(user_id)
+            cached_response = self.answer_cache.lookup(user_id, query_vector, corpus_version, cache_scope)
+            if cached_response:
+                await presenter.finish(heard + cached_response)
+                return
+        
+        # Search for relevant context; text turns show only the typing action,
+        # so their answer arrives as a single reply
+        
+        # The digest already summarizes the user, so fewer raw entries are needed
+        profile_digest = self.profile_service.render_digest(user_id) if self.profile_service else ""
+        limit = config.PROFILE_CONTEXT_HITS if profile_digest else config.CHAT_CONTEXT_HITS
+        # Over-fetch so the reranker has near-duplicates to choose between
+        fetch_limit = limit * config.MMR_OVERFETCH if config.MMR_ENABLED else limit
+        
+        half_life = config.CHAT_RECENCY_HALF_LIFE_DAYS * 86400 or None
         
         # Collect context from all collections
         thoughts_context = await self.db_service.search_similar(
             collection_name=config.DB_COLLECTION_THOUGHTS,
             query_text=query_text,
-            limit=3
+            limit=fetch_limit,
+            user_id=user_id,
+            since=since,
+            until=until,
+            recency_half_life=half_life
         )
         
         game_context = await self.db_service.search_similar(
             collection_name=config.DB_COLLECTION_GAME,
             query_text=query_text,
-            limit=3
+            limit=fetch_limit,
+            user_id=user_id,
+            since=since,
+            until=until,
+            recency_half_life=half_life
         )
         
         chat_context = await self.db_service.search_similar(
             collection_name=config.DB_COLLECTION_CHAT,
             query_text=query_text,
-            limit=3
+            limit=fetch_limit,
+            user_id=user_id
         )
         
-        # Combine all contexts
-        all_context = thoughts_context + game_context + chat_context
+        # Combine all contexts; the question just stored would only repeat itself
+        all_context = thoughts_context + game_context + [
+            entry for entry in chat_context if entry.id != question_id]
+        if config.MMR_ENABLED:
+            all_context = diversify(
+                all_context,
+                k=limit * 3,
+                vectors=self.db_service.stored_vectors(user_id, [entry.id for entry in all_context]),
+                embedder=self.query_embedder,
+                lambda_=config.MMR_LAMBDA,
+                budget=config.MMR_BUDGET_MS / 1000
+            )
         
         # Generate a response using Claude
         response = await self.claude_service.generate_response(
             user_query=query_text,
-            context_entries=all_context
+            context_entries=all_context,
+            profile_digest=profile_digest or None,
+            user_id=user_id
         )
         
-        await message.reply_text(response)
\ No newline at end of file
+        if query_vector is not None and response != self.claude_service.ERROR_RESPONSE:
+            self.answer_cache.store(user_id, query_text, query_vector, response, corpus_version, cache_scope)
+        
+        await presenter.finish(heard + response)
\ No newline at end of file
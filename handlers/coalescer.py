@@ -0,0 +1,118 @@
+# handlers/coalescer.py
+import time
+import asyncio
+import logging
+from metrics_service import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+BURST_SIZE = REGISTRY.histogram(
+    "ragbot_coalesced_messages", "Text messages merged into one input", buckets=(1, 2, 3, 5, 8, 13)
+)
+
+
+class CoalescedMessage:
+    """The last message of a burst, with the text of the whole burst; replies go to it."""
+
+    def __init__(self, message, text):
+        self._message = message
+        self.text = text
+
+    def __getattr__(self, name):
+        return getattr(self._message, name)
+
+
+class CoalescedUpdate:
+    """An update standing in for a burst of messages."""
+
+    def __init__(self, update, message):
+        self._update = update
+        self.message = message
+        self.effective_message = message
+
+    def __getattr__(self, name):
+        return getattr(self._update, name)
+
+
+class _Burst:
+    __slots__ = ("updates", "first_at", "last_at", "wakeup", "flushed", "done")
+
+    def __init__(self, update):
+        self.updates = [update]
+        self.first_at = self.last_at = time.monotonic()
+        self.wakeup = asyncio.Event()
+        self.flushed = False
+        self.done = asyncio.Event()
+
+
+class MessageCoalescer:
+    """
+    Merges a user's rapid text messages in one mode into a single input.
+
+    The first message of a burst waits until the user has been quiet for
+    quiet_time, or until max_wait has passed since it arrived; messages that
+    arrive meanwhile join it. The first message's handler then processes the
+    merged text once, and the others return without doing anything.
+
+    Args:
+        quiet_time: Seconds without a new message that end a burst
+        max_wait: Longest a burst is held, in seconds
+    """
+
+    def __init__(self, quiet_time, max_wait):
+        self.quiet_time = quiet_time
+        self.max_wait = max_wait
+        self._bursts = {}
+
+    async def collect(self, key, update):
+        """
+        Add a text message to the burst for key, e.g. (user_id, state).
+
+        Returns:
+            The update to process (merged if the burst had several messages),
+            or None if the message joined a burst another handler will process
+        """
+        burst = self._bursts.get(key)
+        if burst is not None:
+            burst.updates.append(update)
+            burst.last_at = time.monotonic()
+            burst.wakeup.set()
+            return None
+
+        burst = self._bursts[key] = _Burst(update)
+        try:
+            while not burst.flushed:
+                deadline = min(burst.last_at + self.quiet_time, burst.first_at + self.max_wait)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                burst.wakeup.clear()
+                try:
+                    await asyncio.wait_for(burst.wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            del self._bursts[key]
+            burst.done.set()
+
+        BURST_SIZE.observe(value=len(burst.updates))
+        if len(burst.updates) == 1:
+            return update
+        logger.debug("Coalesced %s messages for %s", len(burst.updates), key)
+        last = burst.updates[-1]
+        text = "\n".join(u.message.text for u in burst.updates)
+        return CoalescedUpdate(last, CoalescedMessage(last.message, text))
+
+    async def flush(self, key):
+        """
+        End the burst for key now, e.g. before handling a voice note from the same user.
+
+        Returns once the burst's handler has taken the merged update, so work
+        started after this call is queued behind it.
+        """
+        burst = self._bursts.get(key)
+        if burst is None:
+            return
+        burst.flushed = True
+        burst.wakeup.set()
+        await burst.done.wait()
@@ -4,7 +4,7 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from handlers.base_handler import BaseHandler
 import config
-import json
+import tracing_service
 
 logger = logging.getLogger(__name__)
 
@@ -12,14 +12,25 @@ logger = logging.getLogger(__name__)
 from handlers import USER_STATE, USER_THOUGHTS
 from handlers import STATE_NORMAL, STATE_CHAT, STATE_GAME, STATE_DELETE
 
+def _entry_line(number, entry, show_date=True, show_categories=True):
+    """Render one numbered entry for /list, /delete or /category."""
+    text = entry.text or "No content"
+    # Truncate long thoughts
+    if len(text) > 100:
+        text = text[:100] + "..."
+
+    timestamp = f" ({entry.created_date})" if show_date and entry.created_date else ""
+    categories = f" [{', '.join(entry.categories)}]" if show_categories and entry.categories else ""
+    return f"{number}. {text}{timestamp}{categories}\n\n"
+
 class CommandHandler(BaseHandler):
     """Handles all bot commands."""
-    
+
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Send a welcome message when the command /start is issued."""
         user_id = update.effective_user.id
         USER_STATE[user_id] = STATE_NORMAL
-        
+
         welcome_text = (
             "👋 Welcome to your Personal Reflection Bot!\n\n"
             "I'm here to help you store thoughts, answer questions about yourself, "
@@ -30,6 +41,7 @@ class CommandHandler(BaseHandler):
             "• Use /game to play a 'get to know you' game\n"
             "• Use /delete to remove stored thoughts\n"
             "• Use /category to view thoughts by category\n"
+            "• Use /stats to see an overview of what you've stored\n"
             "• Use /help to see all commands\n\n"
             "Let's get started! How can I help you today?"
         )
@@ -52,7 +64,8 @@ class CommandHandler(BaseHandler):
             "**Other Commands:**\n"
             "/delete - List thoughts you can delete\n"
             "/list - List your recent thoughts\n"
-            "/category - View thoughts by category (work, health, relationships, purpose)\n\n"
+            "/category - View thoughts by category (work, health, relationships, purpose)\n"
+            "/stats - Counts by category, source and week\n\n"
             
             "**How to use:**\n"
             "• In normal mode: Send text or voice messages to store your thoughts\n"
@@ -104,7 +117,8 @@ class CommandHandler(BaseHandler):
         thoughts = await self.db_service.get_all_entries(
             collection_name=config.DB_COLLECTION_THOUGHTS,
             page=1,
-            page_size=10
+            page_size=10,
+            user_id=user_id
         )
         
         if not thoughts:
@@ -114,42 +128,7 @@ class CommandHandler(BaseHandler):
         # Create a list of thoughts
         thought_list = "Your recent thoughts:\n\n"
         for i, thought in enumerate(thoughts, 1):
-            # Extract text more safely
-            text = "No content"
-            
-            if isinstance(thought, dict):
-                if "text" in thought:
-                    text = thought["text"]
-                elif "metadata" in thought and isinstance(thought["metadata"], dict) and "text" in thought["metadata"]:
-                    text = thought["metadata"]["text"]
-            elif isinstance(thought, str):
-                # Try to parse JSON
-                try:
-                    thought_dict = json.loads(thought)
-                    if "text" in thought_dict:
-                        text = thought_dict["text"]
-                    elif "metadata" in thought_dict and isinstance(thought_dict["metadata"], dict) and "text" in thought_dict["metadata"]:
-                        text = thought_dict["metadata"]["text"]
-                except:
-                    # Just use the string directly
-                    text = thought
-            
-            # Truncate long thoughts
-            if len(text) > 100:
-                text = text[:100] + "..."
-            
-            # Add timestamp if available
-            timestamp = ""
-            if isinstance(thought, dict) and "metadata" in thought and isinstance(thought["metadata"], dict) and "created_at" in thought["metadata"]:
-                timestamp = f" ({thought['metadata']['created_at'][:10]})"
-            
-            # Add categories if available
-            categories = ""
-            if isinstance(thought, dict) and "metadata" in thought and isinstance(thought["metadata"], dict) and "categories" in thought["metadata"]:
-                if isinstance(thought["metadata"]["categories"], list):
-                    categories = f" [{', '.join(thought['metadata']['categories'])}]"
-            
-            thought_list += f"{i}. {text}{timestamp}{categories}\n\n"
+            thought_list += _entry_line(i, thought)
         
         await update.message.reply_text(thought_list)
     
@@ -162,7 +141,8 @@ class CommandHandler(BaseHandler):
         thoughts = await self.db_service.get_all_entries(
             collection_name=config.DB_COLLECTION_THOUGHTS,
             page=1,
-            page_size=10
+            page_size=10,
+            user_id=user_id
         )
         
         if not thoughts:
@@ -176,37 +156,7 @@ class CommandHandler(BaseHandler):
         # Create a list of thoughts with numbers
         thought_list = "Select a thought to delete:\n\n"
         for i, thought in enumerate(thoughts, 1):
-            # Extract text more safely
-            text = "No content"
-            
-            if isinstance(thought, dict):
-                if "text" in thought:
-                    text = thought["text"]
-                elif "metadata" in thought and isinstance(thought["metadata"], dict) and "text" in thought["metadata"]:
-                    text = thought["metadata"]["text"]
-            elif isinstance(thought, str):
-                # Try to parse JSON
-                try:
-                    thought_dict = json.loads(thought)
-                    if "text" in thought_dict:
-                        text = thought_dict["text"]
-                    elif "metadata" in thought_dict and isinstance(thought_dict["metadata"], dict) and "text" in thought_dict["metadata"]:
-                        text = thought_dict["metadata"]["text"]
-                except:
-                    # Just use the string directly
-                    text = thought
-            
-            # Truncate long thoughts
-            if len(text) > 100:
-                text = text[:100] + "..."
-            
-            # Add categories if available
-            categories = ""
-            if isinstance(thought, dict) and "metadata" in thought and isinstance(thought["metadata"], dict) and "categories" in thought["metadata"]:
-                if isinstance(thought["metadata"]["categories"], list):
-                    categories = f" [{', '.join(thought['metadata']['categories'])}]"
-            
-            thought_list += f"{i}. {text}{categories}\n\n"
+            thought_list += _entry_line(i, thought, show_date=False)
         
         # Create inline keyboard
         keyboard = []
@@ -229,6 +179,8 @@ class CommandHandler(BaseHandler):
     
     async def category_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Show thoughts by category."""
+        user_id = update.effective_user.id
+
         # Check if category was provided
         if not context.args or len(context.args) < 1:
             categories = ["work", "health", "relationships", "purpose"]
@@ -254,7 +206,8 @@ class CommandHandler(BaseHandler):
         thoughts = await self.db_service.search_by_category(
             collection_name=config.DB_COLLECTION_THOUGHTS,
             category=category,
-            limit=10
+            limit=10,
+            user_id=user_id
         )
         
         if not thoughts:
@@ -264,35 +217,52 @@ class CommandHandler(BaseHandler):
         # Create a list of thoughts
         thought_list = f"Your thoughts related to {category}:\n\n"
         for i, thought in enumerate(thoughts, 1):
-            # Extract text more safely
-            text = "No content"
-            
-            if isinstance(thought, dict):
-                if "text" in thought:
-                    text = thought["text"]
-                elif "metadata" in thought and isinstance(thought["metadata"], dict) and "text" in thought["metadata"]:
-                    text = thought["metadata"]["text"]
-            elif isinstance(thought, str):
-                # Try to parse JSON
-                try:
-                    thought_dict = json.loads(thought)
-                    if "text" in thought_dict:
-                        text = thought_dict["text"]
-                    elif "metadata" in thought_dict and isinstance(thought_dict["metadata"], dict) and "text" in thought_dict["metadata"]:
-                        text = thought_dict["metadata"]["text"]
-                except:
-                    # Just use the string directly
-                    text = thought
-            
-            # Truncate long thoughts
-            if len(text) > 100:
-                text = text[:100] + "..."
-            
-            # Add timestamp if available
-            timestamp = ""
-            if isinstance(thought, dict) and "metadata" in thought and isinstance(thought["metadata"], dict) and "created_at" in thought["metadata"]:
-                timestamp = f" ({thought['metadata']['created_at'][:10]})"
-            
-            thought_list += f"{i}. {text}{timestamp}\n\n"
+            thought_list += _entry_line(i, thought, show_categories=False)
+
+        await update.message.reply_text(thought_list)
+
+    async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Show counts of the user's thoughts by category, source and week."""
+        user_id = update.effective_user.id
+
+        if not self.db_service.stats:
+            await update.message.reply_text("Stats are not available right now.")
+            return
+
+        overview = await self.db_service.stats.render_overview(user_id)
+        await update.message.reply_text(overview)
+
+    async def trace_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Show the slowest recent updates as span waterfalls (admin only)."""
+        user_id = update.effective_user.id
+        if user_id not in config.ADMIN_USER_IDS:
+            await update.message.reply_text("Sorry, this command is only available to admins.")
+            return
+
+        # Number of traces to show, e.g. /trace 3
+        count = 5
+        if context.args:
+            try:
+                count = max(1, min(20, int(context.args[0])))
+            except ValueError:
+                pass
+
+        traces = tracing_service.TRACES.slowest(count)
+        if not traces:
+            await update.message.reply_text("No traces recorded yet.")
+            return
+
+        # Keep a full JSON dump on disk for deeper analysis
+        try:
+            dumped = tracing_service.TRACES.dump(config.TRACE_DUMP_FILE)
+            logger.info(f"Dumped {dumped} traces to {config.TRACE_DUMP_FILE}")
+        except OSError as e:
+            logger.error(f"Error dumping traces: {e}")
+
+        trace_text = "\n\n".join(tracing_service.render_waterfall(trace) for trace in traces)
+
+        # Telegram messages are limited to 4096 characters
+        if len(trace_text) > 4000:
+            trace_text = trace_text[:4000] + "\n..."
         
-        await update.message.reply_text(thought_list)
\ No newline at end of file
+        await update.message.reply_text(f"Slowest {len(traces)} recent updates:\n\n{trace_text}")
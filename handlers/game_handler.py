@@ -1,5 +1,4 @@
 # handlers/game_handler.py
-import os
 import logging
 from telegram import Update
 from telegram.ext import ContextTypes
@@ -16,30 +15,39 @@ class GameHandler(BaseHandler):
     
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle messages in game mode."""
+        async with self.presenter(update, context) as presenter:
+            await self._handle_answer(update, context, presenter)
+    
+    async def _handle_answer(self, update, context, presenter):
+        """Record an answer and ask the next question, as one reply edited as stages complete."""
         user_id = update.effective_user.id
         message = update.message
+        heard = ""
         
         # Handle voice message
         if message.voice:
-            await message.reply_text("🎙️ I received your voice note. Transcribing...")
+            # Shown while the voice note is listened to, then typing while it is handled
+            presenter.action("record_voice")
+            presenter.status("🎙️ I received your voice note. Transcribing...")
             
             # Download the voice file
-            voice_file = await context.bot.get_file(message.voice.file_id)
-            file_path = os.path.join(config.AUDIO_DIR, f"{message.voice.file_id}.ogg")
-            await voice_file.download_to_drive(file_path)
+            file_path = await self.download_voice_note(context, message.voice)
             
             # Transcribe the voice note
             answer_text = await self.whisper_service.transcribe_voice_note(file_path)
             
             if not answer_text:
-                await message.reply_text("Sorry, I couldn't transcribe your voice note. Please try again.")
+                await presenter.finish("Sorry, I couldn't transcribe your voice note. Please try again.")
                 return
+            presenter.action("typing")
             
-            await message.reply_text(f"I understood your answer as: \"{answer_text}\"")
+            heard = f"I understood your answer as: \"{answer_text}\"\n\n"
+            presenter.status(heard + "🤔 Thinking of the next question...")
         
         # Handle text message
         elif message.text and not message.text.startswith('/'):
             answer_text = message.text
+            presenter.action("typing")
         else:
             return
         
@@ -49,6 +57,6 @@ class GameHandler(BaseHandler):
         # Check if the game has ended
         if "Thank you for sharing!" in next_question:
             USER_STATE[user_id] = STATE_NORMAL
-            await message.reply_text(next_question)
+            await presenter.finish(heard + next_question)
         else:
-            await message.reply_text(f"Next question: {next_question}")
\ No newline at end of file
+            await presenter.finish(f"{heard}Next question: {next_question}")
@@ -1,7 +1,5 @@
 # handlers/normal_handler.py
-import os
 import logging
-from datetime import datetime
 from telegram import Update
 from telegram.ext import ContextTypes
 from handlers.base_handler import BaseHandler
@@ -15,8 +13,26 @@ from handlers import USER_STATE
 class NormalHandler(BaseHandler):
     """Handles messages in normal mode (storing thoughts)."""
     
+    DUPLICATE_REPLY = (
+        "🔁 You've already stored a nearly identical thought, so I didn't save it again. "
+        "You can find it using /list."
+    )
+    
+    async def _categorize(self, text, user_id, duplicate_of=None):
+        """Classify a thought, reusing the original's categories for a linked duplicate."""
+        if duplicate_of:
+            original = await self.db_service.get_entry(config.DB_COLLECTION_THOUGHTS, duplicate_of)
+            if original:
+                return list(original.categories)
+        return await self.classification_service.classify_text(text, user_id)
+    
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle messages in normal mode (storing thoughts)."""
+        async with self.presenter(update, context) as presenter:
+            await self._store_thought(update, context, presenter)
+    
+    async def _store_thought(self, update, context, presenter):
+        """Classify and store a thought, replying with one message edited as stages complete."""
         user_id = update.effective_user.id
         message = update.message
         
@@ -27,29 +43,36 @@ class NormalHandler(BaseHandler):
         
         # Check if it's a voice message
         if message.voice:
-            await message.reply_text("🎙️ I received your voice note. Transcribing...")
+            # Shown while the voice note is listened to, then typing while it is handled
+            presenter.action("record_voice")
+            presenter.status("🎙️ I received your voice note. Transcribing...")
             
             # Download the voice file
-            voice_file = await context.bot.get_file(message.voice.file_id)
-            file_path = os.path.join(config.AUDIO_DIR, f"{message.voice.file_id}.ogg")
-            await voice_file.download_to_drive(file_path)
+            file_path = await self.download_voice_note(context, message.voice)
             
             # Transcribe the voice note
             transcribed_text = await self.whisper_service.transcribe_voice_note(file_path)
             
             if not transcribed_text:
-                await message.reply_text("Sorry, I couldn't transcribe your voice note. Please try again.")
+                await presenter.finish("Sorry, I couldn't transcribe your voice note. Please try again.")
                 return
+            presenter.action("typing")
             
-            # Classify the transcribed text
-            categories = await self.classification_service.classify_text(transcribed_text)
+            # Classify the transcribed text, unless it repeats an earlier thought
+            duplicate_of = await self.db_service.find_near_duplicate(
+                config.DB_COLLECTION_THOUGHTS, transcribed_text, user_id)
+            if duplicate_of and config.DEDUP_MODE == "skip":
+                await presenter.finish(self.DUPLICATE_REPLY)
+                return
+            categories = await self._categorize(transcribed_text, user_id, duplicate_of)
             
             # Store the transcribed text with categories
             metadata = {
                 "user_id": user_id,
-                "source": "voice_note",
-                "created_at": datetime.now().isoformat()
+                "source": "voice_note"
             }
+            if duplicate_of:
+                metadata["duplicate_of"] = duplicate_of
             
             entry_id = await self.db_service.store_entry(
                 collection_name=config.DB_COLLECTION_THOUGHTS,
@@ -64,25 +87,35 @@ class NormalHandler(BaseHandler):
                 category_info = f"\nCategories: {', '.join(categories)}"
             
             if entry_id:
-                await message.reply_text(
+                if self.profile_service:
+                    self.profile_service.note_entry(user_id, transcribed_text, categories, "voice_note")
+                await presenter.finish(
                     f"✅ I've transcribed and stored your thought:{category_info}\n\n"
                     f"\"{transcribed_text}\"\n\n"
                     f"You can find it later using /list or chat with me about it using /chat."
                 )
             else:
-                await message.reply_text("Sorry, I couldn't store your thought. Please try again.")
+                await presenter.finish("Sorry, I couldn't store your thought. Please try again.")
             
         # Check if it's a text message
         elif message.text and not message.text.startswith('/'):
-            # Classify the text
-            categories = await self.classification_service.classify_text(message.text)
+            presenter.action("typing")
+            
+            # Classify the text, unless it repeats an earlier thought
+            duplicate_of = await self.db_service.find_near_duplicate(
+                config.DB_COLLECTION_THOUGHTS, message.text, user_id)
+            if duplicate_of and config.DEDUP_MODE == "skip":
+                await presenter.finish(self.DUPLICATE_REPLY)
+                return
+            categories = await self._categorize(message.text, user_id, duplicate_of)
             
             # Store the text with categories
             metadata = {
                 "user_id": user_id,
-                "source": "text_message",
-                "created_at": datetime.now().isoformat()
+                "source": "text_message"
             }
+            if duplicate_of:
+                metadata["duplicate_of"] = duplicate_of
             
             entry_id = await self.db_service.store_entry(
                 collection_name=config.DB_COLLECTION_THOUGHTS,
@@ -97,8 +130,10 @@ class NormalHandler(BaseHandler):
                 category_info = f"\nCategories: {', '.join(categories)}"
             
             if entry_id:
-                await message.reply_text(
+                if self.profile_service:
+                    self.profile_service.note_entry(user_id, message.text, categories, "text_message")
+                await presenter.finish(
                     f"✅ I've stored your thought.{category_info} You can find it later using /list or chat with me about it using /chat."
                 )
             else:
-                await message.reply_text("Sorry, I couldn't store your thought. Please try again.")
\ No newline at end of file
+                await presenter.finish("Sorry, I couldn't store your thought. Please try again.")
\ No newline at end of file
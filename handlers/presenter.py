@@ -0,0 +1,142 @@
+# handlers/presenter.py
+import asyncio
+import logging
+from metrics_service import track
+
+logger = logging.getLogger(__name__)
+
+# Telegram shows a chat action for about 5 seconds, so it is resent a little sooner
+_ACTION_REFRESH = 4.5
+
+# Left in place of the progress message when a newer message cancels the update
+SUPERSEDED_TEXT = "⏭️ Skipped in favour of your newer message."
+
+
+class Presenter:
+    """
+    Presents the bot's progress on one update as a single message.
+
+    A chat action matching the current work ("record_voice" while a voice
+    note is transcribed, "typing" otherwise) is kept up while the update is
+    being handled.
+    The first status() sends a placeholder reply, later ones edit it in place,
+    and finish() edits it into the final answer; without a placeholder the
+    answer is sent as a normal reply. Chat actions and status updates run in
+    the background, so none of their round trips are on the critical path,
+    and a status superseded before its turn is never sent.
+
+    Use as `async with Presenter(message, bot, chat_id) as presenter:` so the
+    chat action stops when the handler is done. If the handler is cancelled,
+    pending status updates are dropped and a placeholder already shown is
+    edited into a short note, so no "thinking" message is left behind.
+
+    Args:
+        message: The incoming message to reply to
+        bot: Bot used for chat actions
+        chat_id: Chat the message came from
+    """
+
+    def __init__(self, message, bot, chat_id):
+        self._message = message
+        self._bot = bot
+        self._chat_id = chat_id
+        self._placeholder = None
+        self._shown = None
+        self._wanted = None
+        self._updates = None
+        self._pending = set()
+        self._sending = None
+        self._action_task = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._stop_action()
+        if exc_type is not None and issubclass(exc_type, asyncio.CancelledError):
+            await self._abandon()
+        return False
+
+    async def _abandon(self):
+        """Drop pending status updates and mark the placeholder as superseded."""
+        pending = list(self._pending)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        if self._placeholder is None and self._sending is not None:
+            # A placeholder already on its way still arrives, so it is edited too
+            sent, = await asyncio.gather(self._sending, return_exceptions=True)
+            if not isinstance(sent, BaseException):
+                self._placeholder = sent
+        if self._placeholder is not None:
+            await self._show(SUPERSEDED_TEXT)
+
+    def action(self, action="typing"):
+        """
+        Show a chat action until finish(), replacing any current one.
+
+        Args:
+            action: Telegram chat action matching the work, e.g. "typing", or
+                "record_voice" while a voice note is being transcribed
+        """
+        self._stop_action()
+        self._action_task = asyncio.ensure_future(self._keep_action(action))
+
+    def _stop_action(self):
+        if self._action_task is not None:
+            self._action_task.cancel()
+            self._action_task = None
+
+    async def _keep_action(self, action):
+        while True:
+            try:
+                async with track("telegram.chat_action"):
+                    await self._bot.send_chat_action(chat_id=self._chat_id, action=action)
+            except Exception as e:
+                logger.warning(f"Error sending chat action: {e}")
+                return
+            await asyncio.sleep(_ACTION_REFRESH)
+
+    def status(self, text):
+        """Show a progress line without waiting for Telegram."""
+        self._wanted = text
+        self._updates = asyncio.ensure_future(self._show_after(self._updates))
+        self._pending.add(self._updates)
+        self._updates.add_done_callback(self._pending.discard)
+
+    async def _show_after(self, previous):
+        if previous is not None:
+            await asyncio.wait([previous])
+        await self._show(self._wanted)
+
+    async def _show(self, text, **kwargs):
+        """Send or edit the placeholder to text; returns False if Telegram refused."""
+        if text == self._shown and not kwargs:
+            return True
+        try:
+            if self._placeholder is None:
+                async with track("telegram.send"):
+                    # Shielded, so a cancelled update still learns which message it sent
+                    self._sending = asyncio.ensure_future(self._message.reply_text(text, **kwargs))
+                    self._placeholder = await asyncio.shield(self._sending)
+            else:
+                async with track("telegram.edit"):
+                    await self._placeholder.edit_text(text, **kwargs)
+            self._shown = text
+            return True
+        except Exception as e:
+            logger.warning(f"Error updating reply: {e}")
+            return False
+
+    async def finish(self, text, **kwargs):
+        """Show the final reply, editing the placeholder if there is one."""
+        self._stop_action()
+        self._wanted = text
+        if self._updates is not None:
+            await asyncio.wait([self._updates])
+        if self._placeholder is not None and await self._show(text, **kwargs):
+            return
+        # No placeholder, or editing it failed (e.g. it was deleted)
+        async with track("telegram.send"):
+            await self._message.reply_text(text, **kwargs)
@@ -0,0 +1,167 @@
+# lexical_index.py
+import re
+import math
+from array import array
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9'\-]*")
+
+# Deleted entries stay in the postings until this share of the index is dead
+_COMPACT_RATIO = 0.25
+
+
+def tokenize(text):
+    """Lowercase word tokens; numbers and hyphenated names are kept whole."""
+    return _TOKEN_RE.findall(text.lower()) if text else []
+
+
+class LexicalIndex:
+    """
+    In-memory BM25 inverted index over one corpus of short texts.
+
+    Postings are kept as compact arrays of entry ordinals and term
+    frequencies, so scoring a query is a handful of vectorized numpy
+    operations per query term. Deletes leave a tombstone that is dropped
+    the next time the index compacts itself.
+
+    Args:
+        k1: BM25 term-frequency saturation
+        b: BM25 length normalization
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._ids = []                  # ordinal -> entry ID (None once deleted)
+        self._ordinals = {}             # entry ID -> ordinal
+        self._lengths = array("I")      # ordinal -> token count (0 once deleted)
+        self._postings = {}             # term -> (array("I") ordinals, array("H") frequencies)
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._ordinals)
+
+    def __contains__(self, entry_id):
+        return entry_id in self._ordinals
+
+    def add(self, entry_id, text):
+        """Index an entry; entries already in the index are left as they are."""
+        if entry_id in self._ordinals:
+            return
+
+        tokens = tokenize(text)
+        ordinal = len(self._ids)
+        self._ids.append(entry_id)
+        self._ordinals[entry_id] = ordinal
+        self._lengths.append(len(tokens))
+        self._total_length += len(tokens)
+
+        frequencies = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+        for token, frequency in frequencies.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = (array("I"), array("H"))
+            postings[0].append(ordinal)
+            postings[1].append(min(frequency, 0xFFFF))
+
+    def remove(self, entry_id):
+        """Drop an entry from the index. Returns False if it wasn't indexed."""
+        ordinal = self._ordinals.pop(entry_id, None)
+        if ordinal is None:
+            return False
+
+        self._ids[ordinal] = None
+        self._total_length -= self._lengths[ordinal]
+        self._lengths[ordinal] = 0
+        if len(self._ids) - len(self._ordinals) > _COMPACT_RATIO * len(self._ids):
+            self._compact()
+        return True
+
+    def _compact(self):
+        """Renumber the live entries and rebuild postings without tombstones."""
+        remap = array("i", [-1]) * len(self._ids)
+        ids = []
+        lengths = array("I")
+        for ordinal, entry_id in enumerate(self._ids):
+            if entry_id is not None:
+                remap[ordinal] = len(ids)
+                ids.append(entry_id)
+                lengths.append(self._lengths[ordinal])
+
+        postings = {}
+        for token, (ordinals, frequencies) in self._postings.items():
+            live_ordinals, live_frequencies = array("I"), array("H")
+            for ordinal, frequency in zip(ordinals, frequencies):
+                if remap[ordinal] >= 0:
+                    live_ordinals.append(remap[ordinal])
+                    live_frequencies.append(frequency)
+            if live_ordinals:
+                postings[token] = (live_ordinals, live_frequencies)
+
+        self._ids = ids
+        self._ordinals = {entry_id: ordinal for ordinal, entry_id in enumerate(ids)}
+        self._lengths = lengths
+        self._postings = postings
+
+    def search(self, query, limit=5, allowed=None):
+        """
+        Rank entries against a query with BM25.
+
+        Args:
+            query: The query text
+            limit: Maximum number of results
+            allowed: Optional iterable of entry IDs to restrict the results to
+
+        Returns:
+            list: (entry_id, score) pairs, best first, only entries matching a query term
+        """
+        count = len(self._ordinals)
+        if not count or limit <= 0:
+            return []
+
+        average_length = self._total_length / count or 1.0
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32).astype(np.float32)
+        norms = self.k1 * (1.0 - self.b + self.b * lengths / average_length)
+        scores = np.zeros(len(self._ids), dtype=np.float32)
+
+        for token in set(tokenize(query)):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            ordinals = np.frombuffer(postings[0], dtype=np.uint32)
+            frequencies = np.frombuffer(postings[1], dtype=np.uint16).astype(np.float32)
+            document_frequency = len(ordinals)
+            idf = math.log(1.0 + (count - document_frequency + 0.5) / (document_frequency + 0.5))
+            scores[ordinals] += idf * frequencies * (self.k1 + 1.0) / (frequencies + norms[ordinals])
+
+        # Tombstones have zero length but may still sit in postings
+        scores[lengths == 0] = 0.0
+        if allowed is not None:
+            keep = np.zeros(len(self._ids), dtype=bool)
+            keep[[self._ordinals[entry_id] for entry_id in allowed if entry_id in self._ordinals]] = True
+            scores[~keep] = 0.0
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > limit:
+            matched = matched[np.argpartition(-scores[matched], limit - 1)[:limit]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(self._ids[ordinal], float(scores[ordinal])) for ordinal in matched]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuse several best-first rankings of IDs.
+
+    Args:
+        rankings: Lists of IDs, each ordered best first
+        k: Damping constant; larger values flatten the contribution of top ranks
+
+    Returns:
+        list: IDs ordered by fused score
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, entry_id in enumerate(ranking):
+            scores[entry_id] = scores.get(entry_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
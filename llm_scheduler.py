@@ -0,0 +1,257 @@
+# llm_scheduler.py
+import json
+import time
+import asyncio
+import heapq
+import itertools
+import logging
+from metrics_service import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, most urgent first
+INTERACTIVE = 0
+GAME = 1
+INGESTION = 2
+BACKGROUND = 3
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", GAME: "game", INGESTION: "ingestion", BACKGROUND: "background"}
+
+QUEUE_WAIT = REGISTRY.histogram(
+    "ragbot_llm_queue_wait_seconds", "Time LLM requests wait for the scheduler", ["priority"]
+)
+QUEUE_DEPTH = REGISTRY.gauge(
+    "ragbot_llm_queue_depth", "LLM requests waiting for the scheduler", ["priority"]
+)
+RATE_LIMITED = REGISTRY.counter(
+    "ragbot_llm_rate_limited_total", "Times the head of the LLM queue waited for rate-limit tokens", ["limit"]
+)
+
+
+def estimate_tokens(kwargs):
+    """Rough token cost of a Messages request: about 4 characters per input token, plus max_tokens."""
+    prompt = json.dumps([kwargs.get("system") or "", kwargs.get("messages") or []], ensure_ascii=False)
+    return len(prompt) // 4 + int(kwargs.get("max_tokens") or 0)
+
+
+class TokenBucket:
+    """
+    Tokens refilled continuously at capacity per minute.
+
+    Args:
+        per_minute: Capacity and refill per minute; 0 or less disables the limit
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    @property
+    def enabled(self):
+        return self.capacity > 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, amount, reserve=0.0):
+        """
+        Seconds until amount tokens can be taken while leaving reserve tokens behind.
+
+        Requests bigger than the bucket only wait for it to be full.
+        """
+        if not self.enabled:
+            return 0.0
+        self._refill()
+        needed = min(amount + reserve, self.capacity)
+        return max(0.0, (needed - self.tokens) / self.rate)
+
+    def take(self, amount):
+        if self.enabled:
+            self._refill()
+            self.tokens -= amount
+
+    def give_back(self, amount):
+        if self.enabled:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class _Request:
+    __slots__ = ("priority", "user_id", "cost", "start", "future", "enqueued_at")
+
+    def __init__(self, priority, user_id, cost, start, future):
+        self.priority = priority
+        self.user_id = user_id
+        self.cost = cost
+        self.start = start
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class Grant:
+    """A started request; settle() with the tokens actually used to refund the estimate."""
+
+    __slots__ = ("_scheduler", "priority", "cost", "_done")
+
+    def __init__(self, scheduler, priority, cost):
+        self._scheduler = scheduler
+        self.priority = priority
+        self.cost = cost
+        self._done = False
+
+    def settle(self, used_tokens):
+        if not self._done and used_tokens is not None:
+            self._scheduler._tokens.give_back(self.cost - used_tokens)
+            self.cost = used_tokens
+
+    def _finish(self):
+        if not self._done:
+            self._done = True
+            self._scheduler._release()
+
+
+class LLMScheduler:
+    """
+    Admits LLM requests by priority class, per-user fairness and rate limits.
+
+    Waiting requests are started strictly in priority order (interactive chat,
+    then game, ingestion classification and background jobs). Within a class
+    users are served by weighted fair queueing: each request gets a virtual
+    finish time of max(now, the user's last finish) + cost / weight, so one
+    user's burst of classifications interleaves with everyone else's instead
+    of queueing ahead of them. A request starts when a concurrency slot is
+    free and the requests-per-minute and tokens-per-minute buckets can pay for
+    it; requests below interactive priority must also leave reserve_fraction
+    of each bucket untouched, so chat answers find headroom under load.
+
+    Args:
+        rpm: Requests per minute; 0 disables the limit
+        tpm: Tokens (input plus output) per minute; 0 disables the limit
+        max_concurrency: Requests in flight at once
+        reserve_fraction: Share of each bucket kept for interactive requests
+    """
+
+    def __init__(self, rpm=0, tpm=0, max_concurrency=8, reserve_fraction=0.0):
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.reserve_fraction = reserve_fraction
+        self._in_flight = 0
+        self._queues = {priority: [] for priority in PRIORITY_NAMES}
+        self._virtual_time = {priority: 0.0 for priority in PRIORITY_NAMES}
+        self._finish_tags = {priority: {} for priority in PRIORITY_NAMES}
+        self._sequence = itertools.count()
+        self._timer = None
+        for priority, name in PRIORITY_NAMES.items():
+            QUEUE_DEPTH.set_function(name, func=lambda queue=self._queues[priority]: len(queue))
+
+    def queue_depth(self, max_priority=BACKGROUND):
+        """Number of waiting requests that would start before a new request of max_priority."""
+        return sum(len(queue) for priority, queue in self._queues.items() if priority <= max_priority)
+
+    def request(self, priority=BACKGROUND, user_id=None, cost=0, weight=1.0):
+        """
+        Wait for a slot, for use as `async with scheduler.request(...) as grant:`.
+
+        Args:
+            priority: One of INTERACTIVE, GAME, INGESTION or BACKGROUND
+            user_id: User the request is made for; None shares one background lane
+            cost: Estimated tokens, see estimate_tokens()
+            weight: The user's share relative to others in the same class
+        """
+        return _Slot(self, priority, user_id, cost, weight)
+
+    def _enqueue(self, priority, user_id, cost, weight):
+        future = asyncio.get_running_loop().create_future()
+        finish_tags = self._finish_tags[priority]
+        start = max(self._virtual_time[priority], finish_tags.get(user_id, 0.0))
+        finish = start + max(cost, 1) / weight
+        finish_tags[user_id] = finish
+        request = _Request(priority, user_id, cost, start, future)
+        heapq.heappush(self._queues[priority], (finish, next(self._sequence), request))
+        self._dispatch()
+        return request
+
+    def _cancel(self, request):
+        queue = self._queues[request.priority]
+        for index, (_, _, queued) in enumerate(queue):
+            if queued is request:
+                queue[index] = queue[-1]
+                queue.pop()
+                heapq.heapify(queue)
+                break
+        self._dispatch()
+
+    def _release(self):
+        self._in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Start waiting requests while a slot and rate-limit tokens are available."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._in_flight < self.max_concurrency:
+            head = next(((priority, queue) for priority, queue in self._queues.items() if queue), None)
+            if head is None:
+                return
+            priority, queue = head
+            _, _, request = queue[0]
+            if request.future.done():
+                # Cancelled while waiting
+                heapq.heappop(queue)
+                continue
+
+            reserve = 0.0 if priority == INTERACTIVE else self.reserve_fraction
+            request_delay = self._requests.delay(1, reserve * self._requests.capacity)
+            token_delay = self._tokens.delay(request.cost, reserve * self._tokens.capacity)
+            delay = max(request_delay, token_delay)
+            if delay > 0:
+                RATE_LIMITED.inc("requests" if request_delay >= token_delay else "tokens")
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+
+            heapq.heappop(queue)
+            self._virtual_time[priority] = max(self._virtual_time[priority], request.start)
+            if not queue:
+                # An idle class starts over, so old finish tags don't penalize anyone
+                self._finish_tags[priority].clear()
+                self._virtual_time[priority] = 0.0
+            self._requests.take(1)
+            self._tokens.take(request.cost)
+            self._in_flight += 1
+            QUEUE_WAIT.observe(PRIORITY_NAMES[priority], value=time.perf_counter() - request.enqueued_at)
+            request.future.set_result(Grant(self, priority, request.cost))
+
+
+class _Slot:
+    __slots__ = ("_scheduler", "_args", "_request", "_grant")
+
+    def __init__(self, scheduler, priority, user_id, cost, weight):
+        self._scheduler = scheduler
+        self._args = (priority, user_id, cost, weight)
+        self._request = None
+        self._grant = None
+
+    async def __aenter__(self):
+        self._request = self._scheduler._enqueue(*self._args)
+        try:
+            self._grant = await self._request.future
+        except asyncio.CancelledError:
+            future = self._request.future
+            if future.done() and not future.cancelled():
+                # Granted just as the caller gave up
+                future.result()._finish()
+            else:
+                self._scheduler._cancel(self._request)
+            raise
+        return self._grant
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._grant._finish()
+        return False
@@ -0,0 +1,154 @@
+# logging_service.py
+import os
+import gzip
+import shutil
+import atexit
+import queue
+import logging
+import logging.handlers
+import threading
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+_listener = None
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Let through only one in every N DEBUG records per call site.
+
+    Records are keyed on the logger name and the unformatted message template,
+    so hot-path debug lines are thinned out without silencing rare ones.
+    Records above DEBUG always pass.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = max(1, int(rate))
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate == 1:
+            return True
+
+        key = (record.name, record.msg)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        return count % self.rate == 0
+
+
+def _gzip_namer(name):
+    """Name rotated log files with a .gz suffix."""
+    return name + ".gz"
+
+
+def _gzip_rotator(source, dest):
+    """Compress the rotated log file and remove the uncompressed original."""
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def parse_module_levels(spec):
+    """
+    Parse a per-module level spec such as "httpx=WARNING,database=DEBUG".
+
+    Args:
+        spec: Comma-separated list of logger=LEVEL pairs
+
+    Returns:
+        dict: Logger names mapped to logging levels
+    """
+    levels = {}
+    if not spec:
+        return levels
+
+    for item in spec.split(","):
+        item = item.strip()
+        if not item or "=" not in item:
+            continue
+        name, level = item.split("=", 1)
+        levels[name.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+def setup_logging(log_dir, level="INFO", module_levels=None, max_bytes=10 * 1024 * 1024,
+                  backup_count=5, debug_sample_rate=1, log_file="bot.log"):
+    """
+    Configure non-blocking logging for the whole process.
+
+    Log calls only put the record on an in-memory queue. A QueueListener thread
+    formats the records and writes them to the console and to a size-rotated,
+    gzip-compressed log file.
+
+    Args:
+        log_dir: Directory for the log file
+        level: Root log level
+        module_levels: Optional dict of logger name to level overrides
+        max_bytes: Rotate the log file once it reaches this size
+        backup_count: Number of compressed log files to keep
+        debug_sample_rate: Keep one in every N DEBUG records per call site
+        log_file: Name of the log file inside log_dir
+
+    Returns:
+        logging.handlers.QueueListener: The running background listener
+    """
+    global _listener
+
+    if _listener is not None:
+        return _listener
+
+    if not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+
+    formatter = logging.Formatter(LOG_FORMAT)
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        os.path.join(log_dir, log_file),
+        maxBytes=max_bytes,
+        backupCount=backup_count,
+        encoding="utf-8"
+    )
+    file_handler.namer = _gzip_namer
+    file_handler.rotator = _gzip_rotator
+    file_handler.setFormatter(formatter)
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(DebugSamplingFilter(debug_sample_rate))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    for name, module_level in (module_levels or {}).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(
+        log_queue, file_handler, stream_handler, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+    return _listener
+
+
+def shutdown_logging():
+    """Flush queued records and stop the background writer thread."""
+    global _listener
+
+    if _listener is None:
+        return
+
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
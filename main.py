@@ -1,33 +1,69 @@
 # main.py
+import time
+_STARTUP_BEGIN = time.perf_counter()
+
 import asyncio
 import logging
-from telegram import Update
-from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
+from contextlib import contextmanager
+from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, CallbackQueryHandler, filters
 import config
 from handlers import HandlerManager
+from metrics_service import start_metrics_server
+import service_registry
 
 logger = logging.getLogger(__name__)
 
-# Simple echo handler for testing
-async def echo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Echo the user message."""
-    print(f"Echo received: {update.message.text}")
-    await update.message.reply_text(f"You said: {update.message.text}")
+_IMPORTS_DONE = time.perf_counter()
+
+class StartupTimer:
+    """Collects how long each startup step takes and prints a short report."""
+    
+    def __init__(self):
+        self.stages = [("imports", _IMPORTS_DONE - _STARTUP_BEGIN)]
+    
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, time.perf_counter() - start))
+    
+    def report(self):
+        total = time.perf_counter() - _STARTUP_BEGIN
+        lines = ["⏱️ Startup timing:"]
+        lines.extend(f"   {name:<28} {duration * 1000:8.1f} ms" for name, duration in self.stages)
+        lines.append(f"   {'total (wall clock)':<28} {total * 1000:8.1f} ms")
+        print("\n".join(lines))
+        logger.info(f"Startup finished in {total * 1000:.1f} ms")
+
+def register_handlers(application, handlers):
+    """
+    Route Telegram updates to a HandlerManager.
+
+    Plain text and voice notes must reach handlers.handle_message, which does
+    the per-user ordering, coalescing and chat supersede, so no other handler
+    for them may come before it in group 0.
+    """
+    for command in ("start", "help", "chat", "game", "normal", "delete",
+                    "list", "category", "stats", "trace"):
+        application.add_handler(CommandHandler(command, getattr(handlers, f"{command}_command")))
+    application.add_handler(MessageHandler(filters.TEXT | filters.VOICE, handlers.handle_message))
+    application.add_handler(CallbackQueryHandler(handlers.handle_callback_query))
 
 # Error handler
 async def error_handler(update, context):
     """Log Errors caused by Updates."""
     logger.error(f"Update {update} caused error {context.error}")
-    print(f"❌ Error in update {update}: {context.error}")
 
-async def test_database_connection():
-    """Test database connectivity before starting the bot."""
+async def test_database_connection(timer):
+    """Connect the shared database service before starting the bot."""
     try:
         print("🧪 Testing database connection...")
-        from database import DatabaseService
         
-        # Create a temporary database service to test connectivity
-        db_service = DatabaseService()
+        # The service is kept in the registry, so the handlers reuse this connection
+        with timer.stage("database connect"):
+            await asyncio.to_thread(service_registry.get_database_service)
         
         print("✅ Database connection test successful!")
         return True
@@ -41,55 +77,50 @@ async def main() -> None:
     """Start the bot."""
     try:
         print("\n🤖 Starting Personal Reflection Bot...\n")
+        timer = StartupTimer()
+        
+        # Create the Application instance
+        print("🔑 Initializing with Telegram token...")
+        with timer.stage("telegram build"):
+            # Concurrent, so a newer message can supersede one still being answered;
+            # HandlerManager keeps each user's messages in order
+            application = ApplicationBuilder().token(config.TELEGRAM_BOT_TOKEN).concurrent_updates(True).build()
         
-        # Test database connection before proceeding
-        db_test_success = await test_database_connection()
-        if not db_test_success:
+        # Connect to the database while Telegram initializes
+        db_test = asyncio.create_task(test_database_connection(timer))
+        with timer.stage("telegram initialize"):
+            await application.initialize()
+        
+        if not await db_test:
             print("❌ Cannot continue without database connection")
+            await application.shutdown()
             return
         
-        # Create the Application instance
-        print("\n🔑 Initializing with Telegram token...")
-        application = ApplicationBuilder().token(config.TELEGRAM_BOT_TOKEN).build()
-        
         # Add error handler
         print("🛠️ Setting up error handler...")
         application.add_error_handler(error_handler)
         
         # Initialize handlers
         print("🔧 Setting up message handlers...")
-        handlers = HandlerManager()
-        
-        # Add simple echo handler for testing basic functionality
-        print("🔊 Adding test echo handler...")
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, echo))
-        
-        # Add command handlers
-        print("📝 Registering command handlers...")
-        application.add_handler(CommandHandler("start", handlers.start_command))
-        application.add_handler(CommandHandler("help", handlers.help_command))
-        application.add_handler(CommandHandler("chat", handlers.chat_command))
-        application.add_handler(CommandHandler("game", handlers.game_command))
-        application.add_handler(CommandHandler("normal", handlers.normal_command))
-        application.add_handler(CommandHandler("delete", handlers.delete_command))
-        application.add_handler(CommandHandler("list", handlers.list_command))
-        application.add_handler(CommandHandler("category", handlers.category_command))
+        with timer.stage("handlers"):
+            handlers = HandlerManager()
         
-        # Add message handler
-        print("💬 Registering message handlers...")
-        application.add_handler(MessageHandler(filters.TEXT | filters.VOICE, handlers.handle_message))
+        print("📝 Registering command, message and callback query handlers...")
+        register_handlers(application, handlers)
         
-        # Add callback query handler
-        print("🔄 Registering callback query handler...")
-        application.add_handler(CallbackQueryHandler(handlers.handle_callback_query))
+        # Expose metrics for scraping
+        if config.METRICS_ENABLED:
+            print("📈 Starting metrics endpoint...")
+            start_metrics_server(config.METRICS_HOST, config.METRICS_PORT)
         
         # Start the bot
-        print("\n🚀 Initializing bot and starting polling...")
+        print("\n🚀 Starting polling...")
         logger.info("Starting bot...")
-        await application.initialize()
-        await application.start()
-        await application.updater.start_polling()
+        with timer.stage("start polling"):
+            await application.start()
+            await application.updater.start_polling()
         
+        timer.report()
         print("\n✅ Bot is now running! Press Ctrl+C to stop.")
         print("-------------------------------------------")
         
@@ -105,6 +136,8 @@ async def main() -> None:
             # On keyboard interrupt, stop the application
             await application.stop()
             await application.shutdown()
+            if handlers.recorder:
+                handlers.recorder.close()
         
     except Exception as e:
         error_msg = f"Error starting bot: {e}"
@@ -0,0 +1,337 @@
+# metrics_service.py
+import time
+import asyncio
+import bisect
+import logging
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tracing_service import record_span
+
+logger = logging.getLogger(__name__)
+
+# Default latency buckets in seconds, from a fast cache hit to a slow LLM call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+class _Metric:
+    """Common state for a labelled metric family."""
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+        return tuple(str(label) for label in labels)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}"
+        ]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter."""
+
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, or be read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._callbacks = {}
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, *labels, func):
+        """Read the gauge value from func() whenever metrics are rendered."""
+        with self._lock:
+            self._callbacks[self._key(labels)] = func
+
+    def value(self, *labels):
+        key = self._key(labels)
+        if key in self._callbacks:
+            return self._callbacks[key]()
+        return self._values.get(key, 0)
+
+    def _samples(self):
+        samples = super()._samples()
+        with self._lock:
+            callbacks = list(self._callbacks.items())
+        for key, func in callbacks:
+            try:
+                value = func()
+            except Exception as e:
+                logger.warning(f"Gauge callback for {self.name} failed: {e}")
+                continue
+            samples.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return samples
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observed values (usually latencies in seconds)."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *labels, value):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (last slot is +Inf), then sum and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def quantile(self, q, *labels):
+        """
+        Estimate a quantile from the bucket counts.
+
+        Args:
+            q: Quantile between 0 and 1
+            labels: Label values of the series
+
+        Returns:
+            float: Upper bound of the bucket holding the quantile, or None with no data
+        """
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            if not state or not state[2]:
+                return None
+            counts, _, total = list(state[0]), state[1], state[2]
+
+        rank = q * total
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+    def summary(self):
+        """Return {label values: (count, sum)} for every series."""
+        with self._lock:
+            return {key: (state[2], state[1]) for key, state in self._values.items()}
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+
+        samples = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labelnames, key, ("le", le))
+                samples.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            samples.append(f"{self.name}_sum{labels} {total}")
+            samples.append(f"{self.name}_count{labels} {count}")
+        return samples
+
+
+class MetricsRegistry:
+    """Holds every metric family and renders them in Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric_cls, name, *args, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = metric_cls(name, *args, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_LATENCY = REGISTRY.histogram(
+    "ragbot_stage_latency_seconds", "Latency of each pipeline stage", ["stage"]
+)
+STAGE_CALLS = REGISTRY.counter(
+    "ragbot_stage_calls_total", "Calls to each pipeline stage by outcome", ["stage", "outcome"]
+)
+STAGE_IN_FLIGHT = REGISTRY.gauge(
+    "ragbot_stage_in_flight", "Calls currently running in each pipeline stage", ["stage"]
+)
+EXECUTOR_QUEUE_DEPTH = REGISTRY.gauge(
+    "ragbot_executor_queue_depth", "Work items waiting for an executor thread", ["executor"]
+)
+
+
+class track:
+    """
+    Time a pipeline stage and record it in the stage metrics.
+
+    Works as a sync or async context manager. An exception escaping the block
+    counts the call as an error; services that swallow errors can call
+    mark_error() on the tracker instead. When an update is being traced the
+    stage is also recorded as a span of that trace.
+    """
+
+    __slots__ = ("stage", "outcome", "_start")
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.outcome = "ok"
+        self._start = None
+
+    def mark_error(self):
+        self.outcome = "error"
+
+    def __enter__(self):
+        STAGE_IN_FLIGHT.inc(self.stage)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        STAGE_IN_FLIGHT.dec(self.stage)
+        if exc_type is asyncio.CancelledError:
+            self.outcome = "cancelled"
+        elif exc_type is not None:
+            self.outcome = "error"
+        STAGE_LATENCY.observe(self.stage, value=elapsed)
+        STAGE_CALLS.inc(self.stage, self.outcome)
+        record_span(self.stage, self._start, elapsed)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+
+def timed(stage):
+    """Decorator that tracks every call of an async function as a stage."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with track(stage):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class InstrumentedExecutor(ThreadPoolExecutor):
+    """Thread pool for blocking SDK calls that reports its queue depth."""
+
+    def __init__(self, name, max_workers=None):
+        super().__init__(max_workers=max_workers, thread_name_prefix=f"{name}-executor")
+        self.name = name
+        EXECUTOR_QUEUE_DEPTH.set_function(name, func=self._work_queue.qsize)
+
+    async def run(self, func, *args, **kwargs):
+        """Run a blocking callable on this executor without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self, functools.partial(func, *args, **kwargs))
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("Metrics request: " + format, *args)
+
+
+def start_metrics_server(host, port):
+    """
+    Serve the registry on http://host:port/metrics from a daemon thread.
+
+    Args:
+        host: Interface to bind to
+        port: TCP port to listen on
+
+    Returns:
+        ThreadingHTTPServer: The running server
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True)
+    thread.start()
+    logger.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,124 @@
+# migrate_schema.py
+"""
+Rewrite version 1 documents in the version 2 layout (see schema.py) in place.
+
+Each collection is read one Data API page at a time; the legacy documents on
+a page are upgraded with bounded concurrency, and the page state is written
+to a checkpoint file after every page, so an interrupted run picks up where
+it stopped. The bot can keep running meanwhile: with SCHEMA_LEGACY_READS on
+it reads and filters on both layouts. Once every collection reports done,
+set SCHEMA_LEGACY_READS=false.
+
+Example:
+    python migrate_schema.py                  # dry run: count legacy documents
+    python migrate_schema.py --apply --pause 0.2
+"""
+import os
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+import schema
+
+logger = logging.getLogger(__name__)
+
+COLLECTIONS = [config.DB_COLLECTION_THOUGHTS, config.DB_COLLECTION_GAME, config.DB_COLLECTION_CHAT]
+
+
+def load_checkpoint(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_checkpoint(path, checkpoint):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def migrate_collection(collection, progress, apply=False, concurrency=4, pause=0.0, on_page=None):
+    """
+    Upgrade a collection's legacy documents, resuming from progress["page_state"].
+
+    Args:
+        collection: AstraDB collection
+        progress: Dict with page_state, scanned, upgraded and done; updated in place
+        apply: Write the upgrades; otherwise only count them
+        concurrency: Parallel update requests per page
+        pause: Seconds to sleep between pages to limit load on the database
+        on_page: Optional callback run after each page, e.g. to save a checkpoint
+    """
+    def upgrade(document):
+        update = schema.upgrade(document)
+        if update is None:
+            return False
+        if apply:
+            collection.update_one({"_id": document["_id"]}, update)
+        return True
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while not progress.get("done"):
+            options = {"pageState": progress["page_state"]} if progress.get("page_state") else {}
+            response = collection.find(filter={}, options=options)
+            data = response.get("data", {})
+            documents = data.get("documents", [])
+
+            upgraded = sum(pool.map(upgrade, documents))
+            progress["scanned"] = progress.get("scanned", 0) + len(documents)
+            progress["upgraded"] = progress.get("upgraded", 0) + upgraded
+            progress["page_state"] = data.get("nextPageState")
+            progress["done"] = not progress["page_state"]
+
+            if on_page:
+                on_page()
+            if pause and not progress["done"]:
+                time.sleep(pause)
+    return progress
+
+
+def main(args):
+    from database import DatabaseService
+    db_service = DatabaseService()
+
+    checkpoint = {} if args.restart or not args.apply else load_checkpoint(args.checkpoint)
+    for collection_name in args.collection:
+        collection = db_service._get_collection_by_name(collection_name)
+        progress = checkpoint.setdefault(collection_name, {})
+        if progress.get("done"):
+            print(f"{collection_name}: already migrated ({progress.get('upgraded', 0)} documents)")
+            continue
+
+        started = time.time()
+
+        def on_page():
+            if args.apply:
+                save_checkpoint(args.checkpoint, checkpoint)
+            rate = progress["scanned"] / max(time.time() - started, 1e-6)
+            print(f"  {collection_name}: scanned {progress['scanned']}, "
+                  f"{'upgraded' if args.apply else 'legacy'} {progress['upgraded']} ({rate:.0f} docs/s)")
+
+        migrate_collection(collection, progress, args.apply, args.concurrency, args.pause, on_page)
+        verb = "Upgraded" if args.apply else "Would upgrade"
+        print(f"{collection_name}: {verb} {progress['upgraded']} of {progress['scanned']} documents")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate stored documents to schema version 2")
+    parser.add_argument("--collection", action="append", choices=COLLECTIONS,
+                        help="Collection to migrate (repeatable, default: all)")
+    parser.add_argument("--apply", action="store_true", help="Write changes (default is a dry run)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Parallel updates per page")
+    parser.add_argument("--pause", type=float, default=0.0, help="Seconds to wait between pages")
+    parser.add_argument("--checkpoint", default=os.path.join(config.DATA_DIR, "schema_migration.json"))
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and scan from the start")
+    args = parser.parse_args()
+    args.collection = args.collection or COLLECTIONS
+    main(args)
@@ -0,0 +1,74 @@
+# models.py
+import datetime
+from schema import SCHEMA_VERSION
+from time_index import entry_timestamp
+
+
+class Entry:
+    """
+    A stored thought, game answer or chat message, decoded once at the database boundary.
+
+    Attributes:
+        id: Document ID
+        text: The entry text
+        user_id: Telegram user ID of the owner
+        categories: List of categories (possibly empty)
+        timestamp: Creation time in epoch seconds, or None if unknown
+        source: Where the entry came from, e.g. "voice_note"
+        similarity: Search similarity, when the entry came from a vector search
+        duplicate_of: ID of the entry this one nearly repeats, if linked
+        extra: Any other metadata, e.g. the question of a game answer
+    """
+
+    __slots__ = ("id", "text", "user_id", "categories", "timestamp", "source",
+                 "similarity", "duplicate_of", "extra")
+
+    def __init__(self, id, text, user_id=None, categories=(), timestamp=None, source=None,
+                 similarity=None, duplicate_of=None, extra=None):
+        self.id = id
+        self.text = text
+        self.user_id = user_id
+        self.categories = categories
+        self.timestamp = timestamp
+        self.source = source
+        self.similarity = similarity
+        self.duplicate_of = duplicate_of
+        self.extra = extra
+
+    @classmethod
+    def from_document(cls, document):
+        """Decode a raw Data API document of any schema version."""
+        get = document.get
+        if get("v") == SCHEMA_VERSION:
+            # Fast path: flat short keys, no probing
+            return cls(
+                document["_id"], get("t", ""), get("u"), get("c") or (), get("ts"), get("s"),
+                get("$similarity"), get("d"), get("m")
+            )
+
+        metadata = get("metadata") or {}
+        return cls(
+            get("_id"),
+            get("text") or metadata.get("text", ""),
+            metadata.get("user_id"),
+            metadata.get("categories") or (),
+            entry_timestamp(document),
+            metadata.get("source"),
+            get("$similarity"),
+            metadata.get("duplicate_of"),
+            {key: value for key, value in metadata.items()
+             if key not in _LEGACY_KNOWN_KEYS} or None
+        )
+
+    @property
+    def created_date(self):
+        """Creation date as YYYY-MM-DD, or an empty string if unknown."""
+        if self.timestamp is None:
+            return ""
+        return datetime.date.fromtimestamp(self.timestamp).isoformat()
+
+    def __repr__(self):
+        return f"Entry(id={self.id!r}, text={self.text[:30]!r}, categories={list(self.categories)!r})"
+
+
+_LEGACY_KNOWN_KEYS = {"text", "user_id", "categories", "created_ts", "created_at", "source", "duplicate_of"}
@@ -0,0 +1,228 @@
+# profile_service.py
+import os
+import re
+import json
+import time
+import asyncio
+import contextvars
+import logging
+from collections import Counter
+import config
+from llm_scheduler import BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES = ["work", "health", "relationships", "purpose"]
+
+# Words too common to say anything about a person's recurring themes
+_STOPWORDS = set("""
+a about after again all also am an and any are as at be because been before being but by can
+could did do does doing don't for from get got had has have having he her here him his how i i'm
+if in into is it it's its just like me more most my myself no not now of on one only or other our
+out over really she so some still than that the their them then there these they thing things
+think this those through to too up very was we were what when where which while who why will with
+would you your
+""".split())
+_WORD_RE = re.compile(r"[a-z][a-z']{2,}")
+
+# Themes kept per user; the tail is pruned so the digest stays small
+MAX_THEMES = 50
+
+
+class ProfileService:
+    """
+    Maintains a compact per-user profile digest from thoughts and game answers.
+
+    New entries are queued with note_entry() and folded into the digest by a
+    background task. Recurring themes are counted locally; key values and the
+    per-category summaries are updated by asking Claude to merge the new
+    entries into the existing digest, so the work per update is proportional
+    to the new entries rather than the user's whole history.
+    """
+
+    def __init__(self, claude_service, profile_dir=None):
+        self.claude_service = claude_service
+        self.profile_dir = profile_dir or config.PROFILE_DIR
+        os.makedirs(self.profile_dir, exist_ok=True)
+        self._profiles = {}
+        self._pending = {}
+        self._wakeup = None
+        self._worker = None
+
+    def _path(self, user_id):
+        return os.path.join(self.profile_dir, f"{user_id}.json")
+
+    def get_profile(self, user_id):
+        """Return the user's digest dict, loading it from disk on first use."""
+        if user_id not in self._profiles:
+            try:
+                with open(self._path(user_id), encoding="utf-8") as f:
+                    self._profiles[user_id] = json.load(f)
+            except (OSError, ValueError):
+                self._profiles[user_id] = {
+                    "values": [],
+                    "themes": {},
+                    "categories": {},
+                    "entries_seen": 0,
+                    "updated_at": None
+                }
+        return self._profiles[user_id]
+
+    def _save(self, user_id):
+        path = self._path(user_id)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._profiles[user_id], f)
+        os.replace(tmp_path, path)
+
+    def note_entry(self, user_id, text, categories=None, source=None):
+        """
+        Queue a new thought or game answer for the user's digest.
+
+        Args:
+            user_id: The Telegram user ID
+            text: The entry text
+            categories: Categories assigned to the entry
+            source: Where the entry came from, e.g. "voice_note" or "game"
+        """
+        if not text or user_id is None:
+            return
+
+        self._pending.setdefault(user_id, []).append({
+            "text": text[:config.PROFILE_MAX_ENTRY_CHARS],
+            "categories": categories or [],
+            "source": source
+        })
+        self._ensure_worker()
+        if len(self._pending[user_id]) >= config.PROFILE_BATCH_SIZE:
+            self._wakeup.set()
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            # Started from inside a handler, so given a fresh context rather than a copy
+            # of that update's, which would file every later span under its trace
+            self._worker = asyncio.get_running_loop().create_task(self._run(), context=contextvars.Context())
+
+    async def _run(self):
+        """Fold pending entries into digests every interval, or sooner when a batch fills up."""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=config.PROFILE_UPDATE_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            for user_id in list(self._pending):
+                entries = self._pending.pop(user_id, [])
+                if entries:
+                    await self.update_profile(user_id, entries)
+
+    async def update_profile(self, user_id, entries):
+        """
+        Merge new entries into a user's digest.
+
+        Args:
+            user_id: The Telegram user ID
+            entries: List of dicts with text, categories and source
+        """
+        profile = self.get_profile(user_id)
+
+        # Themes are plain word counts, updated locally
+        themes = Counter(profile["themes"])
+        for entry in entries:
+            themes.update(word for word in _WORD_RE.findall(entry["text"].lower())
+                          if word not in _STOPWORDS)
+
+        try:
+            merged = await self._merge_with_claude(user_id, profile, entries)
+            profile["values"] = [str(value) for value in merged.get("values", profile["values"])][:8]
+            categories = merged.get("categories", {})
+            for category in CATEGORIES:
+                if categories.get(category):
+                    profile["categories"][category] = str(categories[category])
+        except Exception as e:
+            logger.error(f"Error updating profile digest for user {user_id}: {e}")
+            # Keep the newest entries so the next update can fold them in; older
+            # ones are dropped so a long outage can't grow the prompt without bound
+            kept = entries[-config.PROFILE_BATCH_SIZE:]
+            if len(kept) < len(entries):
+                logger.warning(f"Dropped {len(entries) - len(kept)} older entries from the profile digest "
+                               f"of user {user_id}")
+            retry = self._pending.setdefault(user_id, [])
+            retry[:0] = kept
+            return
+
+        profile["themes"] = dict(themes.most_common(MAX_THEMES))
+        profile["entries_seen"] += len(entries)
+        profile["updated_at"] = time.time()
+        try:
+            await asyncio.to_thread(self._save, user_id)
+        except OSError as e:
+            # The digest stays updated in memory and is written with the next update
+            logger.error(f"Error saving profile digest for user {user_id}: {e}")
+            return
+        logger.info(f"Updated profile digest for user {user_id} with {len(entries)} entries")
+
+    async def _merge_with_claude(self, user_id, profile, entries):
+        current = {
+            "values": profile["values"],
+            "categories": profile["categories"]
+        }
+        new_entries = "\n".join(
+            f"- [{', '.join(entry['categories']) or 'uncategorized'}] {entry['text']}"
+            for entry in entries
+        )
+
+        system_prompt = (
+            "You maintain a compact profile of a person built from their personal thoughts and answers. "
+            "Update the existing profile with the new entries. Keep what is still true, refine it with the "
+            "new information, and stay concise. Respond with JSON only, in the form: "
+            '{"values": ["up to 8 short phrases"], "categories": {"work": "...", "health": "...", '
+            '"relationships": "...", "purpose": "..."}}. Each category summary is at most two sentences; '
+            "leave a category empty if nothing is known about it."
+        )
+        user_prompt = (
+            f"Existing profile:\n{json.dumps(current)}\n\n"
+            f"New entries:\n{new_entries}"
+        )
+
+        response = await self.claude_service.create_message(
+            "claude.update_profile",
+            task="profile",
+            priority=BACKGROUND,
+            user_id=user_id,
+            system=system_prompt,
+            messages=[
+                {"role": "user", "content": user_prompt}
+            ]
+        )
+
+        text = response.content[0].text
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end == -1:
+            raise ValueError("No JSON object in profile update response")
+        return json.loads(text[start:end + 1])
+
+    def render_digest(self, user_id):
+        """
+        Render the user's digest as compact prompt text.
+
+        Returns:
+            str: The digest, or an empty string when nothing is known yet
+        """
+        profile = self.get_profile(user_id)
+        if not profile["entries_seen"]:
+            return ""
+
+        lines = []
+        if profile["values"]:
+            lines.append("Key values: " + "; ".join(profile["values"]))
+        themes = list(profile["themes"])[:10]
+        if themes:
+            lines.append("Recurring themes: " + ", ".join(themes))
+        for category in CATEGORIES:
+            summary = profile["categories"].get(category)
+            if summary:
+                lines.append(f"{category.capitalize()}: {summary}")
+        return "\n".join(lines)
@@ -0,0 +1,318 @@
+# reclassify.py
+"""
+Classify stored thoughts again, e.g. after ClassificationService.CATEGORIES or its prompts change.
+
+The collection is read one Data API page at a time and thoughts are
+classified in batches of --batch-size, either through the Message Batches
+API (--mode batch: half price and outside the interactive rate limits, but a
+batch can take a while to finish) or with bounded concurrent Messages
+requests (--mode concurrent) paced to --rpm, so the bot keeps most of the
+rate limit for its users. New categories are written back with one
+update_many per distinct category set, and each thought is stamped with the
+classifier version, so thoughts that are already current are skipped. The
+page state is checkpointed after every batch, and so is the ID of a
+submitted Message Batch, so an interrupted run resumes without paying twice.
+
+When categories changed, the run marks /stats counts stale, so a running
+bot recounts each user on their next /stats or within STATS_FLUSH_INTERVAL.
+
+Example:
+    python reclassify.py                  # dry run: count thoughts to reclassify
+    python reclassify.py --apply --mode batch
+    python reclassify.py --apply --mode concurrent --concurrency 4 --rpm 30
+"""
+import os
+import re
+import time
+import hashlib
+import logging
+import argparse
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+import schema
+from models import Entry
+from classification_service import ClassificationService
+from migrate_schema import load_checkpoint, save_checkpoint
+from stats_service import mark_stale
+
+logger = logging.getLogger(__name__)
+
+# Data API limit on the values of an $in filter
+_MAX_IN_VALUES = 100
+
+_CUSTOM_ID_RE = re.compile(r"^[a-zA-Z0-9_-]{1,64}$")
+
+
+class RatePacer:
+    """Spaces requests evenly under a requests-per-minute budget and backs off when rate limited."""
+
+    def __init__(self, rpm):
+        self.interval = 60.0 / rpm if rpm else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def backoff(self, seconds):
+        """Hold every request for at least this long."""
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + seconds)
+
+
+def _retry_after(error, attempt):
+    """Seconds to wait after a rate-limit or overload error, or None if the error isn't one."""
+    if getattr(error, "status_code", None) not in (429, 529):
+        return None
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return min(60.0, 2.0 ** attempt)
+
+
+def classify_concurrently(client, model, classifier, entries, concurrency, pacer, attempts=5):
+    """
+    Classify entries with parallel Messages requests.
+
+    Returns:
+        dict: entry ID -> categories, for the entries that were classified
+    """
+    def classify(entry):
+        for attempt in range(attempts):
+            pacer.wait()
+            try:
+                response = client.messages.create(model=model, **classifier.build_request(entry.text))
+                return entry.id, classifier.parse_categories(response.content[0].text)
+            except Exception as e:
+                delay = _retry_after(e, attempt)
+                if delay is None:
+                    logger.error(f"Error classifying entry {entry.id}: {e}")
+                    return entry.id, None
+                pacer.backoff(delay)
+        logger.error(f"Giving up on entry {entry.id} after {attempts} rate-limited attempts")
+        return entry.id, None
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return {entry_id: categories for entry_id, categories in pool.map(classify, entries)
+                if categories is not None}
+
+
+def _custom_id(entry_id):
+    return entry_id if _CUSTOM_ID_RE.match(entry_id) else hashlib.sha1(entry_id.encode("utf-8")).hexdigest()
+
+
+def classify_with_batches_api(client, model, classifier, entries, progress, on_submit=None, poll_interval=30):
+    """
+    Classify entries through the Message Batches API, waiting for the batch to end.
+
+    A batch already recorded in progress["batch_id"] is polled instead of
+    submitted again.
+
+    Returns:
+        dict: entry ID -> categories, for the entries that were classified
+    """
+    by_custom_id = {_custom_id(entry.id): entry for entry in entries}
+    batch_id = progress.get("batch_id")
+    if not batch_id:
+        batch = client.messages.batches.create(requests=[
+            {"custom_id": custom_id, "params": dict(model=model, **classifier.build_request(entry.text))}
+            for custom_id, entry in by_custom_id.items()
+        ])
+        batch_id = progress["batch_id"] = batch.id
+        if on_submit:
+            on_submit()
+
+    batch = client.messages.batches.retrieve(batch_id)
+    while batch.processing_status != "ended":
+        time.sleep(poll_interval)
+        batch = client.messages.batches.retrieve(batch_id)
+
+    results = {}
+    for item in client.messages.batches.results(batch_id):
+        entry = by_custom_id.get(item.custom_id)
+        if entry is None:
+            continue
+        if item.result.type == "succeeded":
+            results[entry.id] = classifier.parse_categories(item.result.message.content[0].text)
+        else:
+            logger.error(f"Batch request for entry {entry.id} ended as {item.result.type}")
+    return results
+
+
+def write_categories(collection, results, versions, classifier_version, concurrency=4):
+    """
+    Write new categories back with one update_many per schema version and category set.
+
+    Args:
+        collection: AstraDB collection
+        results: entry ID -> categories
+        versions: entry ID -> stored schema version
+        classifier_version: Stamped on every updated entry
+        concurrency: Parallel update requests
+    """
+    groups = defaultdict(list)
+    for entry_id, categories in results.items():
+        groups[(versions[entry_id] == schema.SCHEMA_VERSION, tuple(categories))].append(entry_id)
+
+    updates = []
+    for (is_current, categories), entry_ids in groups.items():
+        categories_path = schema.FIELDS["categories"][0 if is_current else 1]
+        version_path = "m.classifier" if is_current else "metadata.classifier"
+        for start in range(0, len(entry_ids), _MAX_IN_VALUES):
+            updates.append((
+                {"_id": {"$in": entry_ids[start:start + _MAX_IN_VALUES]}},
+                {"$set": {categories_path: list(categories), version_path: classifier_version}}
+            ))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda update: collection.update_many(*update), updates))
+    return len(updates)
+
+
+def reclassify_collection(collection, classify, progress, classifier_version, apply=False,
+                          batch_size=200, concurrency=4, on_batch=None):
+    """
+    Reclassify a collection's stale entries, resuming from progress["page_state"].
+
+    Args:
+        collection: AstraDB collection
+        classify: Callable taking a list of models.Entry and returning {entry ID: categories}
+        progress: Dict with page_state, scanned, stale, updated, changed, failed and done; updated in place
+        classifier_version: ClassificationService.version()
+        apply: Classify and write; otherwise only count stale entries
+        batch_size: Entries per classification batch
+        concurrency: Parallel update requests
+        on_batch: Optional callback run after each batch, e.g. to save a checkpoint
+    """
+    while not progress.get("done"):
+        batch, versions = [], {}
+        page_state = progress.get("page_state")
+        scanned = 0
+        # Fill the batch from as many pages as it takes
+        while len(batch) < batch_size:
+            options = {"pageState": page_state} if page_state else {}
+            response = collection.find(filter={}, projection=schema.read_projection(), options=options)
+            data = response.get("data", {})
+            for document in data.get("documents", []):
+                scanned += 1
+                entry = Entry.from_document(document)
+                if not entry.text or (entry.extra or {}).get("classifier") == classifier_version:
+                    continue
+                batch.append(entry)
+                versions[entry.id] = document.get("v")
+            page_state = data.get("nextPageState")
+            if not page_state:
+                break
+
+        if apply and batch:
+            results = classify(batch)
+            write_categories(collection, results, versions, classifier_version, concurrency)
+            progress["updated"] = progress.get("updated", 0) + len(results)
+            progress["changed"] = progress.get("changed", 0) + sum(
+                1 for entry in batch if entry.id in results and list(entry.categories) != results[entry.id])
+            progress["failed"] = progress.get("failed", 0) + len(batch) - len(results)
+
+        progress["scanned"] = progress.get("scanned", 0) + scanned
+        progress["stale"] = progress.get("stale", 0) + len(batch)
+        progress["page_state"] = page_state
+        progress["done"] = not page_state
+        progress.pop("batch_id", None)
+        if on_batch:
+            on_batch()
+    return progress
+
+
+def main(args):
+    from database import DatabaseService
+    from claude_service import ClaudeService
+    import anthropic
+    db_service = DatabaseService()
+    # The job calls the SDK from worker threads, so it needs the synchronous client
+    claude_service = ClaudeService(client=anthropic.Anthropic(api_key=config.ANTHROPIC_API_KEY))
+    classifier = ClassificationService(claude_service)
+    classifier_version = ClassificationService.version()
+    collection_name = config.DB_COLLECTION_THOUGHTS
+    model = config.LLM_ROUTES["classify"][0]
+    collection = db_service._get_collection_by_name(collection_name)
+
+    checkpoint = {} if args.restart or not args.apply else load_checkpoint(args.checkpoint)
+    progress = checkpoint.setdefault(collection_name, {})
+    if progress.get("classifier") != classifier_version:
+        # The prompt or categories changed again since the checkpoint was written
+        progress.clear()
+        progress["classifier"] = classifier_version
+    if progress.get("done"):
+        print(f"{collection_name}: already reclassified with classifier {classifier_version}")
+        return
+
+    def save():
+        if args.apply:
+            save_checkpoint(args.checkpoint, checkpoint)
+
+    if args.mode == "batch":
+        def classify(entries):
+            return classify_with_batches_api(claude_service.client, model, classifier,
+                                             entries, progress, on_submit=save, poll_interval=args.poll)
+    else:
+        pacer = RatePacer(args.rpm)
+
+        def classify(entries):
+            return classify_concurrently(claude_service.client, model, classifier,
+                                         entries, args.concurrency, pacer)
+
+    count = collection.count_documents(filter={}).get("status", {})
+    total = count.get("count", 0)
+    total_text = f"over {total}" if count.get("moreData") else str(total)
+    print(f"{collection_name}: {total_text} documents, classifier {classifier_version}")
+
+    started = time.time()
+    scanned_before = progress.get("scanned", 0)
+
+    def on_batch():
+        save()
+        scanned = progress["scanned"]
+        rate = (scanned - scanned_before) / max(time.time() - started, 1e-6)
+        eta = "unknown"
+        if not count.get("moreData") and rate > 0:
+            eta = f"{max(total - scanned, 0) / rate / 60:.1f} min"
+        verb = f"updated {progress.get('updated', 0)} ({progress.get('changed', 0)} changed, " \
+               f"{progress.get('failed', 0)} failed)" if args.apply else f"stale {progress['stale']}"
+        print(f"  scanned {scanned}/{total_text}, {verb}, {rate:.1f} docs/s, ETA {eta}")
+
+    changed_before = progress.get("changed", 0)
+    try:
+        reclassify_collection(collection, classify, progress, classifier_version, args.apply,
+                              args.batch_size, args.concurrency, on_batch)
+    finally:
+        # Also after an interrupted run, for the batches it did write
+        if progress.get("changed", 0) > changed_before:
+            mark_stale()
+    if args.apply:
+        print(f"{collection_name}: reclassified {progress.get('updated', 0)} of {progress['scanned']} thoughts, "
+              f"{progress.get('changed', 0)} with new categories")
+    else:
+        print(f"{collection_name}: would reclassify {progress['stale']} of {progress['scanned']} thoughts")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reclassify stored thoughts with the current classifier")
+    parser.add_argument("--apply", action="store_true", help="Classify and write (default is a dry run)")
+    parser.add_argument("--mode", choices=["batch", "concurrent"], default="batch",
+                        help="Message Batches API, or paced concurrent requests")
+    parser.add_argument("--batch-size", type=int, default=200, help="Thoughts classified per batch")
+    parser.add_argument("--concurrency", type=int, default=4, help="Parallel requests in concurrent mode")
+    parser.add_argument("--rpm", type=float, default=30, help="Request budget per minute in concurrent mode")
+    parser.add_argument("--poll", type=float, default=30, help="Seconds between Message Batch status checks")
+    parser.add_argument("--checkpoint", default=os.path.join(config.DATA_DIR, "reclassify.json"))
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and scan from the start")
+    args = parser.parse_args()
+    main(args)
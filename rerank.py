@@ -0,0 +1,108 @@
+# rerank.py
+import time
+import logging
+import numpy as np
+from metrics_service import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+MMR_BUDGET_EXCEEDED = REGISTRY.counter(
+    "ragbot_mmr_budget_exceeded_total",
+    "MMR selections cut short by the latency budget and filled by relevance"
+)
+
+
+def mmr_select(query_vector, candidate_vectors, k, lambda_=0.7, budget=None, relevance=None):
+    """
+    Pick k diverse, relevant candidates with Maximal Marginal Relevance.
+
+    Each step takes the candidate maximizing
+    lambda_ * sim(query, c) - (1 - lambda_) * max sim(c, already selected).
+    Similarities come from one matrix product up front, and each step is a
+    vectorized update of the running max, so the cost is O(k * n) numpy work.
+
+    Args:
+        query_vector: Unit-normalized query embedding, shape (d,)
+        candidate_vectors: Unit-normalized candidate embeddings, shape (n, d)
+        k: Number of candidates to select
+        lambda_: Weight of relevance versus diversity, between 0 and 1
+        budget: Optional time limit in seconds; once it is spent the remaining
+            slots are filled by relevance alone
+        relevance: Optional relevance score per candidate, shape (n,), used
+            instead of the similarity to query_vector
+
+    Returns:
+        list: Indices into candidate_vectors, in selection order
+    """
+    n = len(candidate_vectors)
+    k = min(k, n)
+    if k <= 0:
+        return []
+
+    deadline = time.perf_counter() + budget if budget is not None else None
+    if relevance is None:
+        relevance = candidate_vectors @ query_vector
+    pairwise = candidate_vectors @ candidate_vectors.T
+
+    selected = []
+    available = np.ones(n, dtype=bool)
+    max_similarity = np.full(n, -np.inf, dtype=np.float32)
+    while len(selected) < k:
+        if deadline is not None and selected and time.perf_counter() > deadline:
+            MMR_BUDGET_EXCEEDED.inc()
+            rest = np.flatnonzero(available)
+            rest = rest[np.argsort(-relevance[rest], kind="stable")]
+            selected.extend(int(i) for i in rest[:k - len(selected)])
+            break
+
+        # Nothing is selected yet on the first step, so it is pure relevance
+        redundancy = np.where(np.isfinite(max_similarity), max_similarity, 0.0)
+        scores = lambda_ * relevance - (1.0 - lambda_) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, pairwise[best], out=max_similarity)
+    return selected
+
+
+def diversify(entries, k, vectors=None, embedder=None, lambda_=0.7, budget=None):
+    """
+    Rerank retrieved entries into a diverse top-k.
+
+    Relevance is the similarity the search already gave each entry, so MMR
+    keeps the retriever's judgement and only trades it against redundancy.
+    Entries found by the lexical index alone have no similarity and count as
+    relevant as the weakest vector hit. Redundancy is measured on the stored
+    embeddings when every entry has one, and on embedder vectors otherwise.
+
+    Args:
+        entries: Candidate models.Entry objects from one or more searches
+        k: Number of entries to keep
+        vectors: Optional dict of entry ID -> stored unit embedding
+        embedder: Object with embed(text) returning a unit vector, for entries
+            without a stored embedding
+        lambda_: Weight of relevance versus diversity
+        budget: Optional time limit in seconds for the selection
+
+    Returns:
+        list: The selected entries, most useful first
+    """
+    if len(entries) <= 1:
+        return list(entries[:k])
+
+    known = [entry.similarity for entry in entries if entry.similarity is not None]
+    floor = min(known) if known else 1.0
+    relevance = np.array([floor if entry.similarity is None else entry.similarity for entry in entries],
+                         dtype=np.float32)
+
+    if vectors and all(entry.id in vectors for entry in entries):
+        candidate_vectors = np.stack([vectors[entry.id] for entry in entries])
+    elif embedder is not None:
+        candidate_vectors = np.stack([embedder.embed(entry.text) for entry in entries])
+    else:
+        return list(entries[:k])
+    selected = mmr_select(None, candidate_vectors, k, lambda_, budget, relevance=relevance)
+    logger.debug("MMR kept %s of %s candidates", len(selected), len(entries))
+    return [entries[i] for i in selected]
@@ -0,0 +1,262 @@
+# resilience.py
+"""
+Timeouts, retries, hedging and circuit breakers for calls to external APIs.
+
+Each upstream ("anthropic", "openai", "astra") has a circuit breaker and a
+retry budget; each endpoint (one kind of call, named like its metrics stage)
+keeps a window of recent latencies that sets its timeout and hedge delay.
+Callers keep their own fallbacks: a call to an upstream whose breaker is
+open raises CircuitOpenError at once, which they handle like any other error.
+"""
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+import config
+from metrics_service import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_CALLS = REGISTRY.counter(
+    "ragbot_upstream_calls_total",
+    "External API call attempts by endpoint and outcome (ok, error, timeout, retry, hedge, rejected)",
+    ["endpoint", "outcome"]
+)
+CIRCUIT_OPEN = REGISTRY.gauge(
+    "ragbot_circuit_open", "1 while an upstream's circuit breaker is open", ["upstream"]
+)
+
+# Latency samples kept per endpoint, and needed before percentiles are trusted
+_WINDOW = 200
+_MIN_SAMPLES = 20
+
+# Retries that can be saved up while calls succeed
+_RETRY_BUDGET_CAP = 10.0
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+
+def is_retryable(error):
+    """Whether an error looks like a transient upstream failure rather than a bad request."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in (408, 429) or status >= 500
+    # SDK network errors (e.g. anthropic.APIConnectionError, httpx.ReadTimeout) carry no status
+    name = type(error).__name__
+    return "Connection" in name or "Timeout" in name or "Transport" in name
+
+
+class Upstream:
+    """
+    Circuit breaker and retry budget shared by every endpoint of one external API.
+
+    The breaker opens after failure_threshold consecutive transient failures
+    and rejects calls for reset_after seconds, then lets a single probe call
+    through; its success closes the breaker and its failure opens it again.
+    Every call earns retry_ratio of a retry, so retries and hedges stay a
+    bounded share of traffic when the upstream is struggling.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_after=30.0, retry_ratio=0.2):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.retry_ratio = retry_ratio
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._retry_tokens = _RETRY_BUDGET_CAP
+        CIRCUIT_OPEN.set_function(name, func=lambda: int(self.is_open()))
+
+    def is_open(self):
+        return self._opened_at is not None
+
+    def allow(self):
+        """Whether a call may go out now; the first call after the reset delay becomes the probe."""
+        if self._opened_at is None:
+            return True
+        if self._probing or time.monotonic() - self._opened_at < self.reset_after:
+            return False
+        self._probing = True
+        return True
+
+    def record_success(self):
+        self._failures = 0
+        if self._opened_at is not None:
+            logger.info(f"Circuit for {self.name} closed")
+        self._opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self._failures += 1
+        if self._probing or (self._opened_at is None and self._failures >= self.failure_threshold):
+            if self._opened_at is None:
+                logger.warning(f"Circuit for {self.name} opened after {self._failures} failures")
+            self._opened_at = time.monotonic()
+        self._probing = False
+
+    def release_probe(self):
+        """Let another probe through if this one ended without a verdict, e.g. cancelled."""
+        self._probing = False
+
+    def earn_retry(self):
+        self._retry_tokens = min(_RETRY_BUDGET_CAP, self._retry_tokens + self.retry_ratio)
+
+    def spend_retry(self):
+        if self._retry_tokens < 1:
+            return False
+        self._retry_tokens -= 1
+        return True
+
+
+class Endpoint:
+    """Recent latencies of one kind of call, which set its timeout and hedge delay."""
+
+    def __init__(self, name):
+        self.name = name
+        self._latencies = deque(maxlen=_WINDOW)
+
+    def observe(self, seconds):
+        self._latencies.append(seconds)
+
+    def percentile(self, q):
+        if len(self._latencies) < _MIN_SAMPLES:
+            return None
+        latencies = sorted(self._latencies)
+        return latencies[int(q * (len(latencies) - 1))]
+
+    def timeout(self):
+        """A multiple of the observed p99, within the configured bounds."""
+        p99 = self.percentile(0.99)
+        if p99 is None:
+            return config.TIMEOUT_MAX_SECONDS
+        return min(config.TIMEOUT_MAX_SECONDS, max(config.TIMEOUT_MIN_SECONDS, p99 * config.TIMEOUT_P99_MULTIPLIER))
+
+    def hedge_delay(self):
+        return self.percentile(0.95)
+
+
+_upstreams = {}
+_endpoints = {}
+
+
+def get_upstream(name):
+    if name not in _upstreams:
+        _upstreams[name] = Upstream(name, config.BREAKER_FAILURE_THRESHOLD, config.BREAKER_RESET_SECONDS,
+                                    config.RETRY_BUDGET_RATIO)
+    return _upstreams[name]
+
+
+def get_endpoint(name):
+    if name not in _endpoints:
+        _endpoints[name] = Endpoint(name)
+    return _endpoints[name]
+
+
+async def call(endpoint_name, upstream_name, make_call, retry=False, hedge=False, timeout=True):
+    """
+    Make an external call with an adaptive timeout, retries, hedging and a circuit breaker.
+
+    Args:
+        endpoint_name: Name of this kind of call, e.g. "db.get_entry"
+        upstream_name: External API it goes to, e.g. "astra"
+        make_call: Callable returning a new awaitable for each attempt
+        retry: Retry transient failures with jittered backoff; only for idempotent calls
+        hedge: Send a duplicate request if the first is slower than the endpoint's p95;
+            only for idempotent reads
+        timeout: Apply the endpoint's adaptive timeout; False for long scans
+
+    Returns:
+        The call's result
+
+    Raises:
+        CircuitOpenError: If the upstream's breaker is open
+        Exception: The last error, once retries are exhausted
+    """
+    if not config.RESILIENCE_ENABLED:
+        return await make_call()
+
+    upstream = get_upstream(upstream_name)
+    endpoint = get_endpoint(endpoint_name)
+    upstream.earn_retry()
+    attempts = config.RETRY_MAX_ATTEMPTS if retry else 1
+    for attempt in range(attempts):
+        if not upstream.allow():
+            UPSTREAM_CALLS.inc(endpoint_name, "rejected")
+            raise CircuitOpenError(f"Circuit for {upstream_name} is open")
+        try:
+            result = await _attempt(endpoint, upstream, make_call, hedge and config.HEDGE_ENABLED, timeout)
+        except asyncio.CancelledError:
+            upstream.release_probe()
+            raise
+        except Exception as e:
+            if not is_retryable(e):
+                # The upstream answered; the request itself was bad
+                upstream.record_success()
+                UPSTREAM_CALLS.inc(endpoint_name, "error")
+                raise
+            upstream.record_failure()
+            UPSTREAM_CALLS.inc(endpoint_name, "timeout" if isinstance(e, asyncio.TimeoutError) else "error")
+            if attempt + 1 >= attempts or not upstream.spend_retry():
+                raise
+            UPSTREAM_CALLS.inc(endpoint_name, "retry")
+            # Full jitter, so retries from many callers don't arrive together
+            await asyncio.sleep(random.uniform(0, config.RETRY_BASE_DELAY * 2 ** attempt))
+            continue
+        upstream.record_success()
+        UPSTREAM_CALLS.inc(endpoint_name, "ok")
+        return result
+
+
+async def _attempt(endpoint, upstream, make_call, hedge, use_timeout):
+    limit = endpoint.timeout() if use_timeout else None
+    start = time.monotonic()
+    hedge_delay = endpoint.hedge_delay() if hedge else None
+    try:
+        if hedge_delay is None or (limit is not None and hedge_delay >= limit):
+            result = await asyncio.wait_for(make_call(), limit)
+        else:
+            result = await _hedged(endpoint, upstream, make_call, hedge_delay, limit)
+    except asyncio.TimeoutError:
+        # Timed-out calls count at the limit, so the timeout grows if the upstream slows down
+        endpoint.observe(limit)
+        raise
+    endpoint.observe(time.monotonic() - start)
+    return result
+
+
+async def _hedged(endpoint, upstream, make_call, hedge_delay, limit):
+    """Run make_call, and a second copy if the first hasn't finished after hedge_delay; first success wins."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + limit if limit is not None else None
+    tasks = [asyncio.ensure_future(make_call())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+        if not done and upstream.spend_retry():
+            UPSTREAM_CALLS.inc(endpoint.name, "hedge")
+            tasks.append(asyncio.ensure_future(make_call()))
+
+        error = None
+        while tasks:
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                raise asyncio.TimeoutError()
+            done, _ = await asyncio.wait(tasks, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                raise asyncio.TimeoutError()
+            for task in done:
+                tasks.remove(task)
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
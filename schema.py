@@ -0,0 +1,127 @@
+# schema.py
+"""
+Stored document layout.
+
+Version 2 documents keep every field once, under short keys:
+
+    {"_id": ..., "v": 2, "t": text, "u": user_id, "ts": created epoch seconds,
+     "c": [categories], "s": source, "d": duplicate_of, "m": {other metadata}}
+
+Version 1 documents (no "v") stored {"_id", "text", "metadata"} with the text
+repeated in metadata.text and created_at as a string. models.Entry decodes
+either version, so callers never look at raw documents.
+"""
+import config
+
+SCHEMA_VERSION = 2
+
+# Logical field -> (version 2 path, version 1 path)
+FIELDS = {
+    "text": ("t", "text"),
+    "user_id": ("u", "metadata.user_id"),
+    "created_ts": ("ts", "metadata.created_ts"),
+    "categories": ("c", "metadata.categories"),
+    "source": ("s", "metadata.source"),
+    "duplicate_of": ("d", "metadata.duplicate_of"),
+}
+
+# Metadata keys with a dedicated short key; anything else goes under "m"
+_SHORT_KEYS = {"user_id": "u", "created_ts": "ts", "categories": "c", "source": "s", "duplicate_of": "d"}
+
+
+def read_fields():
+    """Fields to request on reads, so vectors and unused fields are never transferred."""
+    fields = ["v", "t", "u", "ts", "c", "s", "d", "m"]
+    if config.SCHEMA_LEGACY_READS:
+        fields += ["text", "metadata"]
+    return fields
+
+
+def read_projection():
+    return {field: 1 for field in read_fields()}
+
+
+def encode(entry_id, text, metadata, categories=None):
+    """
+    Build a version 2 document.
+
+    Args:
+        entry_id: The document ID
+        text: The entry text
+        metadata: Metadata dict; user_id, created_ts, source and duplicate_of get
+            short keys, anything else is kept under "m"
+        categories: Optional list of categories
+    """
+    document = {"_id": entry_id, "v": SCHEMA_VERSION, "t": text}
+    extra = {}
+    for key, value in (metadata or {}).items():
+        if key in ("text", "created_at"):
+            # Text has its own field; created_at is derived from ts on read
+            continue
+        if key in _SHORT_KEYS:
+            document[_SHORT_KEYS[key]] = value
+        else:
+            extra[key] = value
+    if categories:
+        document["c"] = categories
+    if extra:
+        document["m"] = extra
+    return document
+
+
+def upgrade(document):
+    """
+    Build the update that rewrites a version 1 document in place as version 2.
+
+    The update sets the new fields and unsets the old ones, so the document's
+    vector is left untouched.
+
+    Returns:
+        dict: Data API update document, or None if it is already version 2
+    """
+    if document.get("v") == SCHEMA_VERSION:
+        return None
+
+    from models import Entry
+    entry = Entry.from_document(document)
+    metadata = dict(entry.extra or {})
+    for key in ("user_id", "created_ts", "source", "duplicate_of"):
+        value = entry.timestamp if key == "created_ts" else getattr(entry, key)
+        if value is not None:
+            metadata[key] = value
+    new_document = encode(entry.id, entry.text, metadata, list(entry.categories))
+    del new_document["_id"]
+    return {"$set": new_document, "$unset": {"text": "", "metadata": ""}}
+
+
+def _condition(field, condition):
+    if field not in FIELDS:
+        return {field: condition}
+    new_path, old_path = FIELDS[field]
+    if not config.SCHEMA_LEGACY_READS:
+        return {new_path: condition}
+    # Until the migration has run, match either layout
+    return {"$or": [{new_path: condition}, {old_path: condition}]}
+
+
+def build_filter(**conditions):
+    """
+    Build a Data API filter from logical field names.
+
+    Example:
+        build_filter(user_id=42, created_ts={"$gte": since})
+
+    Returns:
+        dict: The filter ({} when there are no conditions)
+    """
+    clauses = [_condition(field, condition) for field, condition in conditions.items()]
+    if not clauses:
+        return {}
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+
+def sort_path(field):
+    """Document path to sort on for a logical field."""
+    return FIELDS[field][0]
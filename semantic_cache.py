@@ -0,0 +1,129 @@
+# semantic_cache.py
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+from metrics_service import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CACHE_REQUESTS = REGISTRY.counter(
+    "ragbot_answer_cache_requests_total",
+    "Chat answer cache lookups by result (hit, miss or stale)",
+    ["result"]
+)
+CACHE_EVICTIONS = REGISTRY.counter(
+    "ragbot_answer_cache_evictions_total", "Chat answers evicted from the cache"
+)
+
+
+class _UserCache:
+    """One user's cached answers, oldest first."""
+
+    __slots__ = ("entries", "matrix")
+
+    def __init__(self):
+        # (query, scope) -> (vector, response, corpus_version)
+        self.entries = OrderedDict()
+        # Stacked query vectors, rebuilt lazily after changes
+        self.matrix = None
+
+
+class SemanticCache:
+    """
+    Per-user LRU cache of chat answers keyed on query similarity.
+
+    A lookup is a hit when a cached query's embedding has cosine similarity
+    of at least `threshold` with the new query, both were asked in the same
+    scope (e.g. the time range a "yesterday" question covers), and the cached
+    answer was produced at the user's current corpus version.
+
+    Args:
+        threshold: Minimum cosine similarity for a hit
+        max_entries_per_user: Answers kept per user before evicting the oldest
+        max_users: Users kept before evicting the least recently active one
+    """
+
+    def __init__(self, threshold=0.92, max_entries_per_user=32, max_users=1000):
+        self.threshold = threshold
+        self.max_entries_per_user = max_entries_per_user
+        self.max_users = max_users
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.lookups = 0
+
+    def lookup(self, user_id, query_vector, corpus_version, scope=None):
+        """
+        Find a cached answer for a similar query.
+
+        Args:
+            user_id: The Telegram user ID
+            query_vector: Unit-normalized embedding of the query
+            corpus_version: The user's current corpus version
+            scope: Hashable context the answer depends on besides the query;
+                only answers stored with an equal scope can match
+
+        Returns:
+            str: The cached answer, or None on a miss
+        """
+        with self._lock:
+            self.lookups += 1
+            user_cache = self._users.get(user_id)
+            if user_cache is None or not user_cache.entries:
+                CACHE_REQUESTS.inc("miss")
+                return None
+
+            self._users.move_to_end(user_id)
+            if user_cache.matrix is None:
+                user_cache.matrix = np.stack([vector for vector, _, _ in user_cache.entries.values()])
+
+            keys = list(user_cache.entries.keys())
+            similarities = user_cache.matrix @ query_vector
+            similarities[[key[1] != scope for key in keys]] = -1.0
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                CACHE_REQUESTS.inc("miss")
+                return None
+
+            key = keys[best]
+            _, response, version = user_cache.entries[key]
+            if version != corpus_version:
+                # The user's thoughts changed since this answer, so drop it
+                del user_cache.entries[key]
+                user_cache.matrix = None
+                CACHE_REQUESTS.inc("stale")
+                return None
+
+            user_cache.entries.move_to_end(key)
+            user_cache.matrix = None
+            self.hits += 1
+            CACHE_REQUESTS.inc("hit")
+            logger.debug("Answer cache hit for user %s (similarity %.3f)", user_id, similarities[best])
+            return response
+
+    def store(self, user_id, query, query_vector, response, corpus_version, scope=None):
+        """Cache an answer for a query at the given corpus version and scope."""
+        with self._lock:
+            user_cache = self._users.get(user_id)
+            if user_cache is None:
+                user_cache = self._users[user_id] = _UserCache()
+                if len(self._users) > self.max_users:
+                    _, evicted = self._users.popitem(last=False)
+                    CACHE_EVICTIONS.inc(amount=len(evicted.entries))
+            self._users.move_to_end(user_id)
+
+            user_cache.entries[(query, scope)] = (query_vector, response, corpus_version)
+            user_cache.entries.move_to_end((query, scope))
+            while len(user_cache.entries) > self.max_entries_per_user:
+                user_cache.entries.popitem(last=False)
+                CACHE_EVICTIONS.inc()
+            user_cache.matrix = None
+
+    def invalidate(self, user_id):
+        """Forget every cached answer for a user."""
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def hit_rate(self):
+        return self.hits / self.lookups if self.lookups else 0.0
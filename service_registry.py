@@ -0,0 +1,73 @@
+# service_registry.py
+import logging
+import threading
+import config
+
+logger = logging.getLogger(__name__)
+
+# One instance of each service for the whole process
+_services = {}
+_lock = threading.RLock()
+
+
+def register(name, service):
+    """Install a service instance, e.g. a stand-in for benchmarks."""
+    with _lock:
+        _services[name] = service
+    return service
+
+
+def _get(name, factory):
+    with _lock:
+        if name not in _services:
+            _services[name] = factory()
+        return _services[name]
+
+
+def get_database_service():
+    """Return the shared DatabaseService, connecting on first use."""
+    def factory():
+        from database import DatabaseService
+        return DatabaseService()
+    return _get("database", factory)
+
+
+def get_embedding_service():
+    """Return the shared EmbeddingService, or None when embeddings are left to the server."""
+    def factory():
+        from embedding_service import create_embedding_service
+        return create_embedding_service()
+    return _get("embedding", factory)
+
+
+def get_whisper_service():
+    """Return the shared WhisperService."""
+    def factory():
+        from whisper_service import WhisperService
+        return WhisperService()
+    return _get("whisper", factory)
+
+
+def get_claude_service():
+    """Return the shared ClaudeService."""
+    def factory():
+        from claude_service import ClaudeService
+        return ClaudeService()
+    return _get("claude", factory)
+
+
+def get_game_service():
+    """Return the shared GameService."""
+    def factory():
+        from game_service import GameService
+        profile_service = get_profile_service() if config.PROFILE_ENABLED else None
+        return GameService(get_database_service(), get_claude_service(), profile_service)
+    return _get("game", factory)
+
+
+def get_profile_service():
+    """Return the shared ProfileService."""
+    def factory():
+        from profile_service import ProfileService
+        return ProfileService(get_claude_service())
+    return _get("profile", factory)
@@ -0,0 +1,307 @@
+# snapshot.py
+"""
+Export collections to columnar snapshots and import them back.
+
+A snapshot is a directory holding, for each collection:
+
+    <collection>.arrow   documents as an Arrow IPC file: id, text, user_id,
+                         created_ts, categories, source, duplicate_of, extra
+                         (other metadata as JSON) and has_vector
+    <collection>.npy     float32 vectors; row i belongs to document i
+
+plus a manifest.json with row counts and the export time. Documents of
+either schema version are exported in the same logical columns and imported
+in the version 2 layout. Both files can be memory-mapped without decoding,
+so with SNAPSHOT_WARM_START the bot fills its local indexes from the latest
+snapshot and only reads entries created since from the database.
+
+Example:
+    python snapshot.py export
+    python snapshot.py import data/snapshots/20261019T120000Z --concurrency 8
+"""
+import os
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
+import config
+import schema
+from models import Entry
+
+logger = logging.getLogger(__name__)
+
+COLLECTIONS = [config.DB_COLLECTION_THOUGHTS, config.DB_COLLECTION_GAME, config.DB_COLLECTION_CHAT]
+
+# Documents per insert_many request; the Data API accepts at most 20
+INSERT_BATCH_SIZE = 20
+
+
+def _arrow_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ("id", pa.string()),
+        ("text", pa.string()),
+        ("user_id", pa.int64()),
+        ("created_ts", pa.float64()),
+        ("categories", pa.list_(pa.string())),
+        ("source", pa.string()),
+        ("duplicate_of", pa.string()),
+        ("extra", pa.string()),
+        ("has_vector", pa.bool_()),
+    ])
+
+
+def latest_snapshot(root=None):
+    """Return the newest complete snapshot directory under root, or None."""
+    root = root or config.SNAPSHOT_DIR
+    try:
+        names = sorted(os.listdir(root), reverse=True)
+    except OSError:
+        return None
+    for name in names:
+        path = os.path.join(root, name)
+        if os.path.exists(os.path.join(path, "manifest.json")):
+            return path
+    return None
+
+
+def load_manifest(snapshot_dir):
+    with open(os.path.join(snapshot_dir, "manifest.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def read_documents(path):
+    """Open an exported .arrow file as a memory-mapped pyarrow Table."""
+    import pyarrow as pa
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def export_collection(collection, path_prefix, dimension, batch_rows=1000, on_batch=None):
+    """
+    Stream a collection to <path_prefix>.arrow and <path_prefix>.npy.
+
+    Args:
+        collection: AstraDB collection
+        path_prefix: Output path without extension
+        dimension: Vector dimension; documents without a vector get a zero row
+        batch_rows: Documents per Arrow record batch
+        on_batch: Optional callback taking the number of rows written so far
+
+    Returns:
+        int: Number of documents exported
+    """
+    import pyarrow as pa
+    arrow_schema = _arrow_schema()
+    projection = schema.read_projection()
+    projection["$vector"] = 1
+    raw_path = path_prefix + ".f32.tmp"
+    zeros = np.zeros(dimension, dtype=np.float32)
+
+    rows = 0
+    columns = {name: [] for name in arrow_schema.names}
+
+    def write_batch(writer):
+        writer.write_batch(pa.record_batch([columns[name] for name in arrow_schema.names], schema=arrow_schema))
+        for values in columns.values():
+            values.clear()
+        if on_batch:
+            on_batch(rows)
+
+    with pa.OSFile(path_prefix + ".arrow", "wb") as sink, \
+            pa.ipc.new_file(sink, arrow_schema) as writer, \
+            open(raw_path, "wb") as raw:
+        for document in collection.paginated_find(filter={}, projection=projection):
+            entry = Entry.from_document(document)
+            vector = document.get("$vector")
+            has_vector = bool(vector) and len(vector) == dimension
+            columns["id"].append(entry.id)
+            columns["text"].append(entry.text)
+            columns["user_id"].append(entry.user_id)
+            columns["created_ts"].append(entry.timestamp)
+            columns["categories"].append(list(entry.categories))
+            columns["source"].append(entry.source)
+            columns["duplicate_of"].append(entry.duplicate_of)
+            columns["extra"].append(json.dumps(entry.extra) if entry.extra else None)
+            columns["has_vector"].append(has_vector)
+            raw.write(np.asarray(vector, dtype=np.float32).tobytes() if has_vector else zeros.tobytes())
+            rows += 1
+            if len(columns["id"]) >= batch_rows:
+                write_batch(writer)
+        if columns["id"]:
+            write_batch(writer)
+
+    # The .npy header holds the row count, so the vectors are copied in once it is known
+    vectors = np.lib.format.open_memmap(path_prefix + ".npy", mode="w+", dtype=np.float32,
+                                        shape=(rows, dimension))
+    if rows:
+        source = np.memmap(raw_path, dtype=np.float32, mode="r", shape=(rows, dimension))
+        for start in range(0, rows, 10000):
+            vectors[start:start + 10000] = source[start:start + 10000]
+        del source
+    vectors.flush()
+    del vectors
+    os.remove(raw_path)
+    return rows
+
+
+def _documents(table, vectors, start, stop):
+    """Rebuild version 2 documents for rows [start, stop) of an exported table."""
+    documents = []
+    for offset, row in enumerate(table.slice(start, stop - start).to_pylist()):
+        metadata = json.loads(row["extra"]) if row["extra"] else {}
+        for key in ("user_id", "created_ts", "source", "duplicate_of"):
+            if row[key] is not None:
+                metadata[key] = row[key]
+        document = schema.encode(row["id"], row["text"], metadata, row["categories"])
+        if row["has_vector"]:
+            document["$vector"] = vectors[start + offset].tolist()
+        documents.append(document)
+    return documents
+
+
+def import_collection(collection, path_prefix, concurrency=4, on_batch=None):
+    """
+    Insert an exported collection's documents with bounded concurrency.
+
+    Documents whose ID already exists are left as they are, so an interrupted
+    import can simply be run again.
+
+    Args:
+        collection: AstraDB collection
+        path_prefix: Snapshot path without extension
+        concurrency: insert_many requests in flight at once
+        on_batch: Optional callback taking (rows done, rows inserted)
+
+    Returns:
+        tuple: (rows in the snapshot, documents inserted)
+    """
+    table = read_documents(path_prefix + ".arrow")
+    vectors = np.load(path_prefix + ".npy", mmap_mode="r")
+    total = table.num_rows
+    done = inserted = 0
+
+    def insert(start):
+        stop = min(start + INSERT_BATCH_SIZE, total)
+        response = collection.insert_many(_documents(table, vectors, start, stop),
+                                          options={"ordered": False}, partial_failures_allowed=True)
+        return stop - start, len((response or {}).get("status", {}).get("insertedIds", []))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = set()
+        starts = iter(range(0, total, INSERT_BATCH_SIZE))
+        while True:
+            # Only a few batches are built ahead, so memory stays flat
+            for start in starts:
+                pending.add(pool.submit(insert, start))
+                if len(pending) >= concurrency * 2:
+                    break
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                rows, count = future.result()
+                done += rows
+                inserted += count
+            if on_batch:
+                on_batch(done, inserted)
+    return total, inserted
+
+
+class SnapshotReader:
+    """
+    One collection of a snapshot, memory-mapped, with rows grouped by user.
+
+    Args:
+        snapshot_dir: Snapshot directory
+        collection_name: Collection to open
+    """
+
+    def __init__(self, snapshot_dir, collection_name):
+        import pyarrow.compute as pc
+        manifest = load_manifest(snapshot_dir)
+        info = manifest["collections"][collection_name]
+        self.exported_at = manifest["exported_at"]
+        self.dimension = info["dimension"]
+        path_prefix = os.path.join(snapshot_dir, collection_name)
+        self._table = read_documents(path_prefix + ".arrow")
+        self._vectors = np.load(path_prefix + ".npy", mmap_mode="r")
+
+        user_ids = pc.fill_null(self._table.column("user_id"), -1).to_numpy()
+        order = np.argsort(user_ids, kind="stable")
+        users, starts = np.unique(user_ids[order], return_index=True)
+        self._rows = dict(zip(users.tolist(), np.split(order, starts[1:])))
+
+    def entries(self, user_id, with_vectors=True):
+        """
+        Return a user's snapshot entries.
+
+        Returns:
+            list: (entry_id, text, created_ts, duplicate_of, vector or None) tuples
+        """
+        rows = self._rows.get(user_id)
+        if rows is None:
+            return []
+        columns = self._table.select(["id", "text", "created_ts", "duplicate_of", "has_vector"]).take(rows)
+        entries = []
+        for row, values in zip(rows, columns.to_pylist()):
+            vector = None
+            if with_vectors and values["has_vector"]:
+                vector = np.array(self._vectors[row])
+            entries.append((values["id"], values["text"], values["created_ts"], values["duplicate_of"], vector))
+        return entries
+
+
+def main(args):
+    from database import DatabaseService
+    db_service = DatabaseService()
+
+    if args.command == "export":
+        snapshot_dir = os.path.join(args.out, time.strftime("%Y%m%dT%H%M%SZ", time.gmtime()))
+        os.makedirs(snapshot_dir, exist_ok=True)
+        # Entries stored during the export may be missed, so warm starts re-read from here
+        manifest = {"exported_at": time.time(), "collections": {}}
+        for collection_name in args.collection:
+            collection = db_service._get_collection_by_name(collection_name)
+            started = time.time()
+            rows = export_collection(
+                collection, os.path.join(snapshot_dir, collection_name), config.EMBEDDING_DIMENSION,
+                on_batch=lambda rows: print(f"  {collection_name}: {rows} documents"))
+            manifest["collections"][collection_name] = {"rows": rows, "dimension": config.EMBEDDING_DIMENSION}
+            print(f"{collection_name}: exported {rows} documents in {time.time() - started:.1f}s")
+        # Written last: a directory without a manifest is an incomplete snapshot
+        with open(os.path.join(snapshot_dir, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        print(f"Snapshot written to {snapshot_dir}")
+        return
+
+    manifest = load_manifest(args.snapshot)
+    for collection_name in args.collection:
+        if collection_name not in manifest["collections"]:
+            print(f"{collection_name}: not in snapshot, skipped")
+            continue
+        collection = db_service._get_collection_by_name(collection_name)
+        total, inserted = import_collection(
+            collection, os.path.join(args.snapshot, collection_name), args.concurrency,
+            on_batch=lambda done, inserted: print(f"  {collection_name}: {done} read, {inserted} inserted"))
+        print(f"{collection_name}: inserted {inserted} of {total} documents "
+              f"({total - inserted} already present or rejected)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export or import columnar collection snapshots")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Write a new snapshot")
+    export_parser.add_argument("--out", default=config.SNAPSHOT_DIR, help="Directory for snapshots")
+    import_parser = subparsers.add_parser("import", help="Insert a snapshot's documents")
+    import_parser.add_argument("snapshot", help="Snapshot directory")
+    import_parser.add_argument("--concurrency", type=int, default=4, help="insert_many requests in flight")
+    for subparser in (export_parser, import_parser):
+        subparser.add_argument("--collection", action="append", choices=COLLECTIONS,
+                               help="Collection to export or import (repeatable, default: all)")
+    args = parser.parse_args()
+    args.collection = args.collection or COLLECTIONS
+    main(args)
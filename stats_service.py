@@ -0,0 +1,261 @@
+# stats_service.py
+import os
+import json
+import time
+import asyncio
+import contextvars
+import datetime
+import logging
+import config
+
+logger = logging.getLogger(__name__)
+
+# Collections whose entries are counted; chat messages are only questions
+TRACKED_COLLECTIONS = (config.DB_COLLECTION_THOUGHTS, config.DB_COLLECTION_GAME)
+
+# Shown for entries stored without a source
+_DEFAULT_SOURCES = {config.DB_COLLECTION_THOUGHTS: "text_message", config.DB_COLLECTION_GAME: "game"}
+
+_SOURCE_LABELS = {"voice_note": "voice notes", "text_message": "text messages", "game": "game answers"}
+
+
+# Seconds before a failed recount is tried again
+_RETRY_AFTER = 300
+
+# Touched by jobs that change stored entries outside the bot, e.g. reclassify.py;
+# counts last recounted before its modification time are recounted
+_STALE_MARKER = "stale"
+
+
+def week_key(day):
+    """ISO week of a date, e.g. "2026-W42"."""
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _bump(counts, key, delta):
+    value = counts.get(key, 0) + delta
+    if value > 0:
+        counts[key] = value
+    else:
+        counts.pop(key, None)
+
+
+def mark_stale(stats_dir=None):
+    """Have a running bot recount every user's counts, e.g. after a job rewrote stored categories."""
+    stats_dir = stats_dir or config.STATS_DIR
+    os.makedirs(stats_dir, exist_ok=True)
+    with open(os.path.join(stats_dir, _STALE_MARKER), "w", encoding="utf-8") as f:
+        f.write(str(time.time()))
+
+
+class StatsService:
+    """
+    Materialized per-user counts of stored entries by collection, category, ISO week and source.
+
+    The database service applies every store and delete to the owner's counts,
+    so /stats renders without reading any documents. Counts are written to a
+    small JSON file per user, and a background task recounts each active user
+    from the database every STATS_RECONCILE_INTERVAL to correct any drift,
+    e.g. from writes that failed halfway or deletes made outside the bot.
+    Jobs that rewrite entries in bulk call mark_stale() so every user is
+    recounted on their next /stats or the task's next pass instead.
+
+    Args:
+        scan_entries: Coroutine function taking a user ID and returning
+            (collection_name, models.Entry) pairs for all of the user's entries
+        stats_dir: Directory for the per-user files
+    """
+
+    def __init__(self, scan_entries, stats_dir=None):
+        self._scan_entries = scan_entries
+        self.stats_dir = stats_dir or config.STATS_DIR
+        os.makedirs(self.stats_dir, exist_ok=True)
+        self._stats = {}
+        self._dirty = set()
+        # Changes applied while a user is being recounted, replayed onto the new counts
+        self._changes_during_scan = {}
+        self._reconciling = {}
+        self._failed_at = {}
+        self._worker = None
+
+    def _path(self, user_id):
+        return os.path.join(self.stats_dir, f"{user_id}.json")
+
+    def _stale_since(self):
+        """Modification time of the stale marker, or 0 if no job has left one."""
+        try:
+            return os.path.getmtime(os.path.join(self.stats_dir, _STALE_MARKER))
+        except OSError:
+            return 0
+
+    def _get(self, user_id):
+        """Return the user's counts, loading them from disk on first use."""
+        if user_id not in self._stats:
+            try:
+                with open(self._path(user_id), encoding="utf-8") as f:
+                    self._stats[user_id] = json.load(f)
+            except (OSError, ValueError):
+                self._stats[user_id] = self._empty()
+        return self._stats[user_id]
+
+    @staticmethod
+    def _empty():
+        return {"collections": {}, "categories": {}, "weeks": {}, "sources": {}, "reconciled_at": None}
+
+    def _save(self, user_id, stats):
+        path = self._path(user_id)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(stats, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _apply(stats, collection_name, entry, delta):
+        _bump(stats["collections"], collection_name, delta)
+        for category in entry.categories:
+            _bump(stats["categories"], category, delta)
+        if entry.timestamp is not None:
+            _bump(stats["weeks"], week_key(datetime.date.fromtimestamp(entry.timestamp)), delta)
+        _bump(stats["sources"], entry.source or _DEFAULT_SOURCES[collection_name], delta)
+
+    def record(self, collection_name, entry, delta=1):
+        """
+        Count a stored entry, or uncount a deleted one.
+
+        Args:
+            collection_name: Collection the entry is stored in
+            entry: models.Entry with user_id, categories, timestamp and source
+            delta: 1 for a stored entry, -1 for a deleted one
+        """
+        if collection_name not in TRACKED_COLLECTIONS or entry.user_id is None:
+            return
+        user_id = entry.user_id
+        self._apply(self._get(user_id), collection_name, entry, delta)
+        changes = self._changes_during_scan.get(user_id)
+        if changes is not None:
+            changes.append((collection_name, entry, delta))
+        self._dirty.add(user_id)
+        self._ensure_worker()
+
+    async def get_stats(self, user_id):
+        """Return the user's counts, recounting them first if they were never counted or are marked stale."""
+        reconciled_at = self._get(user_id)["reconciled_at"]
+        if reconciled_at is None or reconciled_at < self._stale_since():
+            await self.reconcile(user_id)
+        return self._stats[user_id]
+
+    async def reconcile(self, user_id):
+        """Recount a user's entries from the database and replace their counts."""
+        running = self._reconciling.get(user_id)
+        if running is None:
+            running = self._reconciling[user_id] = asyncio.ensure_future(self._reconcile(user_id))
+        await asyncio.shield(running)
+
+    async def _reconcile(self, user_id):
+        changes = self._changes_during_scan[user_id] = []
+        # Stamped with the scan's start, so a job finishing mid-scan still marks it stale
+        started = time.time()
+        try:
+            entries = await self._scan_entries(user_id)
+
+            stats = self._empty()
+            present = set()
+            for collection_name, entry in entries:
+                self._apply(stats, collection_name, entry, 1)
+                present.add(entry.id)
+            # The scan may or may not have seen entries stored or deleted meanwhile
+            for collection_name, entry, delta in changes:
+                if (delta > 0) != (entry.id in present):
+                    self._apply(stats, collection_name, entry, delta)
+                    if delta > 0:
+                        present.add(entry.id)
+                    else:
+                        present.discard(entry.id)
+
+            old = self._get(user_id)
+            if old["collections"] != stats["collections"] and old["reconciled_at"] is not None:
+                logger.info(f"Corrected stats drift for user {user_id}: "
+                            f"{old['collections']} -> {stats['collections']}")
+            stats["reconciled_at"] = started
+            self._stats[user_id] = stats
+            self._dirty.add(user_id)
+            self._ensure_worker()
+        except Exception as e:
+            logger.error(f"Error reconciling stats for user {user_id}: {e}")
+            self._failed_at[user_id] = time.time()
+        finally:
+            self._changes_during_scan.pop(user_id, None)
+            self._reconciling.pop(user_id, None)
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            # Started from inside a handler, so given a fresh context rather than a copy
+            # of that update's, which would file every later span under its trace
+            self._worker = asyncio.get_running_loop().create_task(self._run(), context=contextvars.Context())
+
+    async def _run(self):
+        """Write changed counts every interval and recount users whose counts are stale."""
+        while True:
+            await asyncio.sleep(config.STATS_FLUSH_INTERVAL)
+            await self.flush()
+
+            now = time.time()
+            stale_before = max(now - config.STATS_RECONCILE_INTERVAL, self._stale_since())
+            for user_id, stats in list(self._stats.items()):
+                if now - self._failed_at.get(user_id, 0) < _RETRY_AFTER:
+                    continue
+                if (stats["reconciled_at"] or 0) < stale_before:
+                    await self.reconcile(user_id)
+
+    async def flush(self):
+        """Write every user's changed counts to disk."""
+        while self._dirty:
+            user_id = self._dirty.pop()
+            # Copied here so the thread never sees a half-applied change
+            stats = json.loads(json.dumps(self._stats[user_id]))
+            try:
+                await asyncio.to_thread(self._save, user_id, stats)
+            except OSError as e:
+                logger.error(f"Error saving stats for user {user_id}: {e}")
+
+    async def render_overview(self, user_id, weeks=8):
+        """
+        Render the user's counts as a /stats message.
+
+        Args:
+            user_id: The Telegram user ID
+            weeks: Number of recent weeks to show
+
+        Returns:
+            str: The overview text
+        """
+        stats = await self.get_stats(user_id)
+        collections = stats["collections"]
+        thoughts = collections.get(config.DB_COLLECTION_THOUGHTS, 0)
+        answers = collections.get(config.DB_COLLECTION_GAME, 0)
+        if not thoughts and not answers:
+            return "You haven't stored any thoughts yet."
+
+        lines = ["📊 Your stats", "", f"Thoughts: {thoughts}", f"Game answers: {answers}"]
+
+        categories = sorted(stats["categories"].items(), key=lambda item: -item[1])
+        if categories:
+            lines += ["", "By category:"]
+            top = categories[0][1]
+            for category, count in categories:
+                bar = "█" * max(1, round(10 * count / top))
+                lines.append(f"  {category:<14} {bar} {count}")
+
+        if stats["sources"]:
+            lines += ["", "By source:"]
+            for source, count in sorted(stats["sources"].items(), key=lambda item: -item[1]):
+                lines.append(f"  {_SOURCE_LABELS.get(source, source)}: {count}")
+
+        lines += ["", f"Last {weeks} weeks:"]
+        today = datetime.date.today()
+        for offset in range(weeks - 1, -1, -1):
+            key = week_key(today - datetime.timedelta(weeks=offset))
+            count = stats["weeks"].get(key, 0)
+            lines.append(f"  {key} {'▇' * min(count, 20)} {count}")
+        return "\n".join(lines)
@@ -0,0 +1,32 @@
+# tests/test_coalescer.py
+import asyncio
+from types import SimpleNamespace
+
+from handlers.coalescer import MessageCoalescer
+
+
+def _update(text):
+    return SimpleNamespace(message=SimpleNamespace(text=text))
+
+
+def test_flush_hands_over_the_burst_before_returning():
+    async def scenario():
+        coalescer = MessageCoalescer(quiet_time=5, max_wait=10)
+        order = []
+
+        async def first():
+            merged = await coalescer.collect(1, _update("one"))
+            order.append(merged.message.text)
+
+        async def second():
+            assert await coalescer.collect(1, _update("two")) is None
+
+        owner = asyncio.ensure_future(first())
+        await asyncio.sleep(0)
+        await second()
+        await coalescer.flush(1)
+        order.append("voice")
+        await owner
+        return order
+
+    assert asyncio.run(asyncio.wait_for(scenario(), 1)) == ["one\ntwo", "voice"]
@@ -0,0 +1,13 @@
+# tests/test_dedupe.py
+from dedupe import find_duplicates
+from models import Entry
+
+
+def test_thoughts_differing_in_one_word_are_not_duplicates():
+    entries = [
+        Entry("a", "I went to the gym today and felt great", user_id=1, timestamp=1.0),
+        Entry("b", "I went to the gym today and felt terrible", user_id=1, timestamp=2.0),
+        Entry("c", "I went to the gym today and felt great", user_id=1, timestamp=3.0),
+    ]
+
+    assert [(duplicate, original) for duplicate, original, _ in find_duplicates(entries)] == [("c", "a")]
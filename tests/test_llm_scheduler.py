@@ -0,0 +1,91 @@
+# tests/test_llm_scheduler.py
+import asyncio
+
+from llm_scheduler import BACKGROUND, GAME, INGESTION, INTERACTIVE, LLMScheduler
+
+
+async def _started_order(scheduler, requests):
+    """Queue requests behind a held slot, release it, and return the order they start in."""
+    order = []
+
+    async def run(name, priority, user_id, cost):
+        async with scheduler.request(priority, user_id, cost):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    blocker = scheduler.request(INTERACTIVE, "blocker", 1)
+    await blocker.__aenter__()
+    tasks = []
+    for request in requests:
+        tasks.append(asyncio.ensure_future(run(*request)))
+        await asyncio.sleep(0)
+    await blocker.__aexit__(None, None, None)
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_waiting_requests_start_in_priority_order():
+    scheduler = LLMScheduler(max_concurrency=1)
+    requests = [("background", BACKGROUND, 1, 10), ("ingestion", INGESTION, 1, 10),
+                ("game", GAME, 1, 10), ("chat", INTERACTIVE, 1, 10)]
+
+    order = asyncio.run(_started_order(scheduler, requests))
+
+    assert order == ["chat", "game", "ingestion", "background"]
+
+
+def test_users_in_one_class_are_interleaved():
+    scheduler = LLMScheduler(max_concurrency=1)
+    burst = [(f"a{i}", INGESTION, "a", 100) for i in range(4)]
+    requests = burst + [("b0", INGESTION, "b", 100), ("b1", INGESTION, "b", 100)]
+
+    order = asyncio.run(_started_order(scheduler, requests))
+
+    assert order == ["a0", "b0", "a1", "b1", "a2", "a3"]
+
+
+def _granted_and_delay(scheduler, requests):
+    """Start requests without releasing them; return which were granted and the dispatch timer delay."""
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        slots = [scheduler.request(priority, "u", cost) for priority, cost in requests]
+        tasks = [asyncio.ensure_future(slot.__aenter__()) for slot in slots]
+        await asyncio.sleep(0.01)
+        granted = [task.done() for task in tasks]
+        delay = scheduler._timer.when() - loop.time() if scheduler._timer is not None else 0.0
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return granted, delay
+    return asyncio.run(scenario())
+
+
+def test_requests_wait_when_the_rpm_budget_is_spent():
+    scheduler = LLMScheduler(rpm=2, max_concurrency=10)
+
+    granted, delay = _granted_and_delay(scheduler, [(INTERACTIVE, 1)] * 3)
+
+    assert granted == [True, True, False]
+    # Two requests a minute refill one every 30 seconds
+    assert 29 < delay <= 30
+
+
+def test_requests_wait_when_the_tpm_budget_is_spent():
+    scheduler = LLMScheduler(tpm=1000, max_concurrency=10)
+
+    granted, delay = _granted_and_delay(scheduler, [(INTERACTIVE, 800), (INTERACTIVE, 800)])
+
+    assert granted == [True, False]
+    # 600 more tokens are needed at 1000 per minute
+    assert 35 < delay <= 36
+
+
+def test_background_work_leaves_the_interactive_reserve():
+    scheduler = LLMScheduler(tpm=1000, max_concurrency=10, reserve_fraction=0.5)
+
+    granted, _ = _granted_and_delay(scheduler, [(BACKGROUND, 400), (BACKGROUND, 400)])
+    assert granted == [True, False]
+
+    scheduler = LLMScheduler(tpm=1000, max_concurrency=10, reserve_fraction=0.5)
+    granted, _ = _granted_and_delay(scheduler, [(BACKGROUND, 400), (INTERACTIVE, 400)])
+    assert granted == [True, True]
@@ -0,0 +1,72 @@
+# tests/test_main.py
+import json
+import asyncio
+import datetime
+
+from telegram import Chat, Message, MessageEntity, Update, User
+from telegram.ext import ApplicationBuilder
+from telegram.request import BaseRequest
+
+from main import register_handlers
+
+
+class OfflineRequest(BaseRequest):
+    """Answers getMe locally, so the application initializes without Telegram."""
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        assert url.endswith("/getMe"), url
+        me = {"id": 1, "first_name": "Bot", "is_bot": True, "username": "reflection_test_bot"}
+        return 200, json.dumps({"ok": True, "result": me}).encode()
+
+
+class RecordingManager:
+    """Stands in for HandlerManager, recording which of its methods each update reaches."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        async def handler(update, context):
+            self.calls.append(name)
+        return handler
+
+
+def _update(update_id, text):
+    entities = []
+    if text.startswith("/"):
+        entities = [MessageEntity(MessageEntity.BOT_COMMAND, 0, len(text.split()[0]))]
+    message = Message(message_id=update_id, date=datetime.datetime.now(datetime.timezone.utc),
+                      chat=Chat(id=7, type=Chat.PRIVATE), text=text, entities=entities,
+                      from_user=User(id=7, first_name="Test", is_bot=False))
+    return Update(update_id=update_id, message=message)
+
+
+def test_text_and_commands_reach_the_handler_manager():
+    application = (ApplicationBuilder().token("123:TEST")
+                   .request(OfflineRequest()).get_updates_request(OfflineRequest()).build())
+    manager = RecordingManager()
+    register_handlers(application, manager)
+
+    async def dispatch():
+        await application.initialize()
+        try:
+            for update_id, text in enumerate(["/chat", "What did I write about work?"], start=1):
+                update = _update(update_id, text)
+                update.message.set_bot(application.bot)
+                await application.process_update(update)
+        finally:
+            await application.shutdown()
+
+    asyncio.run(dispatch())
+    assert manager.calls == ["chat_command", "handle_message"]
@@ -0,0 +1,67 @@
+# tests/test_profile_service.py
+import asyncio
+
+from benchmarks.fakes import FakeAnthropicClient, LatencyModel
+from claude_service import ClaudeService
+from llm_scheduler import LLMScheduler
+from profile_service import ProfileService
+
+
+def test_update_profile_merges_entries_into_digest(tmp_path):
+    client = FakeAnthropicClient(LatencyModel(0.001, 0.1), output_tokens_per_second=1e6)
+    claude = ClaudeService(client=client, scheduler=LLMScheduler())
+    profiles = ProfileService(claude, profile_dir=str(tmp_path))
+
+    entries = [
+        {"text": "I love building things at work", "categories": ["work"], "source": "voice_note"},
+        {"text": "Dinner with my family every sunday", "categories": ["relationships"], "source": "game"},
+    ]
+    asyncio.run(profiles.update_profile(42, entries))
+
+    profile = profiles.get_profile(42)
+    assert profile["entries_seen"] == 2
+    assert profile["values"] == ["growth", "family", "meaningful work"]
+    assert profile["categories"]["work"] == "Finds energy in building things."
+    assert "family" in profile["themes"]
+    assert not profiles._pending
+    assert (tmp_path / "42.json").exists()
+
+    digest = profiles.render_digest(42)
+    assert digest.startswith("Key values: growth; family; meaningful work")
+    assert "Relationships: Close to family." in digest
+
+
+def test_worker_spans_are_not_filed_under_the_starting_update(tmp_path, monkeypatch):
+    import config
+    from tracing_service import start_trace
+
+    monkeypatch.setattr(config, "PROFILE_BATCH_SIZE", 1)
+    client = FakeAnthropicClient(LatencyModel(0.001, 0.1), output_tokens_per_second=1e6)
+    profiles = ProfileService(ClaudeService(client=client, scheduler=LLMScheduler()), profile_dir=str(tmp_path))
+
+    async def scenario():
+        async with start_trace("update.normal", 42) as trace:
+            profiles.note_entry(42, "I love building things at work", ["work"], "text_message")
+        for _ in range(100):
+            if profiles.get_profile(42)["entries_seen"]:
+                break
+            await asyncio.sleep(0.01)
+        profiles._worker.cancel()
+        return trace
+
+    trace = asyncio.run(scenario())
+    assert profiles.get_profile(42)["entries_seen"] == 1
+    assert not [name for name, _, _ in trace.spans if name.startswith("claude.")]
+
+
+def test_save_failure_keeps_the_digest_in_memory(tmp_path, monkeypatch):
+    client = FakeAnthropicClient(LatencyModel(0.001, 0.1), output_tokens_per_second=1e6)
+    profiles = ProfileService(ClaudeService(client=client, scheduler=LLMScheduler()), profile_dir=str(tmp_path))
+
+    def fail(user_id):
+        raise OSError("disk full")
+    monkeypatch.setattr(profiles, "_save", fail)
+
+    asyncio.run(profiles.update_profile(42, [{"text": "Long walk by the sea", "categories": [], "source": None}]))
+
+    assert profiles.get_profile(42)["entries_seen"] == 1
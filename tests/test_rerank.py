@@ -0,0 +1,36 @@
+# tests/test_rerank.py
+import numpy as np
+
+from models import Entry
+from rerank import diversify
+
+
+def _unit(values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_diversify_ranks_by_search_similarity_and_skips_stored_duplicates():
+    entries = [
+        Entry("a", "Spent the evening with mum", similarity=0.95),
+        Entry("b", "Spent the evening with mum again", similarity=0.94),
+        Entry("c", "Started a new job at the bakery", similarity=0.90),
+    ]
+    vectors = {"a": _unit([1, 0]), "b": _unit([1, 0.05]), "c": _unit([0, 1])}
+
+    selected = diversify(entries, k=2, vectors=vectors, lambda_=0.5)
+
+    assert [entry.id for entry in selected] == ["a", "c"]
+
+
+def test_lexical_only_hits_count_as_the_weakest_vector_hit():
+    entries = [
+        Entry("a", "first", similarity=0.8),
+        Entry("b", "second"),
+        Entry("c", "third", similarity=0.6),
+    ]
+    vectors = {"a": _unit([1, 0, 0]), "b": _unit([0, 1, 0]), "c": _unit([0, 0, 1])}
+
+    selected = diversify(entries, k=3, vectors=vectors, lambda_=1.0)
+
+    assert [entry.id for entry in selected] == ["a", "b", "c"]
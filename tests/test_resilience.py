@@ -0,0 +1,135 @@
+# tests/test_resilience.py
+import asyncio
+import time
+
+import pytest
+
+import config
+import resilience
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(resilience, "_upstreams", {})
+    monkeypatch.setattr(resilience, "_endpoints", {})
+    monkeypatch.setattr(config, "RESILIENCE_ENABLED", True)
+    monkeypatch.setattr(config, "HEDGE_ENABLED", True)
+    monkeypatch.setattr(config, "RETRY_BASE_DELAY", 0.0)
+    monkeypatch.setattr(config, "RETRY_MAX_ATTEMPTS", 3)
+
+
+def _calls(results):
+    """make_call returning the next result each time, raising it if it is an exception."""
+    made = []
+
+    def make_call():
+        result = results[len(made)]
+        made.append(result)
+
+        async def call():
+            if isinstance(result, BaseException):
+                raise result
+            return result
+        return call()
+    return make_call, made
+
+
+def test_breaker_opens_probes_once_and_closes():
+    upstream = resilience._upstreams["test"] = resilience.Upstream("test", failure_threshold=2, reset_after=0.05)
+
+    async def scenario():
+        make_call, _ = _calls([ConnectionError(), ConnectionError()])
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                await resilience.call("test.op", "test", make_call)
+        assert upstream.is_open()
+        with pytest.raises(resilience.CircuitOpenError):
+            await resilience.call("test.op", "test", make_call)
+
+        await asyncio.sleep(0.06)
+        # Half open: the first call is the probe and a second one is still rejected
+        assert upstream.allow()
+        assert not upstream.allow()
+        upstream.release_probe()
+
+        make_call, made = _calls(["ok"])
+        assert await resilience.call("test.op", "test", make_call) == "ok"
+        assert not upstream.is_open()
+
+    asyncio.run(scenario())
+
+
+def test_failed_probe_opens_the_breaker_again():
+    upstream = resilience._upstreams["test"] = resilience.Upstream("test", failure_threshold=1, reset_after=0.05)
+    upstream.record_failure()
+    time.sleep(0.06)
+
+    make_call, _ = _calls([ConnectionError()])
+    with pytest.raises(ConnectionError):
+        asyncio.run(resilience.call("test.op", "test", make_call))
+
+    assert upstream.is_open()
+    assert not upstream.allow()
+
+
+def test_retries_stop_when_the_budget_is_spent():
+    upstream = resilience._upstreams["test"] = resilience.Upstream(
+        "test", failure_threshold=100, retry_ratio=0.0)
+    upstream._retry_tokens = 1.0
+
+    make_call, made = _calls([ConnectionError(), "ok"])
+    assert asyncio.run(resilience.call("test.op", "test", make_call, retry=True)) == "ok"
+    assert len(made) == 2
+
+    make_call, made = _calls([ConnectionError(), "ok"])
+    with pytest.raises(ConnectionError):
+        asyncio.run(resilience.call("test.op", "test", make_call, retry=True))
+    assert len(made) == 1
+
+
+def test_bad_requests_are_not_retried():
+    class BadRequest(Exception):
+        status_code = 400
+
+    make_call, made = _calls([BadRequest(), "ok"])
+    with pytest.raises(BadRequest):
+        asyncio.run(resilience.call("test.op", "test", make_call, retry=True))
+    assert len(made) == 1
+
+
+def test_hedge_wins_and_the_slow_request_is_cancelled():
+    endpoint = resilience.get_endpoint("test.read")
+    for _ in range(resilience._MIN_SAMPLES):
+        endpoint.observe(0.01)
+    started = []
+    cancelled = []
+
+    def make_call():
+        attempt = len(started)
+        started.append(attempt)
+
+        async def call():
+            try:
+                await asyncio.sleep(10 if attempt == 0 else 0.01)
+            except asyncio.CancelledError:
+                cancelled.append(attempt)
+                raise
+            return f"attempt {attempt}"
+        return call()
+
+    async def scenario():
+        result = await resilience.call("test.read", "test", make_call, hedge=True)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(scenario()) == "attempt 1"
+    assert started == [0, 1]
+    assert cancelled == [0]
+
+
+def test_adaptive_timeout_follows_the_p99():
+    endpoint = resilience.get_endpoint("test.op")
+    assert endpoint.timeout() == config.TIMEOUT_MAX_SECONDS
+    for _ in range(resilience._MIN_SAMPLES):
+        endpoint.observe(1.0)
+    assert endpoint.timeout() == max(config.TIMEOUT_MIN_SECONDS, 1.0 * config.TIMEOUT_P99_MULTIPLIER)
@@ -0,0 +1,27 @@
+# tests/test_semantic_cache.py
+import numpy as np
+
+from semantic_cache import SemanticCache
+
+
+def _unit(values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_lookup_only_matches_answers_from_the_same_scope():
+    cache = SemanticCache(threshold=0.97)
+    vector = _unit([1.0, 0.0, 0.0])
+    cache.store(1, "what did I do yesterday?", vector, "You went running.", 0, scope=(100.0, "2026-10-18"))
+
+    assert cache.lookup(1, vector, 0, scope=(100.0, "2026-10-18")) == "You went running."
+    assert cache.lookup(1, vector, 0, scope=(186500.0, "2026-10-19")) is None
+    assert cache.lookup(1, vector, 0) is None
+
+
+def test_lookup_rejects_questions_below_the_threshold():
+    cache = SemanticCache(threshold=0.97)
+    cache.store(1, "my mother", _unit([1.0, 0.0]), "About your mother...", 0)
+
+    assert cache.lookup(1, _unit([1.0, 0.3]), 0) is None
+    assert cache.lookup(1, _unit([1.0, 0.1]), 0) == "About your mother..."
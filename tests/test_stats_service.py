@@ -0,0 +1,29 @@
+# tests/test_stats_service.py
+import os
+import asyncio
+
+import config
+from models import Entry
+from stats_service import StatsService, mark_stale
+
+
+def test_counts_are_recounted_after_a_job_marks_them_stale(tmp_path):
+    stored = [Entry("a", "long day at the office", user_id=7, categories=["work"], timestamp=1.7e9)]
+
+    async def scan_entries(user_id):
+        return [(config.DB_COLLECTION_THOUGHTS, entry) for entry in stored]
+
+    async def main():
+        stats = StatsService(scan_entries, stats_dir=str(tmp_path))
+        assert (await stats.get_stats(7))["categories"] == {"work": 1}
+
+        # A reclassify run rewrites the category in the database only
+        stored[0] = Entry("a", "long day at the office", user_id=7, categories=["health"], timestamp=1.7e9)
+        assert (await stats.get_stats(7))["categories"] == {"work": 1}
+
+        mark_stale(str(tmp_path))
+        reconciled_at = stats._stats[7]["reconciled_at"]
+        os.utime(tmp_path / "stale", (reconciled_at + 1, reconciled_at + 1))
+        assert (await stats.get_stats(7))["categories"] == {"health": 1}
+
+    asyncio.run(main())
@@ -0,0 +1,31 @@
+# tests/test_vector_store.py
+import numpy as np
+
+from vector_store import QuantizedVectorIndex, VectorFile
+
+
+def _unit(seed, dimension=16):
+    vector = np.random.RandomState(seed).randn(dimension).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_a_second_vector_file_on_the_same_path_leaves_the_first_intact(tmp_path):
+    path = str(tmp_path / "vectors.f32")
+    first = VectorFile(path, 16, initial_rows=2)
+    rows = [first.add(_unit(seed)) for seed in range(5)]
+
+    second = VectorFile(path, 16, initial_rows=2)
+    second.add(np.zeros(16, dtype=np.float32))
+
+    np.testing.assert_array_equal(first.get(rows), np.stack([_unit(seed) for seed in range(5)]))
+
+
+def test_search_restricted_to_allowed_ids(tmp_path):
+    index = QuantizedVectorIndex(VectorFile(str(tmp_path / "vectors.f32"), 16))
+    for seed in range(20):
+        index.add(f"e{seed}", _unit(seed))
+
+    hits = index.search(_unit(3), 5, allowed=["e3", "e7"])
+
+    assert [entry_id for entry_id, _ in hits][0] == "e3"
+    assert {entry_id for entry_id, _ in hits} <= {"e3", "e7"}
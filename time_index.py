@@ -0,0 +1,144 @@
+# time_index.py
+import re
+import time
+import bisect
+import datetime
+
+DAY = 86400
+
+
+def entry_timestamp(document):
+    """
+    Return an entry's creation time as epoch seconds.
+
+    Entries stored before created_ts existed only have a created_at string,
+    either ISO 8601 or str(datetime), which is parsed instead.
+
+    Returns:
+        float: The timestamp, or None if the entry has neither field
+    """
+    metadata = document.get("metadata") or {}
+    timestamp = metadata.get("created_ts")
+    if timestamp is not None:
+        return float(timestamp)
+
+    created_at = metadata.get("created_at")
+    if created_at:
+        try:
+            return datetime.datetime.fromisoformat(str(created_at)).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+class TimeBucketIndex:
+    """
+    Entry IDs grouped into fixed-width time buckets.
+
+    "Most recent N" walks buckets from the newest and date-range lookups only
+    touch the buckets overlapping the range, so both cost O(buckets touched)
+    rather than O(corpus).
+
+    Args:
+        bucket_seconds: Width of a bucket; one day by default
+    """
+
+    def __init__(self, bucket_seconds=DAY):
+        self.bucket_seconds = bucket_seconds
+        self._buckets = {}       # bucket number -> sorted list of (timestamp, entry ID)
+        self._bucket_keys = []   # sorted bucket numbers
+        self._timestamps = {}    # entry ID -> timestamp
+
+    def __len__(self):
+        return len(self._timestamps)
+
+    def add(self, entry_id, timestamp):
+        """Index an entry at a timestamp; entries already indexed are left as they are."""
+        if timestamp is None or entry_id in self._timestamps:
+            return
+        key = int(timestamp // self.bucket_seconds)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = []
+            bisect.insort(self._bucket_keys, key)
+        bisect.insort(bucket, (timestamp, entry_id))
+        self._timestamps[entry_id] = timestamp
+
+    def remove(self, entry_id):
+        """Drop an entry. Returns False if it wasn't indexed."""
+        timestamp = self._timestamps.pop(entry_id, None)
+        if timestamp is None:
+            return False
+        key = int(timestamp // self.bucket_seconds)
+        bucket = self._buckets[key]
+        bucket.remove((timestamp, entry_id))
+        if not bucket:
+            del self._buckets[key]
+            self._bucket_keys.remove(key)
+        return True
+
+    def _keys_between(self, since, until):
+        low = 0 if since is None else bisect.bisect_left(
+            self._bucket_keys, int(since // self.bucket_seconds))
+        high = len(self._bucket_keys) if until is None else bisect.bisect_right(
+            self._bucket_keys, int(until // self.bucket_seconds))
+        return self._bucket_keys[low:high]
+
+    def range(self, since=None, until=None):
+        """
+        Return the IDs of entries created in [since, until), oldest first.
+
+        Args:
+            since: Inclusive lower bound in epoch seconds, or None
+            until: Exclusive upper bound in epoch seconds, or None
+        """
+        entry_ids = []
+        for key in self._keys_between(since, until):
+            for timestamp, entry_id in self._buckets[key]:
+                if (since is None or timestamp >= since) and (until is None or timestamp < until):
+                    entry_ids.append(entry_id)
+        return entry_ids
+
+    def recent(self, count, since=None, until=None):
+        """Return the IDs of up to `count` newest entries in [since, until), newest first."""
+        entry_ids = []
+        for key in reversed(self._keys_between(since, until)):
+            for timestamp, entry_id in reversed(self._buckets[key]):
+                if (since is None or timestamp >= since) and (until is None or timestamp < until):
+                    entry_ids.append(entry_id)
+                    if len(entry_ids) >= count:
+                        return entry_ids
+        return entry_ids
+
+
+_RELATIVE_RANGES = [
+    (re.compile(r"\btoday\b"), 0, 1),
+    (re.compile(r"\byesterday\b"), 1, 1),
+    (re.compile(r"\b(this|past) week\b"), 6, 7),
+    (re.compile(r"\blast week\b"), 7, 7),
+    (re.compile(r"\b(this|past) month\b"), 29, 30),
+    (re.compile(r"\blast month\b"), 30, 30),
+    (re.compile(r"\b(this|past) year\b"), 364, 365),
+    (re.compile(r"\blast year\b"), 365, 365),
+]
+
+
+def parse_time_range(text, now=None):
+    """
+    Find a relative time phrase such as "yesterday" or "last week" in a query.
+
+    "Last week" is read loosely as the seven days before today, which is what
+    people usually mean when asking a diary about it.
+
+    Returns:
+        tuple: (since, until) in epoch seconds, or (None, None) if there is no phrase
+    """
+    lowered = text.lower()
+    now = time.time() if now is None else now
+    today = datetime.datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    for pattern, days_back, length in _RELATIVE_RANGES:
+        if pattern.search(lowered):
+            start = today - datetime.timedelta(days=days_back)
+            end = start + datetime.timedelta(days=length)
+            return start.timestamp(), min(end.timestamp(), now + 1)
+    return None, None
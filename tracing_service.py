@@ -0,0 +1,139 @@
+# tracing_service.py
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from collections import deque
+import config
+
+logger = logging.getLogger(__name__)
+
+# The trace of the update currently being handled, if any
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class Trace:
+    """Timeline of one Telegram update: a root duration plus timed spans."""
+
+    __slots__ = ("trace_id", "name", "user_id", "started_at", "duration", "spans", "_start")
+
+    def __init__(self, name, user_id=None):
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.user_id = user_id
+        self.started_at = time.time()
+        self.duration = None
+        # (name, offset from trace start, duration) in seconds
+        self.spans = []
+        self._start = time.perf_counter()
+
+    def add_span(self, name, start, duration):
+        self.spans.append((name, start - self._start, duration))
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._start
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "user_id": self.user_id,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "spans": [
+                {"name": name, "offset": offset, "duration": duration}
+                for name, offset, duration in self.spans
+            ]
+        }
+
+
+class TraceBuffer:
+    """Ring buffer holding the most recent finished traces."""
+
+    def __init__(self, size):
+        self._traces = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, trace):
+        with self._lock:
+            self._traces.append(trace)
+
+    def slowest(self, count):
+        with self._lock:
+            traces = list(self._traces)
+        return sorted(traces, key=lambda t: t.duration or 0, reverse=True)[:count]
+
+    def dump(self, path):
+        """Write every buffered trace to a JSON file."""
+        with self._lock:
+            traces = [trace.to_dict() for trace in self._traces]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(traces, f, indent=2)
+        return len(traces)
+
+
+TRACES = TraceBuffer(config.TRACE_BUFFER_SIZE)
+
+
+def current_trace_id():
+    """Return the id of the trace for the update being handled, or None."""
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+
+def record_span(name, start, duration):
+    """Attach a finished span to the current trace, if there is one."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(name, start, duration)
+
+
+class start_trace:
+    """
+    Async context manager that opens a trace for one update.
+
+    Every stage tracked inside the block, including calls made from nested
+    handlers and services, is recorded as a span of this trace.
+    """
+
+    __slots__ = ("trace", "_token")
+
+    def __init__(self, name, user_id=None):
+        self.trace = Trace(name, user_id)
+        self._token = None
+
+    async def __aenter__(self):
+        self._token = _current_trace.set(self.trace)
+        return self.trace
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.trace.finish()
+        _current_trace.reset(self._token)
+        TRACES.add(self.trace)
+        return False
+
+
+def render_waterfall(trace, width=24):
+    """
+    Render a trace as a plain-text span waterfall.
+
+    Args:
+        trace: The finished trace
+        width: Number of characters for the full trace duration
+
+    Returns:
+        str: One header line plus one bar per span
+    """
+    total = trace.duration or 0
+    lines = [f"{trace.name} {trace.trace_id} user={trace.user_id} {total:.2f}s"]
+    scale = width / total if total > 0 else 0
+
+    for name, offset, duration in sorted(trace.spans, key=lambda span: span[1]):
+        lead = min(width - 1, int(offset * scale))
+        length = max(1, min(width - lead, round(duration * scale)))
+        bar = " " * lead + "█" * length + " " * (width - lead - length)
+        lines.append(f"|{bar}| {duration:6.2f}s {name}")
+
+    return "\n".join(lines)
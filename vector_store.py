@@ -0,0 +1,205 @@
+# vector_store.py
+import os
+import logging
+import tempfile
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Set bits per byte value, for numpy versions without bitwise_count
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def _popcount(codes):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(codes)
+    return _POPCOUNT[codes]
+
+
+class VectorFile:
+    """
+    Full-precision vectors in one memory-mapped float32 file, used for exact rescoring.
+
+    Rows are handed out by add() and returned by release(); released rows are
+    reused before the file grows. The file only backs in-memory indexes, so
+    each instance gets its own unnamed temporary file next to path: a
+    maintenance CLI running beside the bot can't truncate the bot's vectors,
+    and the file is gone when the process exits.
+
+    Args:
+        path: Where to put the file; only its directory and name prefix are used
+        dimension: Vector dimension
+        initial_rows: Rows allocated up front; the file doubles when full
+    """
+
+    def __init__(self, path, dimension, initial_rows=1024):
+        self.path = path
+        self.dimension = dimension
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        self._file = tempfile.TemporaryFile(dir=directory, prefix=os.path.basename(path) + ".")
+        self._rows = 0
+        self._free = []
+        self._map(initial_rows)
+
+    def _map(self, capacity):
+        # Grow the file; the new pages stay sparse until written
+        self._file.truncate(capacity * self.dimension * 4)
+        self._vectors = np.memmap(self._file, dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
+        self.capacity = capacity
+
+    def add(self, vector):
+        """Write a vector and return its row."""
+        if self._free:
+            row = self._free.pop()
+        else:
+            if self._rows == self.capacity:
+                self._vectors.flush()
+                self._map(self.capacity * 2)
+            row = self._rows
+            self._rows += 1
+        self._vectors[row] = vector
+        return row
+
+    def release(self, rows):
+        self._free.extend(rows)
+
+    def get(self, rows):
+        """Read rows as a float32 array of shape (len(rows), dimension)."""
+        return np.asarray(self._vectors[np.asarray(rows, dtype=np.int64)])
+
+
+class QuantizedVectorIndex:
+    """
+    Compact vectors of one user's entries, searched locally.
+
+    Each vector is kept in memory as a code and in full in the shared
+    VectorFile. A search scores every code against the float query, keeps a
+    shortlist of rescore_factor * limit candidates, and ranks those by exact
+    cosine similarity using their full vectors read from the file.
+
+    Modes:
+        int8: one signed byte per dimension with a per-vector scale (4x smaller)
+        binary: one sign bit per dimension, scored by Hamming distance with popcount
+            (32x smaller, coarser shortlist)
+
+    Args:
+        vector_file: Shared VectorFile for the full vectors
+        mode: "int8" or "binary"
+        rescore_factor: Shortlist size as a multiple of the result limit
+    """
+
+    def __init__(self, vector_file, mode="int8", rescore_factor=4):
+        if mode not in ("int8", "binary"):
+            raise ValueError(f"Unknown quantization mode: {mode}")
+        self.vector_file = vector_file
+        self.mode = mode
+        self.rescore_factor = rescore_factor
+        dimension = vector_file.dimension
+        width = dimension if mode == "int8" else (dimension + 7) // 8
+        self._codes = np.zeros((16, width), dtype=np.int8 if mode == "int8" else np.uint8)
+        self._scales = np.zeros(16, dtype=np.float32)
+        self._rows = np.zeros(16, dtype=np.int64)
+        self._ids = []
+        self._positions = {}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def nbytes(self):
+        """Memory held by the codes, scales and rows."""
+        n = len(self._ids)
+        return self._codes[:n].nbytes + self._scales[:n].nbytes + self._rows[:n].nbytes
+
+    def _encode(self, vector):
+        if self.mode == "binary":
+            return np.packbits(vector > 0), 1.0
+        scale = float(np.max(np.abs(vector))) / 127 or 1.0
+        return np.round(vector / scale).astype(np.int8), scale
+
+    def add(self, entry_id, vector):
+        """Index a vector; entries already indexed are left as they are."""
+        if entry_id in self._positions:
+            return
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        n = len(self._ids)
+        if n == len(self._codes):
+            self._codes = np.resize(self._codes, (n * 2, self._codes.shape[1]))
+            self._scales = np.resize(self._scales, n * 2)
+            self._rows = np.resize(self._rows, n * 2)
+        self._codes[n], self._scales[n] = self._encode(vector)
+        self._rows[n] = self.vector_file.add(vector)
+        self._ids.append(entry_id)
+        self._positions[entry_id] = n
+
+    def remove(self, entry_id):
+        position = self._positions.pop(entry_id, None)
+        if position is None:
+            return False
+        self.vector_file.release([int(self._rows[position])])
+        # Move the last entry into the gap so the arrays stay dense
+        last = len(self._ids) - 1
+        if position != last:
+            last_id = self._ids[last]
+            self._codes[position] = self._codes[last]
+            self._scales[position] = self._scales[last]
+            self._rows[position] = self._rows[last]
+            self._ids[position] = last_id
+            self._positions[last_id] = position
+        self._ids.pop()
+        return True
+
+    def vectors(self, entry_ids):
+        """Full vectors of the given entries that are indexed, as a dict of entry ID -> vector."""
+        found = [entry_id for entry_id in entry_ids if entry_id in self._positions]
+        if not found:
+            return {}
+        rows = self._rows[[self._positions[entry_id] for entry_id in found]]
+        return dict(zip(found, self.vector_file.get(rows)))
+
+    def release(self):
+        """Give the full vectors' rows back to the file, e.g. when the index is evicted."""
+        self.vector_file.release(self._rows[:len(self._ids)].tolist())
+
+    def search(self, query_vector, limit, allowed=None):
+        """
+        Find the most similar entries.
+
+        Args:
+            query_vector: Unit query vector
+            limit: Maximum number of results
+            allowed: Optional set of entry IDs to restrict the search to
+
+        Returns:
+            list: (entry_id, cosine similarity) pairs, best first
+        """
+        n = len(self._ids)
+        if not n or limit <= 0:
+            return []
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+
+        if self.mode == "binary":
+            distances = _popcount(self._codes[:n] ^ np.packbits(query_vector > 0)).sum(axis=1, dtype=np.int32)
+            scores = -distances.astype(np.float32)
+        else:
+            scores = (self._codes[:n] @ query_vector) * self._scales[:n]
+
+        if allowed is not None:
+            if not isinstance(allowed, (set, frozenset)):
+                allowed = set(allowed)
+            mask = np.fromiter((entry_id in allowed for entry_id in self._ids), dtype=bool, count=n)
+            scores = np.where(mask, scores, -np.inf)
+
+        shortlist_size = min(n, limit * self.rescore_factor)
+        shortlist = np.argpartition(-scores, shortlist_size - 1)[:shortlist_size]
+        shortlist = shortlist[np.isfinite(scores[shortlist])]
+        if not len(shortlist):
+            return []
+
+        # Exact cosine from the full vectors (both sides are unit length)
+        exact = self.vector_file.get(self._rows[shortlist]) @ query_vector
+        order = np.argsort(-exact)[:limit]
+        return [(self._ids[shortlist[i]], float(exact[i])) for i in order]
@@ -2,19 +2,30 @@
 import os
 import logging
 import tempfile
-import openai
 import config
 import subprocess
+import resilience
+from metrics_service import InstrumentedExecutor, track
 
 logger = logging.getLogger(__name__)
 
-# Set up OpenAI API key
-openai.api_key = config.OPENAI_API_KEY
-
 class WhisperService:
-    def __init__(self):
+    def __init__(self, client=None):
         self.audio_dir = config.AUDIO_DIR
+        # Any object exposing audio.transcriptions.create; defaults to the openai module
+        self._client = client
+        # ffmpeg and the OpenAI client both block, so they run on a thread pool
+        self._executor = InstrumentedExecutor("whisper", max_workers=config.WHISPER_EXECUTOR_WORKERS)
         
+    @property
+    def client(self):
+        """OpenAI client, imported and configured on first use."""
+        if self._client is None:
+            import openai
+            openai.api_key = config.OPENAI_API_KEY
+            self._client = openai
+        return self._client
+
     async def transcribe_voice_note(self, voice_note_file):
         """
         Transcribe a voice note using OpenAI's Whisper API.
@@ -29,12 +40,14 @@ class WhisperService:
             # Convert to MP3 format using FFmpeg directly
             converted_file = await self._convert_audio_to_mp3(voice_note_file)
             
-            # Transcribe the audio
-            with open(converted_file, "rb") as audio_file:
-                transcript = await openai.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file
-                )
+            # Transcribe the audio; the file is reopened for every attempt
+            def transcribe():
+                with open(converted_file, "rb") as audio_file:
+                    return self.client.audio.transcriptions.create(model="whisper-1", file=audio_file)
+            
+            async with track("whisper.transcribe"):
+                transcript = await resilience.call(
+                    "whisper.transcribe", "openai", lambda: self._executor.run(transcribe), retry=True)
             
             transcribed_text = transcript.text
             
@@ -75,13 +88,14 @@ class WhisperService:
             ).name
             
             # Use FFmpeg to convert the file
-            subprocess.run([
-                'ffmpeg',
-                '-i', input_file,
-                '-acodec', 'libmp3lame',
-                '-y',  # Overwrite output file if it exists
-                output_file
-            ], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            async with track("whisper.ffmpeg"):
+                await self._executor.run(subprocess.run, [
+                    'ffmpeg',
+                    '-i', input_file,
+                    '-acodec', 'libmp3lame',
+                    '-y',  # Overwrite output file if it exists
+                    output_file
+                ], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
             
             logger.info(f"Converted audio file to MP3 format")
             return output_file